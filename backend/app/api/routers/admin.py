@@ -1,13 +1,14 @@
 import logging
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ...core.config import settings
 from ...core.dependencies import get_current_admin
 from ...db.session import get_session
-from ...models import NovelProject, UsageMetric, User
+from ...models import NovelProject, User
 from ...schemas.admin import (
     AdminNovelSummary,
     DailyRequestLimit,
@@ -15,7 +16,11 @@ from ...schemas.admin import (
     UpdateLogCreate,
     UpdateLogRead,
     UpdateLogUpdate,
+    UsageBucket,
+    UsageHistory,
+    VectorIndexBenchmark,
 )
+from ...schemas.job import BackgroundJobRead
 from ...schemas.config import SystemConfigCreate, SystemConfigRead, SystemConfigUpdate
 from ...schemas.prompt import PromptCreate, PromptRead, PromptUpdate
 from ...schemas.novel import (
@@ -24,14 +29,19 @@ from ...schemas.novel import (
     NovelSectionResponse,
     NovelSectionType,
 )
-from ...schemas.user import PasswordChangeRequest, User as UserSchema
+from ...schemas.user import PasswordChangeRequest, User as UserSchema, UserInDB
 from ...services.auth_service import AuthService
+from ...services.background_job_service import BackgroundJobService
 from ...services.admin_setting_service import AdminSettingService
 from ...services.config_service import ConfigService
 from ...services.novel_service import NovelService
 from ...services.prompt_service import PromptService
+from ...services.quota_service import DAILY_LIMIT_KEY, DEFAULT_DAILY_LIMIT, daily_quota
 from ...services.update_log_service import UpdateLogService
+from ...services.usage_service import UsageService
 from ...services.user_service import UserService
+from ...services.vector_maintenance_service import VECTOR_REENCODE_JOB, VECTOR_REINDEX_JOB
+from ...services.vector_store_service import get_vector_store
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
@@ -72,12 +82,27 @@ async def read_statistics(
 ) -> Statistics:
     novel_count = await session.scalar(select(func.count(NovelProject.id))) or 0
     user_count = await session.scalar(select(func.count(User.id))) or 0
-    usage = await session.get(UsageMetric, "api_request_count")
-    api_request_count = usage.value if usage else 0
+    api_request_count = await UsageService(session).get_value("api_request_count")
     logger.info("管理员获取统计数据：小说=%s，用户=%s，请求=%s", novel_count, user_count, api_request_count)
     return Statistics(novel_count=novel_count, user_count=user_count, api_request_count=api_request_count)
 
 
+@router.get("/stats/usage-history", response_model=UsageHistory)
+async def read_usage_history(
+    key: str = Query("api_request_count", max_length=64),
+    hours: int = Query(24, ge=1, le=24 * 90),
+    session: AsyncSession = Depends(get_session),
+    _: None = Depends(get_current_admin),
+) -> UsageHistory:
+    history = await UsageService(session).get_history(key, hours)
+    logger.info("管理员获取用量历史：key=%s，hours=%s，桶数=%s", key, hours, len(history))
+    return UsageHistory(
+        key=key,
+        bucket_seconds=settings.usage_bucket_seconds,
+        buckets=[UsageBucket(bucket_start=start, value=value) for start, value in history],
+    )
+
+
 @router.get("/users", response_model=List[UserSchema])
 async def list_users(
     service: UserService = Depends(get_user_service),
@@ -249,7 +274,7 @@ async def get_daily_limit(
     service: AdminSettingService = Depends(get_admin_setting_service),
     _: None = Depends(get_current_admin),
 ) -> DailyRequestLimit:
-    value = await service.get("daily_request_limit", "100")
+    value = await service.get(DAILY_LIMIT_KEY, DEFAULT_DAILY_LIMIT)
     logger.info("管理员查询每日请求上限：%s", value)
     return DailyRequestLimit(limit=int(value or 100))
 
@@ -260,11 +285,79 @@ async def update_daily_limit(
     service: AdminSettingService = Depends(get_admin_setting_service),
     _: None = Depends(get_current_admin),
 ) -> DailyRequestLimit:
-    await service.set("daily_request_limit", str(payload.limit))
+    await service.set(DAILY_LIMIT_KEY, str(payload.limit))
+    daily_quota.invalidate_limit()
     logger.info("管理员设置每日请求上限为 %s", payload.limit)
     return payload
 
 
+@router.get("/vector-index/benchmark", response_model=VectorIndexBenchmark)
+async def benchmark_vector_index(
+    project_id: str,
+    samples: int = Query(default=20, ge=1, le=200),
+    top_k: Optional[int] = Query(default=None, ge=1, le=100),
+    _: None = Depends(get_current_admin),
+) -> VectorIndexBenchmark:
+    vector_store = get_vector_store()
+    if not vector_store:
+        raise HTTPException(status_code=400, detail="未启用向量库")
+    report = await vector_store.benchmark_ann(project_id=project_id, samples=samples, top_k=top_k)
+    logger.info(
+        "管理员对比向量索引：项目=%s，样本=%s，召回率=%s",
+        project_id,
+        report["samples"],
+        report["recall"],
+    )
+    return VectorIndexBenchmark(**report)
+
+
+@router.post(
+    "/vector-index/reencode",
+    response_model=BackgroundJobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_vector_reencode_job(
+    session: AsyncSession = Depends(get_session),
+    current_admin: UserInDB = Depends(get_current_admin),
+) -> BackgroundJobRead:
+    """提交向量重新编码任务，把已入库向量转换为当前 VECTOR_STORAGE_ENCODING。
+
+    目标编码不可单独指定：检索路径按配置的编码选择，转换为其他编码会让索引与数据库距离函数读到错误格式。
+    """
+    if not get_vector_store():
+        raise HTTPException(status_code=400, detail="未启用向量库")
+    job = await BackgroundJobService(session).enqueue(
+        VECTOR_REENCODE_JOB,
+        user_id=current_admin.id,
+        dedupe_key=VECTOR_REENCODE_JOB,
+    )
+    logger.info("管理员提交向量重新编码任务：%s", settings.vector_storage_encoding)
+    return BackgroundJobRead.model_validate(job)
+
+
+@router.post(
+    "/vector-index/reindex",
+    response_model=BackgroundJobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_vector_reindex_job(
+    project_id: Optional[str] = Query(default=None),
+    session: AsyncSession = Depends(get_session),
+    current_admin: UserInDB = Depends(get_current_admin),
+) -> BackgroundJobRead:
+    """提交向量重建任务，用当前嵌入模型按章节正文与摘要重建指定项目或全部项目的向量。"""
+    if not get_vector_store():
+        raise HTTPException(status_code=400, detail="未启用向量库")
+    job = await BackgroundJobService(session).enqueue(
+        VECTOR_REINDEX_JOB,
+        user_id=current_admin.id,
+        project_id=project_id,
+        dedupe_key=f"{VECTOR_REINDEX_JOB}:{project_id or '*'}",
+    )
+    logger.info("管理员提交向量重建任务：%s", project_id or "全部项目")
+    return BackgroundJobRead.model_validate(job)
+
+
 @router.get("/system-configs", response_model=List[SystemConfigRead])
 async def list_system_configs(
     service: ConfigService = Depends(get_config_service),
@@ -0,0 +1,38 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...core.dependencies import get_current_user
+from ...db.session import get_session
+from ...schemas.job import BackgroundJobRead
+from ...schemas.user import UserInDB
+from ...services.background_job_service import BackgroundJobService
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+
+@router.get("", response_model=List[BackgroundJobRead])
+async def list_jobs(
+    project_id: Optional[str] = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
+    session: AsyncSession = Depends(get_session),
+    current_user: UserInDB = Depends(get_current_user),
+) -> List[BackgroundJobRead]:
+    """列出当前用户最近的后台任务，可按项目过滤，便于页面刷新后恢复进度。"""
+    jobs = await BackgroundJobService(session).list_user_jobs(
+        current_user.id,
+        project_id=project_id,
+        limit=limit,
+    )
+    return [BackgroundJobRead.model_validate(job) for job in jobs]
+
+
+@router.get("/{job_id}", response_model=BackgroundJobRead)
+async def get_job(
+    job_id: str,
+    session: AsyncSession = Depends(get_session),
+    current_user: UserInDB = Depends(get_current_user),
+) -> BackgroundJobRead:
+    job = await BackgroundJobService(session).get_user_job(job_id, current_user.id)
+    return BackgroundJobRead.model_validate(job)
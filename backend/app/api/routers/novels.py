@@ -12,6 +12,7 @@ from ...schemas.novel import (
     BlueprintGenerationResponse,
     BlueprintPatch,
     Chapter as ChapterSchema,
+    ChapterVersionContent,
     ConverseRequest,
     ConverseResponse,
     NovelProject as NovelProjectSchema,
@@ -19,7 +20,10 @@ from ...schemas.novel import (
     NovelSectionResponse,
     NovelSectionType,
 )
+from ...schemas.job import BackgroundJobRead
 from ...schemas.user import UserInDB
+from ...services import blueprint_generation_service as blueprint_generation
+from ...services.background_job_service import BackgroundJobService
 from ...services.llm_service import LLMService
 from ...services.novel_service import NovelService
 from ...services.prompt_service import PromptService
@@ -114,6 +118,22 @@ async def get_chapter(
     return await novel_service.get_chapter_schema(project_id, current_user.id, chapter_number)
 
 
+@router.get(
+    "/{project_id}/chapters/{chapter_number}/versions/{version_id}",
+    response_model=ChapterVersionContent,
+)
+async def get_chapter_version(
+    project_id: str,
+    chapter_number: int,
+    version_id: int,
+    session: AsyncSession = Depends(get_session),
+    current_user: UserInDB = Depends(get_current_user),
+) -> ChapterVersionContent:
+    """按需读取单个章节版本的正文，项目与区段接口只返回版本元数据。"""
+    novel_service = NovelService(session)
+    return await novel_service.get_chapter_version(project_id, current_user.id, chapter_number, version_id)
+
+
 @router.delete("", status_code=status.HTTP_200_OK)
 async def delete_novels(
     project_ids: List[str] = Body(...),
@@ -204,85 +224,28 @@ async def generate_blueprint(
     current_user: UserInDB = Depends(get_current_user),
 ) -> BlueprintGenerationResponse:
     """根据完整对话生成可执行的小说蓝图。"""
-    novel_service = NovelService(session)
-    prompt_service = PromptService(session)
-    llm_service = LLMService(session)
-
-    project = await novel_service.ensure_project_owner(project_id, current_user.id)
-    logger.info("项目 %s 开始生成蓝图", project_id)
+    return await blueprint_generation.generate_blueprint(session, project_id, current_user.id)
 
-    history_records = await novel_service.list_conversations(project_id)
-    if not history_records:
-        logger.warning("项目 %s 缺少对话历史，无法生成蓝图", project_id)
-        raise HTTPException(status_code=400, detail="缺少对话历史，请先完成概念对话后再生成蓝图")
-
-    formatted_history: List[Dict[str, str]] = []
-    for record in history_records:
-        role = record.role
-        content = record.content
-        if not role or not content:
-            continue
-        try:
-            normalized = unwrap_markdown_json(content)
-            data = json.loads(normalized)
-            if role == "user":
-                user_value = data.get("value", data)
-                if isinstance(user_value, str):
-                    formatted_history.append({"role": "user", "content": user_value})
-            elif role == "assistant":
-                ai_message = data.get("ai_message") if isinstance(data, dict) else None
-                if ai_message:
-                    formatted_history.append({"role": "assistant", "content": ai_message})
-        except (json.JSONDecodeError, AttributeError):
-            continue
-
-    if not formatted_history:
-        logger.warning("项目 %s 对话历史格式异常，无法提取有效内容", project_id)
-        raise HTTPException(
-            status_code=400,
-            detail="无法从历史对话中提取有效内容，请检查对话历史格式或重新进行概念对话"
-        )
 
-    system_prompt = _ensure_prompt(await prompt_service.get_prompt("screenwriting"), "screenwriting")
-    blueprint_raw = await llm_service.get_llm_response(
-        system_prompt=system_prompt,
-        conversation_history=formatted_history,
-        temperature=0.3,
+@router.post(
+    "/{project_id}/blueprint/generate/jobs",
+    response_model=BackgroundJobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_blueprint_generation_job(
+    project_id: str,
+    session: AsyncSession = Depends(get_session),
+    current_user: UserInDB = Depends(get_current_user),
+) -> BackgroundJobRead:
+    """提交蓝图生成任务，立即返回任务 ID，完成后的结果与同步接口响应一致。"""
+    await NovelService(session).ensure_project_owner(project_id, current_user.id)
+    job = await BackgroundJobService(session).enqueue(
+        blueprint_generation.BLUEPRINT_GENERATION_JOB,
         user_id=current_user.id,
-        timeout=480.0,
-    )
-    blueprint_raw = remove_think_tags(blueprint_raw)
-
-    blueprint_normalized = unwrap_markdown_json(blueprint_raw)
-    blueprint_sanitized = sanitize_json_like_text(blueprint_normalized)
-    try:
-        blueprint_data = json.loads(blueprint_sanitized)
-    except json.JSONDecodeError as exc:
-        logger.error(
-            "项目 %s 蓝图生成 JSON 解析失败: %s\n原始响应: %s\n标准化后: %s\n清洗后: %s",
-            project_id,
-            exc,
-            blueprint_raw[:500],
-            blueprint_normalized[:500],
-            blueprint_sanitized[:500],
-        )
-        raise HTTPException(
-            status_code=500,
-            detail=f"蓝图生成失败，AI 返回的内容格式不正确。请重试或联系管理员。错误详情: {str(exc)}"
-        ) from exc
-
-    blueprint = Blueprint(**blueprint_data)
-    await novel_service.replace_blueprint(project_id, blueprint)
-    if blueprint.title:
-        project.title = blueprint.title
-        project.status = "blueprint_ready"
-        await session.commit()
-        logger.info("项目 %s 更新标题为 %s，并标记为 blueprint_ready", project_id, blueprint.title)
-
-    ai_message = (
-        "太棒了！我已经根据我们的对话整理出完整的小说蓝图。请确认是否进入写作阶段，或提出修改意见。"
+        project_id=project_id,
+        dedupe_key=f"{blueprint_generation.BLUEPRINT_GENERATION_JOB}:{project_id}",
     )
-    return BlueprintGenerationResponse(blueprint=blueprint, ai_message=ai_message)
+    return BackgroundJobRead.model_validate(job)
 
 
 @router.post("/{project_id}/blueprint/save", response_model=NovelProjectSchema)
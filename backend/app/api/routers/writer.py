@@ -1,17 +1,22 @@
+import asyncio
 import json
 import logging
-import os
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, Iterable, Optional, Union
 
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...core.config import settings
 from ...core.dependencies import get_current_user
-from ...db.session import get_session
-from ...models.novel import Chapter, ChapterOutline
+from ...db.session import AsyncSessionLocal, get_session
+from ...models.novel import ChapterOutline
+from ...repositories.novel_repository import ProjectLoad
+from ...schemas.job import BackgroundJobRead
 from ...schemas.novel import (
+    ChapterGenerationStatus,
+    ChapterMutationResponse,
     DeleteChapterRequest,
     EditChapterRequest,
     EvaluateChapterRequest,
@@ -22,283 +27,219 @@ from ...schemas.novel import (
     UpdateChapterOutlineRequest,
 )
 from ...schemas.user import UserInDB
-from ...services.chapter_context_service import ChapterContextService
+from ...services import chapter_generation_service as chapter_generation
+from ...services.background_job_service import BackgroundJobService
 from ...services.chapter_ingest_service import ChapterIngestionService
+from ...services.chapter_summary_service import ChapterSummaryService
 from ...services.llm_service import LLMService
 from ...services.novel_service import NovelService
 from ...services.prompt_service import PromptService
-from ...services.vector_store_service import VectorStoreService
-from ...utils.json_utils import remove_think_tags, unwrap_markdown_json
-from ...repositories.system_config_repository import SystemConfigRepository
+from ...services.quota_service import daily_quota
+from ...services.vector_store_service import get_vector_store
+from ...utils.json_utils import remove_think_tags
 
 router = APIRouter(prefix="/api/writer", tags=["Writer"])
 logger = logging.getLogger(__name__)
 
+# 流式生成在客户端断开后仍需跑完，持有任务引用直至结束
+_DETACHED_TASKS: "set[asyncio.Task]" = set()
+_SSE_HEARTBEAT_SECONDS = 15.0
 
-async def _load_project_schema(service: NovelService, project_id: str, user_id: int) -> NovelProjectSchema:
-    return await service.get_project_schema(project_id, user_id)
 
+WriterMutationResponse = Union[ChapterMutationResponse, NovelProjectSchema]
 
-def _extract_tail_excerpt(text: Optional[str], limit: int = 500) -> str:
-    """截取章节结尾文本，默认保留 500 字。"""
-    if not text:
-        return ""
-    stripped = text.strip()
-    if len(stripped) <= limit:
-        return stripped
-    return stripped[-limit:]
+_FULL_QUERY = Query(default=False, description="为真时返回完整项目数据（旧版响应），默认仅返回变更的章节")
 
 
-@router.post("/novels/{project_id}/chapters/generate", response_model=NovelProjectSchema)
+async def _mutation_response(
+    service: NovelService,
+    project_id: str,
+    user_id: int,
+    *,
+    full: bool,
+    chapter_numbers: Iterable[int] = (),
+    deleted_chapter_numbers: Iterable[int] = (),
+) -> WriterMutationResponse:
+    if full:
+        return await service.get_project_schema(project_id, user_id)
+    return await service.get_chapter_mutation(
+        project_id,
+        chapter_numbers,
+        deleted_chapter_numbers=deleted_chapter_numbers,
+    )
+
+
+@router.post("/novels/{project_id}/chapters/generate", response_model=WriterMutationResponse)
 async def generate_chapter(
     project_id: str,
     request: GenerateChapterRequest,
     session: AsyncSession = Depends(get_session),
+    full: bool = _FULL_QUERY,
     current_user: UserInDB = Depends(get_current_user),
-) -> NovelProjectSchema:
+) -> WriterMutationResponse:
     novel_service = NovelService(session)
-    prompt_service = PromptService(session)
-    llm_service = LLMService(session)
+    plan = await chapter_generation.prepare_chapter_generation(session, project_id, request, current_user.id)
+    raw_versions = await chapter_generation.run_version_tasks(
+        [chapter_generation.generate_chapter_version(plan, idx) for idx in range(plan.version_count)],
+        policy=settings.writer_version_failure_policy,
+        log_prefix=plan.log_prefix,
+    )
+    await chapter_generation.save_chapter_versions(novel_service, plan, raw_versions)
+    return await _mutation_response(
+        novel_service,
+        project_id,
+        current_user.id,
+        full=full,
+        chapter_numbers=[plan.chapter_number],
+    )
 
-    project = await novel_service.ensure_project_owner(project_id, current_user.id)
-    logger.info("用户 %s 开始为项目 %s 生成第 %s 章", current_user.id, project_id, request.chapter_number)
-    outline = await novel_service.get_outline(project_id, request.chapter_number)
-    if not outline:
-        logger.warning("项目 %s 未找到第 %s 章纲要，生成流程终止", project_id, request.chapter_number)
+
+@router.post(
+    "/novels/{project_id}/chapters/generate/jobs",
+    response_model=BackgroundJobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_chapter_generation_job(
+    project_id: str,
+    request: GenerateChapterRequest,
+    session: AsyncSession = Depends(get_session),
+    current_user: UserInDB = Depends(get_current_user),
+) -> BackgroundJobRead:
+    """提交章节生成任务，立即返回任务 ID；章节状态与任务进度可轮询获取。"""
+    novel_service = NovelService(session)
+    await novel_service.ensure_project_owner(project_id, current_user.id)
+    if not await novel_service.get_outline(project_id, request.chapter_number):
         raise HTTPException(status_code=404, detail="蓝图中未找到对应章节纲要")
 
     chapter = await novel_service.get_or_create_chapter(project_id, request.chapter_number)
-    chapter.real_summary = None
-    chapter.selected_version_id = None
-    chapter.status = "generating"
+    chapter.status = ChapterGenerationStatus.GENERATING.value
     await session.commit()
-
-    outlines_map = {item.chapter_number: item for item in project.outlines}
-    # 收集所有可用的历史章节摘要，便于在 Prompt 中提供前情背景
-    completed_chapters = []
-    latest_prev_number = -1
-    previous_summary_text = ""
-    previous_tail_excerpt = ""
-    for existing in project.chapters:
-        if existing.chapter_number >= request.chapter_number:
-            continue
-        if existing.selected_version is None or not existing.selected_version.content:
-            continue
-        if not existing.real_summary:
-            summary = await llm_service.get_summary(
-                existing.selected_version.content,
-                temperature=0.15,
-                user_id=current_user.id,
-                timeout=180.0,
-            )
-            existing.real_summary = remove_think_tags(summary)
-            await session.commit()
-        completed_chapters.append(
-            {
-                "chapter_number": existing.chapter_number,
-                "title": outlines_map.get(existing.chapter_number).title if outlines_map.get(existing.chapter_number) else f"第{existing.chapter_number}章",
-                "summary": existing.real_summary,
-            }
-        )
-        if existing.chapter_number > latest_prev_number:
-            latest_prev_number = existing.chapter_number
-            previous_summary_text = existing.real_summary or ""
-            previous_tail_excerpt = _extract_tail_excerpt(existing.selected_version.content)
-
-    project_schema = await novel_service._serialize_project(project)
-    blueprint_dict = project_schema.blueprint.model_dump()
-
-    if "relationships" in blueprint_dict and blueprint_dict["relationships"]:
-        for relation in blueprint_dict["relationships"]:
-            if "character_from" in relation:
-                relation["from"] = relation.pop("character_from")
-            if "character_to" in relation:
-                relation["to"] = relation.pop("character_to")
-
-    # 蓝图中禁止携带章节级别的细节信息，避免重复传输大段场景或对话内容
-    banned_blueprint_keys = {
-        "chapter_outline",
-        "chapter_summaries",
-        "chapter_details",
-        "chapter_dialogues",
-        "chapter_events",
-        "conversation_history",
-        "character_timelines",
-    }
-    for key in banned_blueprint_keys:
-        if key in blueprint_dict:
-            blueprint_dict.pop(key, None)
-
-    writer_prompt = await prompt_service.get_prompt("writing")
-    if not writer_prompt:
-        logger.error("未配置名为 'writing' 的写作提示词，无法生成章节内容")
-        raise HTTPException(status_code=500, detail="缺少写作提示词，请联系管理员配置 'writing' 提示词")
-
-    # 初始化向量检索服务，若未配置则自动降级为纯提示词生成
-    vector_store: Optional[VectorStoreService]
-    if not settings.vector_store_enabled:
-        vector_store = None
-    else:
-        try:
-            vector_store = VectorStoreService()
-        except RuntimeError as exc:
-            logger.warning("向量库初始化失败，RAG 检索被禁用: %s", exc)
-            vector_store = None
-    context_service = ChapterContextService(llm_service=llm_service, vector_store=vector_store)
-
-    outline_title = outline.title or f"第{outline.chapter_number}章"
-    outline_summary = outline.summary or "暂无摘要"
-    query_parts = [outline_title, outline_summary]
-    if request.writing_notes:
-        query_parts.append(request.writing_notes)
-    rag_query = "\n".join(part for part in query_parts if part)
-    rag_context = await context_service.retrieve_for_generation(
-        project_id=project_id,
-        query_text=rag_query or outline.title or outline.summary or "",
+    job = await BackgroundJobService(session).enqueue(
+        chapter_generation.CHAPTER_GENERATION_JOB,
         user_id=current_user.id,
+        project_id=project_id,
+        chapter_number=request.chapter_number,
+        payload=request.model_dump(),
+        dedupe_key=f"{chapter_generation.CHAPTER_GENERATION_JOB}:{project_id}:{request.chapter_number}",
     )
-    chunk_count = len(rag_context.chunks) if rag_context and rag_context.chunks else 0
-    summary_count = len(rag_context.summaries) if rag_context and rag_context.summaries else 0
-    logger.info(
-        "项目 %s 第 %s 章检索到 %s 个剧情片段和 %s 条摘要",
-        project_id,
-        request.chapter_number,
-        chunk_count,
-        summary_count,
+    return BackgroundJobRead.model_validate(job)
+
+
+@router.post("/novels/{project_id}/chapters/generate/stream")
+async def generate_chapter_stream(
+    project_id: str,
+    request: GenerateChapterRequest,
+    session: AsyncSession = Depends(get_session),
+    current_user: UserInDB = Depends(get_current_user),
+) -> StreamingResponse:
+    """以 SSE 推送章节生成过程，各版本的模型输出实时转发，全部完成后写入章节版本。
+
+    事件依次为 version_start、token、version_complete / version_failed，
+    最后以 done 或 error 结束；token 为模型原始输出片段，解析后的正文见 version_complete。
+    """
+    try:
+        plan = await chapter_generation.prepare_chapter_generation(session, project_id, request, current_user.id)
+    except Exception:
+        # 准备阶段可能在章节已置为 generating 之后失败（提示词缺失、检索失败等），需回写状态
+        await chapter_generation._mark_chapter_failed(session, project_id, request.chapter_number)
+        raise
+    return StreamingResponse(
+        _stream_chapter_generation(plan),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    # print("rag_context:",rag_context)
-    # 将蓝图、前情、RAG 检索结果拼装成结构化段落，供模型理解
-    blueprint_text = json.dumps(blueprint_dict, ensure_ascii=False, indent=2)
-    completed_lines = [
-        f"- 第{item['chapter_number']}章 - {item['title']}:{item['summary']}"
-        for item in completed_chapters
-    ]
-    previous_summary_text = previous_summary_text or "暂无可用摘要"
-    previous_tail_excerpt = previous_tail_excerpt or "暂无上一章结尾内容"
-    completed_section = "\n".join(completed_lines) if completed_lines else "暂无前情摘要"
-    rag_chunks_text = "\n\n".join(rag_context.chunk_texts()) if rag_context.chunks else "未检索到章节片段"
-    rag_summaries_text = "\n".join(rag_context.summary_lines()) if rag_context.summaries else "未检索到章节摘要"
-    writing_notes = request.writing_notes or "无额外写作指令"
-
-    prompt_sections = [
-        ("[世界蓝图](JSON)", blueprint_text),
-        # ("[前情摘要]", completed_section),
-        ("[上一章摘要]", previous_summary_text),
-        ("[上一章结尾]", previous_tail_excerpt),
-        ("[检索到的剧情上下文](Markdown)", rag_chunks_text),
-        ("[检索到的章节摘要]", rag_summaries_text),
-        (
-            "[当前章节目标]",
-            f"标题：{outline_title}\n摘要：{outline_summary}\n写作要求：{writing_notes}",
-        ),
-    ]
-    prompt_input = "\n\n".join(f"{title}\n{content}" for title, content in prompt_sections if content)
-    logger.debug("章节写作提示词：%s\n%s", writer_prompt, prompt_input)
-    async def _generate_single_version(idx: int) -> Dict:
+
+
+def _format_sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_chapter_generation(plan: chapter_generation.ChapterGenerationPlan) -> AsyncIterator[str]:
+    queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+    async def _run_version(idx: int) -> Dict:
+        async def _forward(delta: str) -> None:
+            await queue.put(_format_sse("token", {"version_index": idx, "delta": delta}))
+
+        await queue.put(_format_sse("version_start", {"version_index": idx}))
         try:
-            response = await llm_service.get_llm_response(
-                system_prompt=writer_prompt,
-                conversation_history=[{"role": "user", "content": prompt_input}],
-                temperature=0.9,
-                user_id=current_user.id,
-                timeout=600.0,
-            )
-            cleaned = remove_think_tags(response)
-            normalized = unwrap_markdown_json(cleaned)
-            try:
-                return json.loads(normalized)
-            except json.JSONDecodeError as parse_err:
-                logger.warning(
-                    "项目 %s 第 %s 章第 %s 个版本 JSON 解析失败，将原始内容作为纯文本处理: %s",
-                    project_id,
-                    request.chapter_number,
-                    idx + 1,
-                    parse_err,
-                )
-                return {"content": normalized}
-        except HTTPException:
+            variant = await chapter_generation.generate_chapter_version(plan, idx, on_delta=_forward)
+        except HTTPException as exc:
+            await queue.put(_format_sse("version_failed", {"version_index": idx, "detail": exc.detail}))
             raise
-        except Exception as exc:
-            logger.exception(
-                "项目 %s 生成第 %s 章第 %s 个版本时发生异常: %s",
-                project_id,
-                request.chapter_number,
-                idx + 1,
-                exc,
+        await queue.put(
+            _format_sse(
+                "version_complete",
+                {"version_index": idx, "content": chapter_generation.extract_version_content(variant)},
             )
-            raise HTTPException(
-                status_code=500,
-                detail=f"生成章节第 {idx + 1} 个版本时失败: {str(exc)[:200]}"
-            )
-
-    version_count = await _resolve_version_count(session)
-    logger.info(
-        "项目 %s 第 %s 章计划生成 %s 个版本",
-        project_id,
-        request.chapter_number,
-        version_count,
-    )
-    raw_versions = []
-    for idx in range(version_count):
-        raw_versions.append(await _generate_single_version(idx))
-    contents: List[str] = []
-    metadata: List[Dict] = []
-    for variant in raw_versions:
-        if isinstance(variant, dict):
-            if "content" in variant and isinstance(variant["content"], str):
-                contents.append(variant["content"])
-            elif "chapter_content" in variant:
-                contents.append(str(variant["chapter_content"]))
-            else:
-                contents.append(json.dumps(variant, ensure_ascii=False))
-            metadata.append(variant)
-        else:
-            contents.append(str(variant))
-            metadata.append({"raw": variant})
-
-    await novel_service.replace_chapter_versions(chapter, contents, metadata)
-    logger.info(
-        "项目 %s 第 %s 章生成完成，已写入 %s 个版本",
-        project_id,
-        request.chapter_number,
-        len(contents),
-    )
-    return await _load_project_schema(novel_service, project_id, current_user.id)
+        )
+        return variant
 
+    async def _mark_failed() -> None:
+        # 章节在准备阶段已置为 generating，生成或落库失败时需回写为 failed，避免一直停留在生成中
+        try:
+            async with AsyncSessionLocal() as status_session:
+                await chapter_generation._mark_chapter_failed(status_session, plan.project_id, plan.chapter_number)
+        except Exception as exc:  # pragma: no cover - 状态回写失败不影响结束事件
+            logger.warning("%s 回写失败状态出错: %s", plan.log_prefix, exc)
 
-async def _resolve_version_count(session: AsyncSession) -> int:
-    repo = SystemConfigRepository(session)
-    record = await repo.get_by_key("writer.chapter_versions")
-    if record:
+    async def _run_all() -> None:
         try:
-            value = int(record.value)
-            if value > 0:
-                return value
-        except (TypeError, ValueError):
-            pass
-    env_value = os.getenv("WRITER_CHAPTER_VERSION_COUNT")
-    if env_value:
+            raw_versions = await chapter_generation.run_version_tasks(
+                [_run_version(idx) for idx in range(plan.version_count)],
+                policy=settings.writer_version_failure_policy,
+                log_prefix=plan.log_prefix,
+            )
+            # 请求会话在响应开始后即被释放，写入版本需要独立会话
+            async with AsyncSessionLocal() as persist_session:
+                saved = await chapter_generation.save_chapter_versions(
+                    NovelService(persist_session), plan, raw_versions
+                )
+            await queue.put(
+                _format_sse("done", {"chapter_number": plan.chapter_number, "version_count": saved})
+            )
+        except HTTPException as exc:
+            await _mark_failed()
+            await queue.put(_format_sse("error", {"status_code": exc.status_code, "detail": exc.detail}))
+        except Exception as exc:  # pragma: no cover - 兜底，保证流正常结束
+            logger.exception("%s 流式生成失败: %s", plan.log_prefix, exc)
+            await _mark_failed()
+            await queue.put(_format_sse("error", {"status_code": 500, "detail": "章节生成失败，请稍后重试"}))
+        finally:
+            await queue.put(None)
+            await daily_quota.release(quota_hold)
+
+    # 客户端断开后生成仍继续并落库，任务引用保存在模块级集合中防止被回收；
+    # 本次请求的配额操作延续到任务结束再结算，避免断开时把已完成的生成退还
+    quota_hold = daily_quota.hold()
+    runner = asyncio.create_task(_run_all())
+    _DETACHED_TASKS.add(runner)
+    runner.add_done_callback(_DETACHED_TASKS.discard)
+
+    while True:
         try:
-            value = int(env_value)
-            if value > 0:
-                return value
-        except ValueError:
-            pass
-    return 3
+            item = await asyncio.wait_for(queue.get(), timeout=_SSE_HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            # 模型首个 token 返回前发送注释行，避免代理因空闲断开连接
+            yield ": ping\n\n"
+            continue
+        if item is None:
+            break
+        yield item
 
 
-@router.post("/novels/{project_id}/chapters/select", response_model=NovelProjectSchema)
+@router.post("/novels/{project_id}/chapters/select", response_model=WriterMutationResponse)
 async def select_chapter_version(
     project_id: str,
     request: SelectVersionRequest,
     session: AsyncSession = Depends(get_session),
+    full: bool = _FULL_QUERY,
     current_user: UserInDB = Depends(get_current_user),
-) -> NovelProjectSchema:
+) -> WriterMutationResponse:
     novel_service = NovelService(session)
-    llm_service = LLMService(session)
 
-    project = await novel_service.ensure_project_owner(project_id, current_user.id)
-    chapter = next((ch for ch in project.chapters if ch.chapter_number == request.chapter_number), None)
+    await novel_service.ensure_project_owner(project_id, current_user.id)
+    chapter = await novel_service.get_chapter_detail(project_id, request.chapter_number)
     if not chapter:
         logger.warning("项目 %s 未找到第 %s 章，无法选择版本", project_id, request.chapter_number)
         raise HTTPException(status_code=404, detail="章节不存在")
@@ -312,60 +253,43 @@ async def select_chapter_version(
         request.version_index,
     )
     if selected and selected.content:
-        summary = await llm_service.get_summary(
-            selected.content,
-            temperature=0.15,
+        # 摘要生成与向量同步交由后台任务完成，接口立即返回
+        chapter.real_summary = None
+        await session.commit()
+        await ChapterSummaryService(session).schedule(
+            project_id=project_id,
+            chapter_number=chapter.chapter_number,
+            content=selected.content,
             user_id=current_user.id,
-            timeout=180.0,
         )
-        chapter.real_summary = remove_think_tags(summary)
-        await session.commit()
 
-        # 选定版本后同步向量库，确保后续章节可检索到最新内容
-        vector_store: Optional[VectorStoreService]
-        if not settings.vector_store_enabled:
-            vector_store = None
-        else:
-            try:
-                vector_store = VectorStoreService()
-            except RuntimeError as exc:
-                logger.warning("向量库初始化失败，跳过章节向量同步: %s", exc)
-                vector_store = None
-
-        if vector_store:
-            ingestion_service = ChapterIngestionService(llm_service=llm_service, vector_store=vector_store)
-            outline = next((item for item in project.outlines if item.chapter_number == chapter.chapter_number), None)
-            chapter_title = outline.title if outline and outline.title else f"第{chapter.chapter_number}章"
-            await ingestion_service.ingest_chapter(
-                project_id=project_id,
-                chapter_number=chapter.chapter_number,
-                title=chapter_title,
-                content=selected.content,
-                summary=chapter.real_summary,
-                user_id=current_user.id,
-            )
-            logger.info(
-                "项目 %s 第 %s 章已同步至向量库",
-                project_id,
-                chapter.chapter_number,
-            )
-
-    return await _load_project_schema(novel_service, project_id, current_user.id)
+    return await _mutation_response(
+        novel_service,
+        project_id,
+        current_user.id,
+        full=full,
+        chapter_numbers=[request.chapter_number],
+    )
 
 
-@router.post("/novels/{project_id}/chapters/evaluate", response_model=NovelProjectSchema)
+@router.post("/novels/{project_id}/chapters/evaluate", response_model=WriterMutationResponse)
 async def evaluate_chapter(
     project_id: str,
     request: EvaluateChapterRequest,
     session: AsyncSession = Depends(get_session),
+    full: bool = _FULL_QUERY,
     current_user: UserInDB = Depends(get_current_user),
-) -> NovelProjectSchema:
+) -> WriterMutationResponse:
     novel_service = NovelService(session)
     prompt_service = PromptService(session)
     llm_service = LLMService(session)
 
-    project = await novel_service.ensure_project_owner(project_id, current_user.id)
-    chapter = next((ch for ch in project.chapters if ch.chapter_number == request.chapter_number), None)
+    project = await novel_service.ensure_project_owner(project_id, current_user.id, load=ProjectLoad.OUTLINE)
+    chapter = await novel_service.get_chapter_detail(
+        project_id,
+        request.chapter_number,
+        with_version_content=True,
+    )
     if not chapter:
         logger.warning("项目 %s 未找到第 %s 章，无法执行评估", project_id, request.chapter_number)
         raise HTTPException(status_code=404, detail="章节不存在")
@@ -378,8 +302,7 @@ async def evaluate_chapter(
         logger.error("缺少评估提示词，项目 %s 第 %s 章评估失败", project_id, request.chapter_number)
         raise HTTPException(status_code=500, detail="缺少评估提示词，请联系管理员配置 'evaluation' 提示词")
 
-    project_schema = await novel_service._serialize_project(project)
-    blueprint_dict = project_schema.blueprint.model_dump()
+    blueprint_dict = novel_service._build_blueprint_schema(project).model_dump()
 
     versions_to_evaluate = [
         {"version_id": idx + 1, "content": version.content}
@@ -405,102 +328,64 @@ async def evaluate_chapter(
     await novel_service.add_chapter_evaluation(chapter, None, evaluation_clean)
     logger.info("项目 %s 第 %s 章评估完成", project_id, request.chapter_number)
 
-    return await _load_project_schema(novel_service, project_id, current_user.id)
+    return await _mutation_response(
+        novel_service,
+        project_id,
+        current_user.id,
+        full=full,
+        chapter_numbers=[request.chapter_number],
+    )
 
 
-@router.post("/novels/{project_id}/chapters/outline", response_model=NovelProjectSchema)
+@router.post("/novels/{project_id}/chapters/outline", response_model=WriterMutationResponse)
 async def generate_chapter_outline(
     project_id: str,
     request: GenerateOutlineRequest,
     session: AsyncSession = Depends(get_session),
+    full: bool = _FULL_QUERY,
     current_user: UserInDB = Depends(get_current_user),
-) -> NovelProjectSchema:
-    novel_service = NovelService(session)
-    prompt_service = PromptService(session)
-    llm_service = LLMService(session)
-
-    await novel_service.ensure_project_owner(project_id, current_user.id)
-    logger.info(
-        "用户 %s 请求生成项目 %s 的章节大纲，起始章节 %s，数量 %s",
-        current_user.id,
+) -> WriterMutationResponse:
+    chapter_numbers = await chapter_generation.generate_chapter_outline(session, project_id, request, current_user.id)
+    return await _mutation_response(
+        NovelService(session),
         project_id,
-        request.start_chapter,
-        request.num_chapters,
+        current_user.id,
+        full=full,
+        chapter_numbers=chapter_numbers,
     )
-    outline_prompt = await prompt_service.get_prompt("outline")
-    if not outline_prompt:
-        logger.error("缺少大纲提示词，项目 %s 大纲生成失败", project_id)
-        raise HTTPException(status_code=500, detail="缺少大纲提示词，请联系管理员配置 'outline' 提示词")
 
-    project_schema = await novel_service.get_project_schema(project_id, current_user.id)
-    blueprint_dict = project_schema.blueprint.model_dump()
-
-    payload = {
-        "novel_blueprint": blueprint_dict,
-        "wait_to_generate": {
-            "start_chapter": request.start_chapter,
-            "num_chapters": request.num_chapters,
-        },
-    }
 
-    response = await llm_service.get_llm_response(
-        system_prompt=outline_prompt,
-        conversation_history=[{"role": "user", "content": json.dumps(payload, ensure_ascii=False)}],
-        temperature=0.7,
+@router.post(
+    "/novels/{project_id}/chapters/outline/jobs",
+    response_model=BackgroundJobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_chapter_outline_job(
+    project_id: str,
+    request: GenerateOutlineRequest,
+    session: AsyncSession = Depends(get_session),
+    current_user: UserInDB = Depends(get_current_user),
+) -> BackgroundJobRead:
+    """提交章节纲要生成任务，立即返回任务 ID，结果通过 /api/jobs/{job_id} 查询。"""
+    await NovelService(session).ensure_project_owner(project_id, current_user.id)
+    job = await BackgroundJobService(session).enqueue(
+        chapter_generation.CHAPTER_OUTLINE_JOB,
         user_id=current_user.id,
-        timeout=360.0,
+        project_id=project_id,
+        payload=request.model_dump(),
+        dedupe_key=f"{chapter_generation.CHAPTER_OUTLINE_JOB}:{project_id}",
     )
-    normalized = unwrap_markdown_json(remove_think_tags(response))
-    try:
-        data = json.loads(normalized)
-    except json.JSONDecodeError as exc:
-        logger.error(
-            "项目 %s 大纲生成 JSON 解析失败: %s, 原始内容预览: %s",
-            project_id,
-            exc,
-            normalized[:500],
-        )
-        raise HTTPException(
-            status_code=500,
-            detail=f"章节大纲生成失败，AI 返回的内容格式不正确: {str(exc)}"
-        ) from exc
-
-    new_outlines = data.get("chapters", [])
-    for item in new_outlines:
-        stmt = (
-            select(ChapterOutline)
-            .where(
-                ChapterOutline.project_id == project_id,
-                ChapterOutline.chapter_number == item.get("chapter_number"),
-            )
-        )
-        result = await session.execute(stmt)
-        record = result.scalars().first()
-        if record:
-            record.title = item.get("title", record.title)
-            record.summary = item.get("summary", record.summary)
-        else:
-            session.add(
-                ChapterOutline(
-                    project_id=project_id,
-                    chapter_number=item.get("chapter_number"),
-                    title=item.get("title", ""),
-                    summary=item.get("summary"),
-                )
-            )
-    await session.commit()
-    logger.info("项目 %s 章节大纲生成完成", project_id)
+    return BackgroundJobRead.model_validate(job)
 
-    return await novel_service.get_project_schema(project_id, current_user.id)
 
-
-@router.post("/novels/{project_id}/chapters/update-outline", response_model=NovelProjectSchema)
+@router.post("/novels/{project_id}/chapters/update-outline", response_model=WriterMutationResponse)
 async def update_chapter_outline(
     project_id: str,
     request: UpdateChapterOutlineRequest,
     session: AsyncSession = Depends(get_session),
+    full: bool = _FULL_QUERY,
     current_user: UserInDB = Depends(get_current_user),
-) -> NovelProjectSchema:
+) -> WriterMutationResponse:
     novel_service = NovelService(session)
     await novel_service.ensure_project_owner(project_id, current_user.id)
     logger.info(
@@ -529,18 +414,26 @@ async def update_chapter_outline(
     outline.title = request.title
     outline.summary = request.summary
     await session.commit()
+    await novel_service._touch_project(project_id)
     logger.info("项目 %s 第 %s 章大纲已更新", project_id, request.chapter_number)
 
-    return await novel_service.get_project_schema(project_id, current_user.id)
+    return await _mutation_response(
+        novel_service,
+        project_id,
+        current_user.id,
+        full=full,
+        chapter_numbers=[request.chapter_number],
+    )
 
 
-@router.post("/novels/{project_id}/chapters/delete", response_model=NovelProjectSchema)
+@router.post("/novels/{project_id}/chapters/delete", response_model=WriterMutationResponse)
 async def delete_chapters(
     project_id: str,
     request: DeleteChapterRequest,
     session: AsyncSession = Depends(get_session),
+    full: bool = _FULL_QUERY,
     current_user: UserInDB = Depends(get_current_user),
-) -> NovelProjectSchema:
+) -> WriterMutationResponse:
     if not request.chapter_numbers:
         logger.warning("项目 %s 删除章节时未提供章节号", project_id)
         raise HTTPException(status_code=400, detail="请提供要删除的章节号列表")
@@ -556,15 +449,7 @@ async def delete_chapters(
     await novel_service.delete_chapters(project_id, request.chapter_numbers)
 
     # 删除章节时同步清理向量库，避免过时内容被检索
-    vector_store: Optional[VectorStoreService]
-    if not settings.vector_store_enabled:
-        vector_store = None
-    else:
-        try:
-            vector_store = VectorStoreService()
-        except RuntimeError as exc:
-            logger.warning("向量库初始化失败，跳过章节向量删除: %s", exc)
-            vector_store = None
+    vector_store = get_vector_store()
 
     if vector_store:
         ingestion_service = ChapterIngestionService(llm_service=llm_service, vector_store=vector_store)
@@ -575,21 +460,27 @@ async def delete_chapters(
             request.chapter_numbers,
         )
 
-    return await novel_service.get_project_schema(project_id, current_user.id)
+    return await _mutation_response(
+        novel_service,
+        project_id,
+        current_user.id,
+        full=full,
+        deleted_chapter_numbers=request.chapter_numbers,
+    )
 
 
-@router.post("/novels/{project_id}/chapters/edit", response_model=NovelProjectSchema)
+@router.post("/novels/{project_id}/chapters/edit", response_model=WriterMutationResponse)
 async def edit_chapter(
     project_id: str,
     request: EditChapterRequest,
     session: AsyncSession = Depends(get_session),
+    full: bool = _FULL_QUERY,
     current_user: UserInDB = Depends(get_current_user),
-) -> NovelProjectSchema:
+) -> WriterMutationResponse:
     novel_service = NovelService(session)
-    llm_service = LLMService(session)
 
-    project = await novel_service.ensure_project_owner(project_id, current_user.id)
-    chapter = next((ch for ch in project.chapters if ch.chapter_number == request.chapter_number), None)
+    await novel_service.ensure_project_owner(project_id, current_user.id)
+    chapter = await novel_service.get_chapter_detail(project_id, request.chapter_number)
     if not chapter or chapter.selected_version is None:
         logger.warning("项目 %s 第 %s 章尚未生成或未选择版本，无法编辑", project_id, request.chapter_number)
         raise HTTPException(status_code=404, detail="章节尚未生成或未选择版本")
@@ -598,38 +489,21 @@ async def edit_chapter(
     chapter.word_count = len(request.content)
     logger.info("用户 %s 更新了项目 %s 第 %s 章内容", current_user.id, project_id, request.chapter_number)
 
-    if request.content.strip():
-        summary = await llm_service.get_summary(
-            request.content,
-            temperature=0.15,
-            user_id=current_user.id,
-            timeout=180.0,
-        )
-        chapter.real_summary = remove_think_tags(summary)
+    # 旧摘要已过期，新摘要与向量同步由后台任务完成
+    chapter.real_summary = None
     await session.commit()
+    await novel_service._touch_project(project_id)
+    await ChapterSummaryService(session).schedule(
+        project_id=project_id,
+        chapter_number=chapter.chapter_number,
+        content=request.content,
+        user_id=current_user.id,
+    )
 
-    vector_store: Optional[VectorStoreService]
-    if not settings.vector_store_enabled:
-        vector_store = None
-    else:
-        try:
-            vector_store = VectorStoreService()
-        except RuntimeError as exc:
-            logger.warning("向量库初始化失败，跳过章节向量更新: %s", exc)
-            vector_store = None
-
-    if vector_store and chapter.selected_version and chapter.selected_version.content:
-        ingestion_service = ChapterIngestionService(llm_service=llm_service, vector_store=vector_store)
-        outline = next((item for item in project.outlines if item.chapter_number == chapter.chapter_number), None)
-        chapter_title = outline.title if outline and outline.title else f"第{chapter.chapter_number}章"
-        await ingestion_service.ingest_chapter(
-            project_id=project_id,
-            chapter_number=chapter.chapter_number,
-            title=chapter_title,
-            content=chapter.selected_version.content,
-            summary=chapter.real_summary,
-            user_id=current_user.id,
-        )
-        logger.info("项目 %s 第 %s 章更新内容已同步至向量库", project_id, chapter.chapter_number)
-
-    return await novel_service.get_project_schema(project_id, current_user.id)
+    return await _mutation_response(
+        novel_service,
+        project_id,
+        current_user.id,
+        full=full,
+        chapter_numbers=[request.chapter_number],
+    )
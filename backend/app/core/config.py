@@ -29,6 +29,11 @@ class Settings(BaseSettings):
         env="ENABLE_LINUXDO_LOGIN",
         description="是否启用 Linux.do OAuth 登录",
     )
+    system_config_cache_ttl: float = Field(
+        default=30.0,
+        env="SYSTEM_CONFIG_CACHE_TTL",
+        description="系统配置进程内缓存的有效期（秒），0 表示每次读取数据库",
+    )
 
     # -------------------- 安全相关配置 --------------------
     secret_key: str = Field(..., env="SECRET_KEY", description="JWT 加密密钥")
@@ -77,6 +82,74 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices("WRITER_CHAPTER_VERSION_COUNT", "WRITER_CHAPTER_VERSIONS"),
         description="每次生成章节的候选版本数量",
     )
+    writer_version_concurrency: int = Field(
+        default=3,
+        ge=1,
+        env="WRITER_VERSION_CONCURRENCY",
+        description="同一用户并发生成章节版本的数量上限",
+    )
+    writer_version_failure_policy: str = Field(
+        default="fail_all",
+        env="WRITER_VERSION_FAILURE_POLICY",
+        description="版本生成失败策略：fail_all 任一失败即整体失败，keep_successful 保留成功的版本",
+    )
+    writer_prompt_token_budget: int = Field(
+        default=32000,
+        ge=0,
+        env="WRITER_PROMPT_TOKEN_BUDGET",
+        description="章节写作提示词（含系统提示词）的估算 token 上限，超出时按段落优先级裁剪，0 表示不限制",
+    )
+    writer_blueprint_full_cast_limit: int = Field(
+        default=8,
+        ge=0,
+        env="WRITER_BLUEPRINT_FULL_CAST_LIMIT",
+        description="蓝图角色数不超过该值时写作提示词保留全部角色，超过时只保留与本章相关的角色",
+    )
+    writer_blueprint_core_characters: int = Field(
+        default=1,
+        ge=0,
+        env="WRITER_BLUEPRINT_CORE_CHARACTERS",
+        description="筛选角色时始终保留蓝图中排在最前的角色数（通常为主角）",
+    )
+    writer_prompt_layout: str = Field(
+        default="prefix_cache",
+        env="WRITER_PROMPT_LAYOUT",
+        description="写作提示词布局：prefix_cache 将项目内不变的蓝图放在最前以命中提供方前缀缓存，classic 为旧版顺序",
+    )
+    llm_provider_concurrency: int = Field(
+        default=0,
+        ge=0,
+        env="LLM_PROVIDER_CONCURRENCY",
+        description="同一模型服务地址的并发请求上限，0 表示不限制",
+    )
+    llm_http_max_connections: int = Field(
+        default=100,
+        ge=1,
+        env="LLM_HTTP_MAX_CONNECTIONS",
+        description="每个模型服务客户端的最大连接数",
+    )
+    llm_http_max_keepalive_connections: int = Field(
+        default=20,
+        ge=0,
+        env="LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS",
+        description="每个模型服务客户端保留的空闲长连接数",
+    )
+    llm_http_keepalive_expiry: float = Field(
+        default=60.0,
+        ge=0,
+        env="LLM_HTTP_KEEPALIVE_EXPIRY",
+        description="空闲长连接的保留时间（秒）",
+    )
+    llm_http2: bool = Field(
+        default=True,
+        env="LLM_HTTP2",
+        description="是否对模型服务启用 HTTP/2，未安装 h2 时自动回退到 HTTP/1.1",
+    )
+    llm_stream_include_usage: bool = Field(
+        default=True,
+        env="LLM_STREAM_INCLUDE_USAGE",
+        description="流式调用是否请求 stream_options.include_usage 以记录 prompt/completion/缓存命中 token 数",
+    )
     embedding_provider: str = Field(
         default="openai",
         env="EMBEDDING_PROVIDER",
@@ -103,6 +176,34 @@ class Settings(BaseSettings):
         env="EMBEDDING_MODEL_VECTOR_SIZE",
         description="嵌入向量维度，未配置时将自动检测",
     )
+    embedding_request_dimensions: bool = Field(
+        default=False,
+        env="EMBEDDING_REQUEST_DIMENSIONS",
+        description="调用 OpenAI 兼容接口时是否携带 dimensions 参数，按嵌入维度截断向量（text-embedding-3 系列支持）",
+    )
+    embedding_batch_size: int = Field(
+        default=64,
+        ge=1,
+        env="EMBEDDING_BATCH_SIZE",
+        description="单次嵌入请求携带的文本条数（OpenAI 兼容接口）",
+    )
+    embedding_concurrency: int = Field(
+        default=4,
+        ge=1,
+        env="EMBEDDING_CONCURRENCY",
+        description="不支持批量输入的提供方（Ollama）并发请求上限",
+    )
+    embedding_cache_enabled: bool = Field(
+        default=True,
+        env="EMBEDDING_CACHE_ENABLED",
+        description="是否按文本内容缓存嵌入向量（持久化到向量库）",
+    )
+    embedding_cache_memory_size: int = Field(
+        default=2048,
+        ge=0,
+        env="EMBEDDING_CACHE_MEMORY_SIZE",
+        description="嵌入缓存在进程内保留的条数，0 表示只使用向量库中的持久化缓存",
+    )
     ollama_embedding_base_url: Optional[AnyUrl] = Field(
         default=None,
         env="OLLAMA_EMBEDDING_BASE_URL",
@@ -123,6 +224,18 @@ class Settings(BaseSettings):
         env="VECTOR_DB_AUTH_TOKEN",
         description="libsql 访问令牌",
     )
+    vector_db_pool_size: int = Field(
+        default=2,
+        ge=1,
+        env="VECTOR_DB_POOL_SIZE",
+        description="libsql 客户端连接池大小，本地文件库固定为 1",
+    )
+    vector_write_batch_size: int = Field(
+        default=64,
+        ge=1,
+        env="VECTOR_WRITE_BATCH_SIZE",
+        description="向量批量写入时每个事务包含的语句数",
+    )
     vector_top_k_chunks: int = Field(
         default=5,
         ge=0,
@@ -135,6 +248,52 @@ class Settings(BaseSettings):
         env="VECTOR_TOP_K_SUMMARIES",
         description="章节摘要检索条数",
     )
+    vector_retrieval_timeout: float = Field(
+        default=8.0,
+        ge=0,
+        env="VECTOR_RETRIEVAL_TIMEOUT",
+        description="章节生成前 RAG 检索（含查询向量生成）的总时限（秒），超时后使用已完成部分的结果，0 表示不限时",
+    )
+    vector_scan_page_size: int = Field(
+        default=512,
+        ge=16,
+        env="VECTOR_SCAN_PAGE_SIZE",
+        description="应用层相似度计算时每页读取的向量条数，决定回退路径的内存上限",
+    )
+    vector_storage_encoding: str = Field(
+        default="float32",
+        env="VECTOR_STORAGE_ENCODING",
+        description="向量存储编码：float32、float16 或 int8（逐向量缩放），压缩编码不使用原生向量索引",
+    )
+    vector_ann_enabled: bool = Field(
+        default=True,
+        env="VECTOR_ANN_ENABLED",
+        description="是否在 libsql 支持时将向量列迁移为 F32_BLOB 并使用 libsql_vector_idx 近似检索",
+    )
+    vector_ann_candidates: int = Field(
+        default=200,
+        ge=1,
+        env="VECTOR_ANN_CANDIDATES",
+        description="向量索引每次召回的候选条数，按项目过滤后不足 Top-K 时回退精确扫描",
+    )
+    vector_reindex_concurrency: int = Field(
+        default=2,
+        ge=1,
+        env="VECTOR_REINDEX_CONCURRENCY",
+        description="向量重建任务中同时处理的章节数",
+    )
+    vector_matrix_cache_mb: int = Field(
+        default=256,
+        ge=0,
+        env="VECTOR_MATRIX_CACHE_MB",
+        description="热点项目向量矩阵的进程内缓存预算（MB），超出后按最近最少使用淘汰，0 表示关闭",
+    )
+    vector_matrix_cache_ttl: float = Field(
+        default=300.0,
+        ge=0,
+        env="VECTOR_MATRIX_CACHE_TTL",
+        description="向量矩阵缓存的有效期（秒），多进程部署时用于感知其他进程的写入，0 表示不过期",
+    )
     vector_chunk_size: int = Field(
         default=480,
         ge=128,
@@ -148,6 +307,50 @@ class Settings(BaseSettings):
         description="章节分块重叠字数",
     )
 
+    # -------------------- 后台任务配置 --------------------
+    job_worker_concurrency: int = Field(
+        default=2,
+        ge=1,
+        env="JOB_WORKER_CONCURRENCY",
+        description="每个进程内后台任务消费者的数量",
+    )
+    job_max_attempts: int = Field(
+        default=3,
+        ge=1,
+        env="JOB_MAX_ATTEMPTS",
+        description="后台任务最大尝试次数",
+    )
+    job_retry_delay_seconds: int = Field(
+        default=30,
+        ge=0,
+        env="JOB_RETRY_DELAY_SECONDS",
+        description="后台任务失败后的重试间隔基数，单位秒",
+    )
+    job_poll_interval_seconds: float = Field(
+        default=10.0,
+        gt=0,
+        env="JOB_POLL_INTERVAL_SECONDS",
+        description="扫描待执行后台任务的间隔，单位秒",
+    )
+    job_lease_seconds: int = Field(
+        default=120,
+        ge=60,
+        env="JOB_LEASE_SECONDS",
+        description="运行中任务的租约时长，单位秒；执行期间定期续期，租约过期视为进程中断并重新排队",
+    )
+    usage_flush_interval_seconds: float = Field(
+        default=5.0,
+        gt=0,
+        env="USAGE_FLUSH_INTERVAL_SECONDS",
+        description="用量计数在内存中累积后写回数据库的间隔，单位秒",
+    )
+    usage_bucket_seconds: int = Field(
+        default=3600,
+        ge=60,
+        env="USAGE_BUCKET_SECONDS",
+        description="用量计数按时间分桶的粒度，单位秒，用于查看吞吐历史",
+    )
+
     # -------------------- Linux.do OAuth 配置 --------------------
     linuxdo_client_id: Optional[str] = Field(default=None, env="LINUXDO_CLIENT_ID", description="Linux.do OAuth Client ID")
     linuxdo_client_secret: Optional[str] = Field(
@@ -199,6 +402,30 @@ class Settings(BaseSettings):
             raise ValueError("EMBEDDING_PROVIDER 仅支持 openai 或 ollama")
         return candidate
 
+    @validator("vector_storage_encoding", pre=True)
+    def _normalize_vector_storage_encoding(cls, value: Optional[str]) -> str:
+        """限制向量存储编码的取值范围。"""
+        candidate = (value or "float32").strip().lower()
+        if candidate not in {"float32", "float16", "int8"}:
+            raise ValueError("VECTOR_STORAGE_ENCODING 仅支持 float32、float16 或 int8")
+        return candidate
+
+    @validator("writer_version_failure_policy", pre=True)
+    def _normalize_failure_policy(cls, value: Optional[str]) -> str:
+        """限制章节版本失败策略的取值范围。"""
+        candidate = (value or "fail_all").strip().lower()
+        if candidate not in {"fail_all", "keep_successful"}:
+            raise ValueError("WRITER_VERSION_FAILURE_POLICY 仅支持 fail_all 或 keep_successful")
+        return candidate
+
+    @validator("writer_prompt_layout", pre=True)
+    def _normalize_prompt_layout(cls, value: Optional[str]) -> str:
+        """限制写作提示词布局的取值范围。"""
+        candidate = (value or "prefix_cache").strip().lower()
+        if candidate not in {"prefix_cache", "classic"}:
+            raise ValueError("WRITER_PROMPT_LAYOUT 仅支持 prefix_cache 或 classic")
+        return candidate
+
     @validator("logging_level", pre=True)
     def _normalize_logging_level(cls, value: Optional[str]) -> str:
         """规范日志级别配置。"""
@@ -2,7 +2,7 @@ import logging
 
 from pathlib import Path
 
-from sqlalchemy import select, text
+from sqlalchemy import BigInteger, inspect, select, text
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.engine import URL, make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
@@ -25,6 +25,7 @@ async def init_db() -> None:
     # ---- 第一步：创建所有表结构 ----
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await _ensure_added_columns(conn)
     logger.info("数据库表结构已初始化")
 
     # ---- 第二步：确保管理员账号至少存在一个 ----
@@ -106,6 +107,68 @@ async def _ensure_database_exists() -> None:
     await admin_engine.dispose()
 
 
+# create_all 不会为已存在的表补齐新增列，旧库在启动时按需追加
+_ADDED_COLUMNS = (
+    ("novel_projects", "revision", "INTEGER NOT NULL DEFAULT 0"),
+    ("background_jobs", "locked_until", "TIMESTAMP NULL"),
+    ("background_jobs", "active_dedupe_key", "VARCHAR(255) NULL"),
+)
+
+# 旧库中需要补建的唯一索引：(表, 索引名, 列)
+_ADDED_UNIQUE_INDEXES = (
+    ("background_jobs", "ix_background_jobs_active_dedupe_key", "active_dedupe_key"),
+)
+
+# 旧库中需要放宽为 BIGINT 的整数列；SQLite 的 INTEGER 本身即 64 位，无需处理
+_WIDENED_COLUMNS = (
+    ("usage_metrics", "value", "BIGINT NOT NULL DEFAULT 0"),
+    ("usage_metric_buckets", "value", "BIGINT NOT NULL DEFAULT 0"),
+)
+
+
+async def _ensure_added_columns(conn) -> None:
+    def _missing_columns(sync_conn):
+        inspector = inspect(sync_conn)
+        missing = []
+        for table, column, ddl in _ADDED_COLUMNS:
+            existing = {item["name"] for item in inspector.get_columns(table)}
+            if column not in existing:
+                missing.append((table, column, ddl))
+        return missing
+
+    def _missing_indexes(sync_conn):
+        inspector = inspect(sync_conn)
+        missing = []
+        for table, name, column in _ADDED_UNIQUE_INDEXES:
+            existing = {item["name"] for item in inspector.get_indexes(table)}
+            if name not in existing:
+                missing.append((table, name, column))
+        return missing
+
+    def _narrow_columns(sync_conn):
+        inspector = inspect(sync_conn)
+        narrow = []
+        for table, column, ddl in _WIDENED_COLUMNS:
+            types = {item["name"]: item["type"] for item in inspector.get_columns(table)}
+            if column in types and not isinstance(types[column], BigInteger):
+                narrow.append((table, column, ddl))
+        return narrow
+
+    for table, column, ddl in await conn.run_sync(_missing_columns):
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        logger.info("已为表 %s 补充列 %s", table, column)
+
+    for table, name, column in await conn.run_sync(_missing_indexes):
+        await conn.execute(text(f"CREATE UNIQUE INDEX {name} ON {table} ({column})"))
+        logger.info("已为表 %s 补充唯一索引 %s", table, name)
+
+    if conn.dialect.name == "sqlite":
+        return
+    for table, column, ddl in await conn.run_sync(_narrow_columns):
+        await conn.execute(text(f"ALTER TABLE {table} MODIFY COLUMN {column} {ddl}"))
+        logger.info("已将表 %s 的列 %s 放宽为 BIGINT", table, column)
+
+
 async def _ensure_default_prompts(session: AsyncSession) -> None:
     prompts_dir = Path(__file__).resolve().parents[2] / "prompts"
     if not prompts_dir.is_dir():
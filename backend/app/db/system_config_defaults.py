@@ -132,6 +132,11 @@ SYSTEM_CONFIG_DEFAULTS: list[SystemConfigDefault] = [
         value_getter=lambda config: _to_optional_str(config.embedding_model_vector_size),
         description="嵌入向量维度，留空则自动检测。",
     ),
+    SystemConfigDefault(
+        key="embedding.request_dimensions",
+        value_getter=lambda config: _bool_to_text(config.embedding_request_dimensions),
+        description="是否在嵌入请求中携带 dimensions 参数，按嵌入维度截断向量（仅部分模型支持）。",
+    ),
     SystemConfigDefault(
         key="ollama.embedding_base_url",
         value_getter=lambda config: _to_optional_str(config.ollama_embedding_base_url),
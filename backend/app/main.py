@@ -9,7 +9,26 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from .core.config import settings
 from .db.init_db import init_db
+from .services.background_job_service import background_jobs
+from .services.blueprint_generation_service import BLUEPRINT_GENERATION_JOB, run_blueprint_generation_job
+from .services.chapter_generation_service import (
+    CHAPTER_GENERATION_JOB,
+    CHAPTER_OUTLINE_JOB,
+    run_chapter_generation_job,
+    run_chapter_outline_job,
+)
+from .services.chapter_summary_service import CHAPTER_SUMMARY_JOB, run_chapter_summary_job
 from .services.prompt_service import PromptService
+from .services.quota_service import QuotaActionMiddleware
+from .services.usage_service import usage_counters
+from .services.vector_maintenance_service import (
+    VECTOR_REENCODE_JOB,
+    VECTOR_REINDEX_JOB,
+    run_vector_reencode_job,
+    run_vector_reindex_job,
+)
+from .services.vector_store_service import close_vector_store, init_vector_store
+from .utils.llm_tool import close_llm_clients
 from .db.session import AsyncSessionLocal
 from .api.routers import api_router
 
@@ -71,7 +90,25 @@ async def lifespan(app: FastAPI):
     async with AsyncSessionLocal() as session:
         prompt_service = PromptService(session)
         await prompt_service.preload()
-    yield
+    # 向量库客户端在进程内共享，启动时完成一次性建表
+    await init_vector_store()
+    # 后台任务消费者负责章节摘要回填、章节/大纲/蓝图生成、向量库维护等耗时操作
+    background_jobs.register(CHAPTER_SUMMARY_JOB, run_chapter_summary_job)
+    background_jobs.register(CHAPTER_GENERATION_JOB, run_chapter_generation_job)
+    background_jobs.register(CHAPTER_OUTLINE_JOB, run_chapter_outline_job)
+    background_jobs.register(BLUEPRINT_GENERATION_JOB, run_blueprint_generation_job)
+    background_jobs.register(VECTOR_REENCODE_JOB, run_vector_reencode_job)
+    background_jobs.register(VECTOR_REINDEX_JOB, run_vector_reindex_job)
+    await background_jobs.start()
+    # 用量计数在内存中累积，定期批量写回，退出时落库剩余计数
+    await usage_counters.start()
+    try:
+        yield
+    finally:
+        await background_jobs.stop()
+        await usage_counters.stop()
+        await close_vector_store()
+        await close_llm_clients()
 
 
 app = FastAPI(
@@ -90,6 +127,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 每个请求作为一次用户操作计入每日配额，需覆盖流式响应的整个生命周期，因此使用纯 ASGI 中间件
+app.add_middleware(QuotaActionMiddleware)
+
 app.include_router(api_router)
 
 
@@ -1,6 +1,7 @@
 """集中导出 ORM 模型，确保 SQLAlchemy 元数据在初始化时被正确加载。"""
 
 from .admin_setting import AdminSetting
+from .background_job import BackgroundJob
 from .llm_config import LLMConfig
 from .novel import (
     BlueprintCharacter,
@@ -15,13 +16,14 @@ from .novel import (
 )
 from .prompt import Prompt
 from .update_log import UpdateLog
-from .usage_metric import UsageMetric
+from .usage_metric import UsageMetric, UsageMetricBucket
 from .user import User
 from .user_daily_request import UserDailyRequest
 from .system_config import SystemConfig
 
 __all__ = [
     "AdminSetting",
+    "BackgroundJob",
     "LLMConfig",
     "NovelConversation",
     "NovelBlueprint",
@@ -35,6 +37,7 @@ __all__ = [
     "Prompt",
     "UpdateLog",
     "UsageMetric",
+    "UsageMetricBucket",
     "User",
     "UserDailyRequest",
     "SystemConfig",
@@ -5,7 +5,9 @@ from typing import Optional
 
 from sqlalchemy import JSON, BigInteger, DateTime, Float, ForeignKey, Integer, String, Text, func
 from sqlalchemy.dialects.mysql import LONGTEXT
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Mapped, column_property, mapped_column, relationship
+from sqlalchemy.sql.functions import FunctionElement
 
 from ..db.base import Base
 
@@ -14,6 +16,24 @@ BIGINT_PK_TYPE = BigInteger().with_variant(Integer, "sqlite")
 LONG_TEXT_TYPE = Text().with_variant(LONGTEXT, "mysql")
 
 
+class char_length(FunctionElement):
+    """按字符计算文本长度：MySQL 的 LENGTH 返回字节数，需使用 CHAR_LENGTH。"""
+
+    type = Integer()
+    inherit_cache = True
+    name = "char_length"
+
+
+@compiles(char_length)
+def _compile_char_length(element, compiler, **kw):
+    return f"CHAR_LENGTH({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(char_length, "sqlite")
+def _compile_char_length_sqlite(element, compiler, **kw):
+    return f"LENGTH({compiler.process(element.clauses, **kw)})"
+
+
 class _MetadataAccessor:
     """Descriptor 用于将 `metadata` 访问重定向到 `metadata_`，且保持 Base.metadata 可用。"""
 
@@ -36,6 +56,8 @@ class NovelProject(Base):
     title: Mapped[str] = mapped_column(String(255), nullable=False)
     initial_prompt: Mapped[Optional[str]] = mapped_column(Text)
     status: Mapped[str] = mapped_column(String(32), default="draft")
+    # 每次项目内容变更时递增，前端据此判断增量响应是否与本地数据衔接
+    revision: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -193,10 +215,13 @@ class ChapterVersion(Base):
     chapter_id: Mapped[int] = mapped_column(ForeignKey("chapters.id", ondelete="CASCADE"), nullable=False)
     version_label: Mapped[Optional[str]] = mapped_column(String(64))
     provider: Mapped[Optional[str]] = mapped_column(String(64))
-    content: Mapped[str] = mapped_column(LONG_TEXT_TYPE, nullable=False)
+    # 正文体积大，默认延迟加载；需要正文的查询通过 undefer 显式加载
+    content: Mapped[str] = mapped_column(LONG_TEXT_TYPE, nullable=False, deferred=True)
     metadata_: Mapped[Optional[dict]] = mapped_column("metadata", JSON)
     metadata = _MetadataAccessor()
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # 由数据库计算的正文字数，列表展示版本信息时无需读取正文
+    content_length: Mapped[int] = column_property(char_length(content))
 
     chapter: Mapped[Chapter] = relationship(
         "Chapter",
@@ -1,4 +1,6 @@
-from sqlalchemy import Integer, String
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from ..db.base import Base
@@ -10,4 +12,15 @@ class UsageMetric(Base):
     __tablename__ = "usage_metrics"
 
     key: Mapped[str] = mapped_column(String(64), primary_key=True)
-    value: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # token 用量等累计值增长很快，使用 64 位整数避免溢出
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class UsageMetricBucket(Base):
+    """按时间分桶的计数器，每个指标每个时间段一行，用于查看吞吐历史。"""
+
+    __tablename__ = "usage_metric_buckets"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+
+from .base import BaseRepository
+from ..models import BackgroundJob
+
+
+class BackgroundJobRepository(BaseRepository[BackgroundJob]):
+    model = BackgroundJob
+
+    async def get_active_by_dedupe_key(self, dedupe_key: str) -> Optional[BackgroundJob]:
+        """返回同一 dedupe_key 下待执行或执行中的任务。"""
+        stmt = select(BackgroundJob).where(BackgroundJob.active_dedupe_key == dedupe_key)
+        result = await self.session.execute(stmt)
+        return result.scalars().first()
+
+    async def insert_active(self, values: Dict[str, Any]) -> bool:
+        """插入带 active_dedupe_key 的任务；已有未结束的同键任务时不插入并返回 False。"""
+        return await self.insert_ignore(values, conflict_columns=["active_dedupe_key"])
+
+    async def list_recent(
+        self,
+        *,
+        user_id: int,
+        project_id: Optional[str] = None,
+        limit: int = 20,
+    ) -> List[BackgroundJob]:
+        stmt = select(BackgroundJob).where(BackgroundJob.user_id == user_id)
+        if project_id:
+            stmt = stmt.where(BackgroundJob.project_id == project_id)
+        stmt = stmt.order_by(BackgroundJob.created_at.desc()).limit(limit)
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def list_due_ids(self, limit: int = 100) -> List[str]:
+        now = datetime.now(timezone.utc)
+        stmt = (
+            select(BackgroundJob.id)
+            .where(BackgroundJob.status == "pending", BackgroundJob.run_after <= now)
+            .order_by(BackgroundJob.run_after.asc())
+            .limit(limit)
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def claim(self, job_id: str, lease_seconds: int) -> bool:
+        """以条件更新的方式抢占任务并取得租约，多进程同时消费时只有一个会成功。"""
+        now = datetime.now(timezone.utc)
+        result = await self.session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.id == job_id, BackgroundJob.status == "pending")
+            .values(
+                status="running",
+                started_at=now,
+                locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=BackgroundJob.attempts + 1,
+            )
+        )
+        await self.session.commit()
+        return result.rowcount == 1
+
+    async def renew_lease(self, job_id: str, lease_seconds: int) -> bool:
+        """续期执行中任务的租约；返回 False 表示任务已不再由本进程持有。"""
+        result = await self.session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.id == job_id, BackgroundJob.status == "running")
+            .values(locked_until=datetime.now(timezone.utc) + timedelta(seconds=lease_seconds))
+        )
+        await self.session.commit()
+        return result.rowcount == 1
+
+    async def release_stale(self, lease_seconds: int) -> int:
+        """将租约过期仍处于 running 的任务重新置为 pending，用于进程异常退出后的恢复。
+
+        没有租约记录的旧任务按 ``started_at`` 加租约时长判断。
+        """
+        now = datetime.now(timezone.utc)
+        deadline = now - timedelta(seconds=lease_seconds)
+        result = await self.session.execute(
+            update(BackgroundJob)
+            .where(
+                BackgroundJob.status == "running",
+                or_(
+                    BackgroundJob.locked_until < now,
+                    and_(
+                        BackgroundJob.locked_until.is_(None),
+                        or_(BackgroundJob.started_at.is_(None), BackgroundJob.started_at < deadline),
+                    ),
+                ),
+            )
+            .values(status="pending", locked_until=None)
+        )
+        await self.session.commit()
+        return result.rowcount or 0
@@ -1,6 +1,7 @@
-from typing import Any, Generic, Iterable, Optional, TypeVar
+from typing import Any, Generic, Iterable, Optional, Sequence, TypeVar
 
 from sqlalchemy import select
+from sqlalchemy.dialects import mysql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import InstrumentedAttribute
 
@@ -42,3 +43,47 @@ class BaseRepository(Generic[ModelType]):
             setattr(instance, key, value)
         await self.session.flush()
         return instance
+
+    async def upsert_increment(
+        self,
+        values: dict[str, Any],
+        *,
+        counter: str,
+        amount: int,
+        conflict_columns: Optional[Sequence[str]] = None,
+        model: Optional[type] = None,
+    ) -> None:
+        """单条语句完成“不存在则插入、存在则累加”，并发写入同一行时不会丢失计数。
+
+        ``values`` 需包含唯一键列，``counter`` 列在插入时取 ``amount``，冲突时执行
+        ``counter = counter + amount``；``conflict_columns`` 默认为主键列（MySQL 由唯一索引自动判定），
+        ``model`` 默认为仓储对应的模型。
+        """
+        table = (model or self.model).__table__
+        column = table.c[counter]
+        insert_values = {**values, counter: amount}
+        if self.session.get_bind().dialect.name == "mysql":
+            stmt = mysql.insert(table).values(**insert_values)
+            stmt = stmt.on_duplicate_key_update({counter: column + amount})
+        else:
+            keys = conflict_columns or [col.name for col in table.primary_key.columns]
+            stmt = sqlite.insert(table).values(**insert_values)
+            stmt = stmt.on_conflict_do_update(index_elements=keys, set_={counter: column + amount})
+        await self.session.execute(stmt)
+
+    async def insert_ignore(
+        self,
+        values: dict[str, Any],
+        *,
+        conflict_columns: Optional[Sequence[str]] = None,
+        model: Optional[type] = None,
+    ) -> bool:
+        """插入一行，唯一键冲突时什么也不做；返回是否真正插入。"""
+        table = (model or self.model).__table__
+        if self.session.get_bind().dialect.name == "mysql":
+            stmt = mysql.insert(table).values(**values).prefix_with("IGNORE")
+        else:
+            keys = conflict_columns or [col.name for col in table.primary_key.columns]
+            stmt = sqlite.insert(table).values(**values).on_conflict_do_nothing(index_elements=keys)
+        result = await self.session.execute(stmt)
+        return result.rowcount == 1
@@ -1,29 +1,121 @@
-from typing import Iterable, Optional
+from enum import Enum
+from typing import Any, Iterable, List, Optional
 
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, undefer
 
 from .base import BaseRepository
-from ..models import Chapter, NovelProject
+from ..models import Chapter, ChapterVersion, NovelProject
+
+
+class ProjectLoad(str, Enum):
+    """项目加载档位，调用方按实际用到的数据选择最小的一档。"""
+
+    OWNERSHIP = "ownership"  # 仅项目行，用于归属校验与小范围写入
+    OUTLINE = "outline"  # 蓝图、角色、关系、章节纲要与章节状态，不含任何正文
+    SELECTED_CONTENT = "selected_content"  # 在 OUTLINE 基础上加载各章选中版本的正文
+    FULL = "full"  # 全部对话、所有版本元数据与评估，仅用于完整序列化
+
+
+def _project_load_options(load: ProjectLoad) -> List[Any]:
+    if load == ProjectLoad.OWNERSHIP:
+        return []
+    options: List[Any] = [
+        selectinload(NovelProject.blueprint),
+        selectinload(NovelProject.characters),
+        selectinload(NovelProject.relationships_),
+        selectinload(NovelProject.outlines),
+    ]
+    if load == ProjectLoad.OUTLINE:
+        options.append(selectinload(NovelProject.chapters))
+    elif load == ProjectLoad.SELECTED_CONTENT:
+        options.append(
+            selectinload(NovelProject.chapters)
+            .selectinload(Chapter.selected_version)
+            .undefer(ChapterVersion.content)
+        )
+    else:
+        options.extend(
+            [
+                selectinload(NovelProject.conversations),
+                # 候选版本只加载元数据，正文仅保留选中版本
+                selectinload(NovelProject.chapters).selectinload(Chapter.versions),
+                selectinload(NovelProject.chapters).selectinload(Chapter.evaluations),
+                selectinload(NovelProject.chapters)
+                .selectinload(Chapter.selected_version)
+                .undefer(ChapterVersion.content),
+            ]
+        )
+    return options
 
 
 class NovelRepository(BaseRepository[NovelProject]):
     model = NovelProject
 
-    async def get_by_id(self, project_id: str) -> Optional[NovelProject]:
+    async def get_by_id(self, project_id: str, load: ProjectLoad = ProjectLoad.FULL) -> Optional[NovelProject]:
         stmt = (
             select(NovelProject)
             .where(NovelProject.id == project_id)
+            .options(*_project_load_options(load))
+        )
+        result = await self.session.execute(stmt)
+        return result.scalars().first()
+
+    async def get_chapter_detail(
+        self,
+        project_id: str,
+        chapter_number: int,
+        *,
+        with_version_content: bool = False,
+    ) -> Optional[Chapter]:
+        """加载单个章节及其全部版本与评估，避免为一章读取整个项目。
+
+        选中版本的正文总是加载；其余版本的正文仅在 with_version_content 为真时加载。
+        """
+        chapters = await self.list_chapter_details(
+            project_id,
+            [chapter_number],
+            with_version_content=with_version_content,
+        )
+        return chapters[0] if chapters else None
+
+    async def list_chapter_details(
+        self,
+        project_id: str,
+        chapter_numbers: Iterable[int],
+        *,
+        with_version_content: bool = False,
+    ) -> List[Chapter]:
+        """按章节号批量加载章节详情，加载范围与 get_chapter_detail 一致。"""
+        numbers = list(chapter_numbers)
+        if not numbers:
+            return []
+        versions_loader = selectinload(Chapter.versions)
+        if with_version_content:
+            versions_loader = versions_loader.undefer(ChapterVersion.content)
+        stmt = (
+            select(Chapter)
+            .where(Chapter.project_id == project_id, Chapter.chapter_number.in_(numbers))
             .options(
-                selectinload(NovelProject.blueprint),
-                selectinload(NovelProject.characters),
-                selectinload(NovelProject.relationships_),
-                selectinload(NovelProject.outlines),
-                selectinload(NovelProject.conversations),
-                selectinload(NovelProject.chapters).selectinload(Chapter.versions),
-                selectinload(NovelProject.chapters).selectinload(Chapter.evaluations),
-                selectinload(NovelProject.chapters).selectinload(Chapter.selected_version),
+                versions_loader,
+                selectinload(Chapter.evaluations),
+                selectinload(Chapter.selected_version).undefer(ChapterVersion.content),
+            )
+            .order_by(Chapter.chapter_number)
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def get_chapter_version(self, project_id: str, chapter_number: int, version_id: int) -> Optional[ChapterVersion]:
+        stmt = (
+            select(ChapterVersion)
+            .join(Chapter, ChapterVersion.chapter_id == Chapter.id)
+            .where(
+                Chapter.project_id == project_id,
+                Chapter.chapter_number == chapter_number,
+                ChapterVersion.id == version_id,
             )
+            .options(undefer(ChapterVersion.content))
         )
         result = await self.session.execute(stmt)
         return result.scalars().first()
@@ -36,7 +128,7 @@ class NovelRepository(BaseRepository[NovelProject]):
             .options(
                 selectinload(NovelProject.blueprint),
                 selectinload(NovelProject.outlines),
-                selectinload(NovelProject.chapters).selectinload(Chapter.selected_version),
+                selectinload(NovelProject.chapters),
             )
         )
         return result.scalars().all()
@@ -49,7 +141,7 @@ class NovelRepository(BaseRepository[NovelProject]):
                 selectinload(NovelProject.owner),
                 selectinload(NovelProject.blueprint),
                 selectinload(NovelProject.outlines),
-                selectinload(NovelProject.chapters).selectinload(Chapter.selected_version),
+                selectinload(NovelProject.chapters),
             )
         )
         return result.scalars().all()
@@ -1,4 +1,4 @@
-from typing import Iterable, Optional
+from typing import Dict, Iterable, Optional
 
 from sqlalchemy import select
 
@@ -16,3 +16,8 @@ class SystemConfigRepository(BaseRepository[SystemConfig]):
     async def list_all(self) -> Iterable[SystemConfig]:
         result = await self.session.execute(select(SystemConfig).order_by(SystemConfig.key))
         return result.scalars().all()
+
+    async def load_values(self) -> Dict[str, str]:
+        """只读取键值列，不经过会话的实体缓存，保证拿到数据库中的最新值。"""
+        result = await self.session.execute(select(SystemConfig.key, SystemConfig.value))
+        return {key: value for key, value in result.all()}
@@ -1,9 +1,10 @@
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
 
 from sqlalchemy import select
 
 from .base import BaseRepository
-from ..models import UsageMetric
+from ..models import UsageMetric, UsageMetricBucket
 
 
 class UsageMetricRepository(BaseRepository[UsageMetric]):
@@ -17,3 +18,28 @@ class UsageMetricRepository(BaseRepository[UsageMetric]):
             self.session.add(instance)
             await self.session.flush()
         return instance
+
+    async def get_value(self, key: str) -> int:
+        result = await self.session.execute(select(UsageMetric.value).where(UsageMetric.key == key))
+        return result.scalars().first() or 0
+
+    async def increment(self, key: str, amount: int) -> None:
+        await self.upsert_increment({"key": key}, counter="value", amount=amount)
+
+
+class UsageMetricBucketRepository(BaseRepository[UsageMetricBucket]):
+    model = UsageMetricBucket
+
+    async def increment(self, key: str, bucket_start: datetime, amount: int) -> None:
+        await self.upsert_increment(
+            {"key": key, "bucket_start": bucket_start},
+            counter="value",
+            amount=amount,
+        )
+
+    async def list_since(self, key: str, since: Optional[datetime] = None) -> List[UsageMetricBucket]:
+        stmt = select(UsageMetricBucket).where(UsageMetricBucket.key == key)
+        if since is not None:
+            stmt = stmt.where(UsageMetricBucket.bucket_start >= since)
+        result = await self.session.execute(stmt.order_by(UsageMetricBucket.bucket_start.asc()))
+        return list(result.scalars().all())
@@ -56,6 +56,47 @@ class UserRepository(BaseRepository[User]):
         value = result.scalars().first()
         return value or 0
 
+    async def reserve_daily_request(self, user_id: int, request_date: date, limit: int) -> bool:
+        """在未达上限时为当日计数加一，返回是否预占成功。
+
+        常见路径只有一条条件更新；当日首次请求时插入计数为 1 的行，
+        若并发请求已先插入（唯一约束冲突），再执行一次条件更新。
+        """
+        if limit <= 0:
+            return False
+        stmt = (
+            update(UserDailyRequest)
+            .where(
+                UserDailyRequest.user_id == user_id,
+                UserDailyRequest.request_date == request_date,
+                UserDailyRequest.request_count < limit,
+            )
+            .values(request_count=UserDailyRequest.request_count + 1)
+        )
+        result = await self.session.execute(stmt)
+        if result.rowcount:
+            return True
+        inserted = await self.insert_ignore(
+            {"user_id": user_id, "request_date": request_date, "request_count": 1},
+            conflict_columns=["user_id", "request_date"],
+            model=UserDailyRequest,
+        )
+        if inserted:
+            return True
+        result = await self.session.execute(stmt)
+        return bool(result.rowcount)
+
+    async def refund_daily_request(self, user_id: int, request_date: date) -> None:
+        await self.session.execute(
+            update(UserDailyRequest)
+            .where(
+                UserDailyRequest.user_id == user_id,
+                UserDailyRequest.request_date == request_date,
+                UserDailyRequest.request_count > 0,
+            )
+            .values(request_count=UserDailyRequest.request_count - 1)
+        )
+
     async def count_users(self) -> int:
         stmt = select(func.count(User.id))
         result = await self.session.execute(stmt)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -10,6 +10,17 @@ class Statistics(BaseModel):
     api_request_count: int
 
 
+class UsageBucket(BaseModel):
+    bucket_start: datetime = Field(..., description="时间桶起始时间（UTC）")
+    value: int
+
+
+class UsageHistory(BaseModel):
+    key: str
+    bucket_seconds: int = Field(..., description="时间桶粒度（秒）")
+    buckets: List[UsageBucket]
+
+
 class DailyRequestLimit(BaseModel):
     limit: int = Field(..., ge=0, description="匿名用户每日可用次数")
 
@@ -47,3 +58,14 @@ class AdminNovelSummary(BaseModel):
     last_edited: str
     completed_chapters: int
     total_chapters: int
+
+
+class VectorIndexBenchmark(BaseModel):
+    project_id: str
+    ann_available: bool = Field(..., description="向量库是否已启用原生向量索引")
+    samples: int = Field(..., description="实际参与对比的查询数")
+    top_k: int
+    recall: Optional[float] = Field(default=None, description="向量索引结果相对精确扫描的平均召回率")
+    ann_fallbacks: int = Field(..., description="索引结果不足 Top-K、需回退精确扫描的查询数")
+    ann_latency_ms: Dict[str, float] = Field(default_factory=dict)
+    exact_latency_ms: Dict[str, float] = Field(default_factory=dict)
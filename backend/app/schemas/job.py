@@ -0,0 +1,21 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, Field
+
+
+class BackgroundJobRead(BaseModel):
+    id: str = Field(..., description="任务 ID")
+    job_type: str = Field(..., description="任务类型")
+    status: str = Field(..., description="任务状态：pending / running / succeeded / failed")
+    project_id: Optional[str] = Field(default=None, description="关联项目")
+    chapter_number: Optional[int] = Field(default=None, description="关联章节号")
+    attempts: int = Field(default=0, description="已执行次数")
+    result: Optional[Dict[str, Any]] = Field(default=None, description="任务成功后的结果")
+    error: Optional[str] = Field(default=None, description="最近一次失败原因")
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
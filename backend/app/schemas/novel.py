@@ -1,3 +1,4 @@
+from datetime import datetime
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
@@ -53,10 +54,25 @@ class ChapterOutline(BaseModel):
     summary: str
 
 
+class ChapterVersionMeta(BaseModel):
+    """章节版本的元数据，不包含正文。"""
+
+    id: int
+    label: Optional[str] = None
+    length: int = 0
+    created_at: Optional[datetime] = None
+
+
+class ChapterVersionContent(ChapterVersionMeta):
+    content: str
+
+
 class Chapter(ChapterOutline):
     real_summary: Optional[str] = None
     content: Optional[str] = None
+    # 候选版本正文仅在单章节详情中返回，项目级响应只携带 version_summaries
     versions: Optional[List[str]] = None
+    version_summaries: Optional[List[ChapterVersionMeta]] = None
     evaluation: Optional[str] = None
     generation_status: ChapterGenerationStatus = ChapterGenerationStatus.NOT_GENERATED
 
@@ -89,11 +105,22 @@ class NovelProject(BaseModel):
     conversation_history: List[Dict[str, Any]] = []
     blueprint: Optional[Blueprint] = None
     chapters: List[Chapter] = []
+    revision: int = 0
 
     class Config:
         from_attributes = True
 
 
+class ChapterMutationResponse(BaseModel):
+    """写作类接口的增量响应，仅携带本次变更涉及的章节。"""
+
+    project_id: str
+    revision: int = Field(..., description="变更后的项目版本号")
+    chapters: List[Chapter] = Field(default_factory=list, description="新增或变更的章节")
+    outlines: List[ChapterOutline] = Field(default_factory=list, description="新增或变更的章节纲要")
+    deleted_chapter_numbers: List[int] = Field(default_factory=list, description="已删除的章节号")
+
+
 class NovelProjectSummary(BaseModel):
     id: str
     title: str
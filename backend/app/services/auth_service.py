@@ -17,9 +17,9 @@ import smtplib
 from ..core.config import settings
 from ..core.security import create_access_token, hash_password, verify_password
 from ..models import User
-from ..repositories.system_config_repository import SystemConfigRepository
 from ..repositories.user_repository import UserRepository
 from ..schemas.user import AuthOptions, Token, UserCreate, UserInDB, UserRegistration
+from .config_service import system_config_cache
 
 
 _VERIFICATION_CACHE: Dict[str, tuple[str, float]] = {}
@@ -32,7 +32,6 @@ class AuthService:
     def __init__(self, session):
         self.session = session
         self.user_repo = UserRepository(session)
-        self.system_config_repo = SystemConfigRepository(session)
         self._verification_cache = _VERIFICATION_CACHE
         self._last_send_time = _LAST_SEND_TIME
 
@@ -122,11 +121,8 @@ class AuthService:
             "smtp.password",
             "smtp.from",
         ]
-        configs = {}
-        for key in keys:
-            config = await self.system_config_repo.get_by_key(key)
-            if config:
-                configs[key] = config.value
+        snapshot = await system_config_cache.get_snapshot(self.session)
+        configs = {key: snapshot.get(key) for key in keys if snapshot.get(key) is not None}
 
         required_keys = {"smtp.server", "smtp.port", "smtp.username", "smtp.password", "smtp.from"}
         if not required_keys.issubset(configs.keys()):
@@ -329,8 +325,7 @@ class AuthService:
         return await self.create_access_token(user)
 
     async def _get_config_value(self, key: str) -> Optional[str]:
-        config = await self.system_config_repo.get_by_key(key)
-        return config.value if config else None
+        return await system_config_cache.get(self.session, key)
 
     async def get_config_value(self, key: str) -> Optional[str]:
         """对外暴露的配置读取接口，便于路由层复用。"""
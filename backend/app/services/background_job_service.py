@@ -0,0 +1,298 @@
+"""
+后台任务服务：基于数据库持久化状态的 asyncio 任务队列。
+
+任务写入 ``background_jobs`` 表后由进程内的消费者协程执行；
+多进程部署时通过条件更新抢占任务，进程重启后会自动恢复未完成的任务。
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db.session import AsyncSessionLocal
+from ..models import BackgroundJob
+from ..repositories.background_job_repository import BackgroundJobRepository
+from .quota_service import daily_quota
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[AsyncSession, BackgroundJob], Awaitable[Optional[Dict[str, Any]]]]
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """参数错误、权限不足、配额耗尽等 4xx 错误重试也不会成功，直接判定失败。"""
+    return not (isinstance(exc, HTTPException) and exc.status_code < 500)
+
+
+def _describe_error(exc: Exception) -> str:
+    if isinstance(exc, HTTPException):
+        return str(exc.detail)
+    return str(exc)
+
+
+class BackgroundJobService:
+    """任务的创建与查询，供路由与业务服务在请求会话内调用。"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.repo = BackgroundJobRepository(session)
+
+    async def enqueue(
+        self,
+        job_type: str,
+        *,
+        user_id: Optional[int] = None,
+        project_id: Optional[str] = None,
+        chapter_number: Optional[int] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        dedupe_key: Optional[str] = None,
+    ) -> BackgroundJob:
+        """创建任务并通知消费者。
+
+        同一 dedupe_key 最多存在一个待执行或执行中的任务，重复提交时返回已有任务：
+        待执行的任务更新为最新参数，执行中的任务保持不变。去重由唯一索引保证，并发提交也只会插入一行。
+        """
+        if dedupe_key:
+            job = await self._enqueue_deduplicated(
+                job_type,
+                user_id=user_id,
+                project_id=project_id,
+                chapter_number=chapter_number,
+                payload=payload,
+                dedupe_key=dedupe_key,
+            )
+        else:
+            job = BackgroundJob(
+                id=str(uuid.uuid4()),
+                job_type=job_type,
+                status="pending",
+                user_id=user_id,
+                project_id=project_id,
+                chapter_number=chapter_number,
+                dedupe_key=dedupe_key,
+                payload=payload,
+            )
+            await self.repo.add(job)
+        await self.session.commit()
+        background_jobs.notify(job.id)
+        logger.info("已提交后台任务: type=%s id=%s project=%s", job_type, job.id, project_id)
+        return job
+
+    async def _enqueue_deduplicated(
+        self,
+        job_type: str,
+        *,
+        user_id: Optional[int],
+        project_id: Optional[str],
+        chapter_number: Optional[int],
+        payload: Optional[Dict[str, Any]],
+        dedupe_key: str,
+    ) -> BackgroundJob:
+        # 已有任务可能恰好在插入与查询之间结束，此时重新尝试插入
+        for _ in range(3):
+            job_id = str(uuid.uuid4())
+            inserted = await self.repo.insert_active(
+                {
+                    "id": job_id,
+                    "job_type": job_type,
+                    "status": "pending",
+                    "user_id": user_id,
+                    "project_id": project_id,
+                    "chapter_number": chapter_number,
+                    "dedupe_key": dedupe_key,
+                    "active_dedupe_key": dedupe_key,
+                    "payload": payload,
+                }
+            )
+            job = await self.repo.get(id=job_id) if inserted else await self.repo.get_active_by_dedupe_key(dedupe_key)
+            if job is None:
+                continue
+            if not inserted and job.status == "pending":
+                job.payload = payload
+                job.user_id = user_id
+            return job
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="任务提交冲突，请稍后重试")
+
+    async def get_job(self, job_id: str) -> Optional[BackgroundJob]:
+        return await self.repo.get(id=job_id)
+
+    async def get_user_job(self, job_id: str, user_id: int) -> BackgroundJob:
+        job = await self.repo.get(id=job_id)
+        if not job or job.user_id != user_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
+        return job
+
+    async def list_user_jobs(
+        self,
+        user_id: int,
+        *,
+        project_id: Optional[str] = None,
+        limit: int = 20,
+    ) -> List[BackgroundJob]:
+        return await self.repo.list_recent(user_id=user_id, project_id=project_id, limit=limit)
+
+
+class BackgroundJobWorker:
+    """进程内的任务消费者池，按 job_type 分发到注册的处理函数。"""
+
+    def __init__(self) -> None:
+        self._handlers: Dict[str, JobHandler] = {}
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        # 已在本进程队列中或正在执行的任务，轮询时跳过，避免重复入队与无效的抢占更新
+        self._scheduled: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, job_type: str, handler: JobHandler) -> None:
+        self._handlers[job_type] = handler
+
+    def notify(self, job_id: str) -> None:
+        """将任务放入本进程队列；未启动时由轮询兜底。"""
+        if self._tasks:
+            self._schedule(job_id)
+
+    def _schedule(self, job_id: str) -> None:
+        if job_id in self._scheduled:
+            return
+        self._scheduled.add(job_id)
+        self._queue.put_nowait(job_id)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        concurrency = max(1, settings.job_worker_concurrency)
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(concurrency)]
+        self._tasks.append(asyncio.create_task(self._poll()))
+        logger.info("后台任务消费者已启动: concurrency=%s", concurrency)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._scheduled.clear()
+        self._queue = asyncio.Queue()
+        logger.info("后台任务消费者已停止")
+
+    async def _poll(self) -> None:
+        """定期回收租约过期的任务并扫描到期的待执行任务，覆盖重试、其他进程提交或中断的任务。"""
+        while True:
+            try:
+                async with AsyncSessionLocal() as session:
+                    repo = BackgroundJobRepository(session)
+                    released = await repo.release_stale(settings.job_lease_seconds)
+                    if released:
+                        logger.warning("已恢复 %s 个租约过期的后台任务", released)
+                    for job_id in await repo.list_due_ids():
+                        self._schedule(job_id)
+            except Exception as exc:  # pragma: no cover - 轮询失败不影响消费者
+                logger.warning("扫描后台任务失败: %s", exc)
+            await asyncio.sleep(settings.job_poll_interval_seconds)
+
+    async def _consume(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:  # pragma: no cover - 单个任务异常不应终止消费者
+                logger.exception("后台任务执行异常: id=%s", job_id)
+            finally:
+                self._scheduled.discard(job_id)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        async with AsyncSessionLocal() as session:
+            repo = BackgroundJobRepository(session)
+            if not await repo.claim(job_id, settings.job_lease_seconds):
+                return
+            job = await repo.get(id=job_id)
+            if job is None:
+                return
+            await session.refresh(job)
+            handler = self._handlers.get(job.job_type)
+            started_at = datetime.now(timezone.utc)
+            try:
+                if handler is None:
+                    raise RuntimeError(f"未注册的任务类型: {job.job_type}")
+                heartbeat = asyncio.create_task(self._renew_lease(job_id))
+                try:
+                    # 一次任务执行视为一次用户操作，任务内的多次模型调用只计一次每日配额
+                    async with daily_quota.action():
+                        result = await handler(session, job)
+                finally:
+                    heartbeat.cancel()
+                    await asyncio.gather(heartbeat, return_exceptions=True)
+            except Exception as exc:
+                await session.rollback()
+                await session.refresh(job)
+                job.error = _describe_error(exc)[:2000]
+                job.locked_until = None
+                if _is_retryable(exc) and job.attempts < settings.job_max_attempts:
+                    job.status = "pending"
+                    job.run_after = datetime.now(timezone.utc) + timedelta(
+                        seconds=settings.job_retry_delay_seconds * job.attempts
+                    )
+                    logger.warning(
+                        "后台任务失败，稍后重试: type=%s id=%s attempts=%s error=%s",
+                        job.job_type,
+                        job.id,
+                        job.attempts,
+                        exc,
+                    )
+                else:
+                    job.status = "failed"
+                    job.active_dedupe_key = None
+                    job.finished_at = datetime.now(timezone.utc)
+                    logger.error(
+                        "后台任务最终失败: type=%s id=%s attempts=%s error=%s",
+                        job.job_type,
+                        job.id,
+                        job.attempts,
+                        exc,
+                    )
+            else:
+                job.status = "succeeded"
+                job.active_dedupe_key = None
+                job.locked_until = None
+                job.result = result
+                job.error = None
+                job.finished_at = datetime.now(timezone.utc)
+                logger.info(
+                    "后台任务完成: type=%s id=%s 耗时 %.2fs",
+                    job.job_type,
+                    job.id,
+                    (job.finished_at - started_at).total_seconds(),
+                )
+            await session.commit()
+
+    async def _renew_lease(self, job_id: str) -> None:
+        """任务执行期间按租约时长的三分之一定期续期，使其他进程不会把它当作中断任务回收。"""
+        interval = settings.job_lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with AsyncSessionLocal() as session:
+                    renewed = await BackgroundJobRepository(session).renew_lease(job_id, settings.job_lease_seconds)
+            except Exception as exc:  # pragma: no cover - 续期失败时下个周期重试
+                logger.warning("后台任务续期失败: id=%s error=%s", job_id, exc)
+                continue
+            if not renewed:
+                logger.warning("后台任务租约已失效，可能已被其他进程回收: id=%s", job_id)
+                return
+
+
+# 进程内唯一的消费者池，由 main.lifespan 负责启动与停止
+background_jobs = BackgroundJobWorker()
+
+
+__all__ = [
+    "BackgroundJobService",
+    "BackgroundJobWorker",
+    "JobHandler",
+    "background_jobs",
+]
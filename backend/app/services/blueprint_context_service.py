@@ -0,0 +1,332 @@
+"""
+章节写作用的蓝图上下文：按章节纲要与近期摘要筛选相关角色与关系，并以紧凑 JSON 输出。
+
+每个项目的蓝图按片段（基础设定、逐个角色、逐条关系）预先序列化并缓存在进程内，
+蓝图被替换或修改时立即失效；章节的生成、选择、评审等写入不影响蓝图，缓存继续有效，
+同一项目连续生成章节时无需重复序列化。多进程部署时依赖有效期感知其他进程对蓝图的修改。
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from ..core.config import settings
+from ..schemas.novel import Blueprint
+
+logger = logging.getLogger(__name__)
+
+# 蓝图中禁止携带章节级别的细节信息，避免重复传输大段场景或对话内容
+_BANNED_BLUEPRINT_KEYS = {
+    "chapter_outline",
+    "chapter_summaries",
+    "chapter_details",
+    "chapter_dialogues",
+    "chapter_events",
+    "conversation_history",
+    "character_timelines",
+}
+# 角色的别名字段，命中任意一个即视为出场
+_ALIAS_KEYS = ("aliases", "alias", "nickname", "别名", "昵称")
+_MAX_CACHED_PROJECTS = 256
+_CACHE_TTL_SECONDS = 300.0
+
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+@dataclass(frozen=True)
+class _CharacterEntry:
+    name: str
+    aliases: Tuple[str, ...]
+    serialized: str
+
+
+@dataclass(frozen=True)
+class _RelationshipEntry:
+    source: str
+    target: str
+    serialized: str
+
+
+# 可按整条删减的蓝图条目
+BlueprintItem = Union[_CharacterEntry, _RelationshipEntry]
+
+
+@dataclass(frozen=True)
+class SerializedBlueprint:
+    """按片段序列化的蓝图，渲染时只需拼接选中的片段。"""
+
+    # 基础设定的紧凑 JSON，去掉结尾的 ``}`` 以便追加角色与关系
+    base: str
+    characters: Tuple[_CharacterEntry, ...]
+    relationships: Tuple[_RelationshipEntry, ...]
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class BlueprintContext:
+    """``text`` 为单块蓝图；``stable_text`` 与 ``chapter_text`` 供前缀缓存布局使用。
+
+    ``stable_text`` 只依赖项目蓝图，同一项目逐字节一致：未筛选时即完整蓝图，筛选时为基础设定、
+    核心角色及其相互关系与全体角色名单；``chapter_text`` 为本章额外选中的角色与关系，可能为空。
+
+    ``items`` / ``chapter_items`` 为 ``text`` / ``chapter_text`` 中的角色与关系，按相关度从高到低排列，
+    每条关系紧跟在其两端中较晚出现的角色之后；超出 token 预算时从末尾整条删减，
+    再以 ``render`` / ``render_chapter`` 重新生成合法的 JSON，被删减的角色仍保留名字。
+    """
+
+    text: str
+    stable_text: str
+    chapter_text: str
+    selected_characters: int
+    total_characters: int
+    selected_relationships: int
+    total_relationships: int
+    items: List[BlueprintItem] = field(default_factory=list)
+    chapter_items: List[BlueprintItem] = field(default_factory=list)
+    # ``items`` 开头属于核心角色的条目数，删减时至少保留
+    core_items: int = 0
+    base: str = field(default="{", repr=False)
+    all_names: Tuple[str, ...] = field(default=(), repr=False)
+
+    def render(self, items: Sequence[BlueprintItem]) -> str:
+        characters, relationships = _split(items)
+        kept = {entry.name for entry in characters}
+        others = [name for name in self.all_names if name not in kept]
+        extra = f',"other_characters":{_compact(others)}' if others else ""
+        return _render(self.base, characters, relationships, extra=extra)
+
+    def render_chapter(self, items: Sequence[BlueprintItem]) -> str:
+        if not items:
+            return ""
+        characters, relationships = _split(items)
+        return _render("{", characters, relationships)
+
+
+class BlueprintContextCache:
+    """项目蓝图序列化结果的进程内 LRU 缓存。"""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries: "OrderedDict[str, SerializedBlueprint]" = OrderedDict()
+
+    def get(self, project_id: str, loader: Callable[[], Blueprint]) -> SerializedBlueprint:
+        """命中且未过期时直接返回，否则调用 loader 重新序列化。"""
+        entry = self._entries.get(project_id)
+        if entry is not None and time.monotonic() - entry.loaded_at <= self._ttl:
+            self._entries.move_to_end(project_id)
+            return entry
+        entry = _serialize(loader())
+        self._entries[project_id] = entry
+        self._entries.move_to_end(project_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, project_id: str) -> None:
+        self._entries.pop(project_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+blueprint_context_cache = BlueprintContextCache(_MAX_CACHED_PROJECTS, _CACHE_TTL_SECONDS)
+
+
+def build_blueprint_context(
+    project_id: str,
+    loader: Callable[[], Blueprint],
+    relevance_texts: Sequence[Optional[str]],
+) -> BlueprintContext:
+    """选出与本章相关的角色与关系，返回紧凑 JSON。
+
+    角色数不超过 ``writer_blueprint_full_cast_limit`` 时全部保留；否则保留排在最前的
+    ``writer_blueprint_core_characters`` 个核心角色，以及名字或别名出现在纲要、写作要求与近期摘要中的角色
+    （按出现次数从多到少排列），关系只保留两端都被选中的条目，其余角色仅列出名字。
+    """
+    serialized = blueprint_context_cache.get(project_id, loader)
+    characters = serialized.characters
+    core_count = settings.writer_blueprint_core_characters
+    all_names = tuple(entry.name for entry in characters)
+    if len(characters) <= settings.writer_blueprint_full_cast_limit:
+        items = _order_items(characters, serialized.relationships)
+        context = BlueprintContext(
+            text="",
+            stable_text="",
+            chapter_text="",
+            selected_characters=len(characters),
+            total_characters=len(characters),
+            selected_relationships=len(serialized.relationships),
+            total_relationships=len(serialized.relationships),
+            items=items,
+            core_items=_leading_items(items, characters[:core_count]),
+            base=serialized.base,
+            all_names=all_names,
+        )
+        context.text = context.stable_text = context.render(items)
+        return context
+
+    haystack = "\n".join(text for text in relevance_texts if text)
+    core = characters[:core_count]
+    mentions = [
+        (sum(haystack.count(name) for name in (entry.name, *entry.aliases) if name), entry)
+        for entry in characters[core_count:]
+    ]
+    matched = [entry for count, entry in sorted(mentions, key=lambda pair: -pair[0]) if count]
+    selected = [*core, *matched]
+    names = {entry.name for entry in selected}
+    core_names = {entry.name for entry in core}
+    relationships = [entry for entry in serialized.relationships if entry.source in names and entry.target in names]
+    core_relationships = [
+        entry for entry in relationships if entry.source in core_names and entry.target in core_names
+    ]
+    chapter_relationships = [entry for entry in relationships if entry not in core_relationships]
+
+    items = _order_items(selected, relationships)
+    chapter_items = _order_items(matched, chapter_relationships)
+    context = BlueprintContext(
+        text="",
+        stable_text=_render(
+            serialized.base,
+            core,
+            core_relationships,
+            extra=f',"all_characters":{_compact(list(all_names))}',
+        ),
+        chapter_text="",
+        selected_characters=len(selected),
+        total_characters=len(characters),
+        selected_relationships=len(relationships),
+        total_relationships=len(serialized.relationships),
+        items=items,
+        chapter_items=chapter_items,
+        core_items=_leading_items(items, core),
+        base=serialized.base,
+        all_names=all_names,
+    )
+    context.text = context.render(items)
+    context.chapter_text = context.render_chapter(chapter_items)
+    return context
+
+
+def _order_items(
+    characters: Sequence[_CharacterEntry],
+    relationships: Sequence[_RelationshipEntry],
+) -> List[BlueprintItem]:
+    """角色按给定顺序排列，关系放在其两端中较晚出现的角色之后；两端都不在列表中的关系排在最前。"""
+    position = {entry.name: index for index, entry in enumerate(characters)}
+    attached: Dict[int, List[_RelationshipEntry]] = {}
+    for relation in relationships:
+        anchor = max(position.get(relation.source, -1), position.get(relation.target, -1))
+        attached.setdefault(anchor, []).append(relation)
+    items: List[BlueprintItem] = list(attached.get(-1, []))
+    for index, entry in enumerate(characters):
+        items.append(entry)
+        items.extend(attached.get(index, []))
+    return items
+
+
+def _leading_items(items: Sequence[BlueprintItem], core: Sequence[_CharacterEntry]) -> int:
+    """返回覆盖全部核心角色（连同挂在其后的关系）所需的开头条目数。"""
+    core_names = {entry.name for entry in core}
+    count = 0
+    for index, item in enumerate(items):
+        if isinstance(item, _CharacterEntry):
+            if item.name not in core_names:
+                break
+            core_names.discard(item.name)
+        count = index + 1
+    return count if not core_names else len(items)
+
+
+def _split(items: Sequence[BlueprintItem]) -> Tuple[List[_CharacterEntry], List[_RelationshipEntry]]:
+    characters = [item for item in items if isinstance(item, _CharacterEntry)]
+    relationships = [item for item in items if isinstance(item, _RelationshipEntry)]
+    return characters, relationships
+
+
+def _render(
+    base: str,
+    characters: Sequence[_CharacterEntry],
+    relationships: Sequence[_RelationshipEntry],
+    *,
+    extra: str = "",
+) -> str:
+    return "".join(
+        [
+            base,
+            "" if base.endswith("{") else ",",
+            '"characters":[',
+            ",".join(entry.serialized for entry in characters),
+            '],"relationships":[',
+            ",".join(entry.serialized for entry in relationships),
+            "]",
+            extra,
+            "}",
+        ]
+    )
+
+
+def _serialize(blueprint: Blueprint) -> SerializedBlueprint:
+    data: Dict[str, Any] = blueprint.model_dump()
+    raw_characters: List[Dict[str, Any]] = data.pop("characters", None) or []
+    raw_relationships: List[Dict[str, Any]] = data.pop("relationships", None) or []
+    for key in _BANNED_BLUEPRINT_KEYS:
+        data.pop(key, None)
+    # 空字段不输出，进一步压缩体积
+    data = {key: value for key, value in data.items() if value not in (None, "", [], {})}
+
+    characters = []
+    for character in raw_characters:
+        compacted = {key: value for key, value in character.items() if value not in (None, "", [], {})}
+        characters.append(
+            _CharacterEntry(
+                name=str(character.get("name") or ""),
+                aliases=_collect_aliases(character),
+                serialized=_compact(compacted),
+            )
+        )
+
+    relationships = []
+    for relation in raw_relationships:
+        source = relation.get("character_from") or ""
+        target = relation.get("character_to") or ""
+        compacted = {"from": source, "to": target}
+        compacted.update(
+            {
+                key: value
+                for key, value in relation.items()
+                if key not in {"character_from", "character_to"} and value not in (None, "")
+            }
+        )
+        relationships.append(_RelationshipEntry(source=source, target=target, serialized=_compact(compacted)))
+
+    return SerializedBlueprint(
+        base=_compact(data)[:-1],
+        characters=tuple(characters),
+        relationships=tuple(relationships),
+    )
+
+
+def _collect_aliases(character: Dict[str, Any]) -> Tuple[str, ...]:
+    aliases: List[str] = []
+    for key in _ALIAS_KEYS:
+        value = character.get(key)
+        if isinstance(value, str):
+            aliases.extend(part.strip() for part in value.replace("，", ",").split(","))
+        elif isinstance(value, list):
+            aliases.extend(str(item).strip() for item in value)
+    return tuple(alias for alias in aliases if alias)
+
+
+__all__ = [
+    "BlueprintContext",
+    "BlueprintItem",
+    "BlueprintContextCache",
+    "blueprint_context_cache",
+    "build_blueprint_context",
+]
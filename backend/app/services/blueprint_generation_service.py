@@ -0,0 +1,119 @@
+"""
+蓝图生成服务：根据概念对话生成小说蓝图，供同步接口与后台任务共用。
+"""
+
+import json
+import logging
+from typing import Any, Dict, List
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import BackgroundJob
+from ..schemas.novel import Blueprint, BlueprintGenerationResponse
+from ..utils.json_utils import remove_think_tags, sanitize_json_like_text, unwrap_markdown_json
+from .llm_service import LLMService
+from .novel_service import NovelService
+from .prompt_service import PromptService
+
+logger = logging.getLogger(__name__)
+
+BLUEPRINT_GENERATION_JOB = "blueprint_generation"
+
+
+async def generate_blueprint(session: AsyncSession, project_id: str, user_id: int) -> BlueprintGenerationResponse:
+    """根据完整对话生成可执行的小说蓝图并写入项目。"""
+    novel_service = NovelService(session)
+    prompt_service = PromptService(session)
+    llm_service = LLMService(session)
+
+    project = await novel_service.ensure_project_owner(project_id, user_id)
+    logger.info("项目 %s 开始生成蓝图", project_id)
+
+    history_records = await novel_service.list_conversations(project_id)
+    if not history_records:
+        logger.warning("项目 %s 缺少对话历史，无法生成蓝图", project_id)
+        raise HTTPException(status_code=400, detail="缺少对话历史，请先完成概念对话后再生成蓝图")
+
+    formatted_history: List[Dict[str, str]] = []
+    for record in history_records:
+        role = record.role
+        content = record.content
+        if not role or not content:
+            continue
+        try:
+            normalized = unwrap_markdown_json(content)
+            data = json.loads(normalized)
+            if role == "user":
+                user_value = data.get("value", data)
+                if isinstance(user_value, str):
+                    formatted_history.append({"role": "user", "content": user_value})
+            elif role == "assistant":
+                ai_message = data.get("ai_message") if isinstance(data, dict) else None
+                if ai_message:
+                    formatted_history.append({"role": "assistant", "content": ai_message})
+        except (json.JSONDecodeError, AttributeError):
+            continue
+
+    if not formatted_history:
+        logger.warning("项目 %s 对话历史格式异常，无法提取有效内容", project_id)
+        raise HTTPException(
+            status_code=400,
+            detail="无法从历史对话中提取有效内容，请检查对话历史格式或重新进行概念对话"
+        )
+
+    system_prompt = await prompt_service.get_prompt("screenwriting")
+    if not system_prompt:
+        raise HTTPException(status_code=500, detail="未配置名为 screenwriting 的提示词，请联系管理员")
+    blueprint_raw = await llm_service.get_llm_response(
+        system_prompt=system_prompt,
+        conversation_history=formatted_history,
+        temperature=0.3,
+        user_id=user_id,
+        timeout=480.0,
+    )
+    blueprint_raw = remove_think_tags(blueprint_raw)
+
+    blueprint_normalized = unwrap_markdown_json(blueprint_raw)
+    blueprint_sanitized = sanitize_json_like_text(blueprint_normalized)
+    try:
+        blueprint_data = json.loads(blueprint_sanitized)
+    except json.JSONDecodeError as exc:
+        logger.error(
+            "项目 %s 蓝图生成 JSON 解析失败: %s\n原始响应: %s\n标准化后: %s\n清洗后: %s",
+            project_id,
+            exc,
+            blueprint_raw[:500],
+            blueprint_normalized[:500],
+            blueprint_sanitized[:500],
+        )
+        raise HTTPException(
+            status_code=500,
+            detail=f"蓝图生成失败，AI 返回的内容格式不正确。请重试或联系管理员。错误详情: {str(exc)}"
+        ) from exc
+
+    blueprint = Blueprint(**blueprint_data)
+    await novel_service.replace_blueprint(project_id, blueprint)
+    if blueprint.title:
+        project.title = blueprint.title
+        project.status = "blueprint_ready"
+        await session.commit()
+        logger.info("项目 %s 更新标题为 %s，并标记为 blueprint_ready", project_id, blueprint.title)
+
+    ai_message = (
+        "太棒了！我已经根据我们的对话整理出完整的小说蓝图。请确认是否进入写作阶段，或提出修改意见。"
+    )
+    return BlueprintGenerationResponse(blueprint=blueprint, ai_message=ai_message)
+
+
+async def run_blueprint_generation_job(session: AsyncSession, job: BackgroundJob) -> Dict[str, Any]:
+    """任务处理函数：生成蓝图，结果与同步接口的响应体一致。"""
+    response = await generate_blueprint(session, job.project_id, job.user_id)
+    return response.model_dump()
+
+
+__all__ = [
+    "BLUEPRINT_GENERATION_JOB",
+    "generate_blueprint",
+    "run_blueprint_generation_job",
+]
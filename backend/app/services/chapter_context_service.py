@@ -6,9 +6,11 @@ from __future__ import annotations
 所有关键步骤均包含中文注释，方便团队理解 RAG 流程。
 """
 
+import asyncio
 import logging
-from dataclasses import dataclass
-from typing import List, Optional
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Dict, List, Optional, TypeVar
 
 from ..core.config import settings
 from ..services.llm_service import LLMService
@@ -16,6 +18,8 @@ from .vector_store_service import RetrievedChunk, RetrievedSummary, VectorStoreS
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 @dataclass
 class ChapterRAGContext:
@@ -24,6 +28,10 @@ class ChapterRAGContext:
     query: str
     chunks: List[RetrievedChunk]
     summaries: List[RetrievedSummary]
+    # 各阶段耗时（毫秒）：embed / chunks / summaries / total，超时未完成的阶段不记录
+    timings: Dict[str, float] = field(default_factory=dict)
+    # 超过检索时限而被放弃的阶段
+    timed_out: List[str] = field(default_factory=list)
 
     def chunk_texts(self) -> List[str]:
         """将检索到的 chunk 转换成带序号的 Markdown 段落。"""
@@ -66,36 +74,143 @@ class ChapterContextService:
         top_k_chunks: Optional[int] = None,
         top_k_summaries: Optional[int] = None,
     ) -> ChapterRAGContext:
-        """根据章节摘要构造检索向量，并返回 RAG 上下文。"""
+        """根据章节摘要构造检索向量，并发检索片段与摘要后返回 RAG 上下文。
+
+        查询向量生成与两路检索共享 ``vector_retrieval_timeout`` 时限，超时的阶段被取消，
+        以已完成部分的结果返回，不阻塞章节生成。
+        """
         query = self._normalize(query_text)
         if not settings.vector_store_enabled or not self._vector_store:
             logger.error("向量库未启用或初始化失败，跳过检索: project=%s", project_id)
             return ChapterRAGContext(query=query, chunks=[], summaries=[])
 
-        # get_embedding 会自动根据配置选择正确的模型
-        embedding = await self._llm_service.get_embedding(query, user_id=user_id)
+        started = time.perf_counter()
+        timeout = settings.vector_retrieval_timeout
+        deadline = started + timeout if timeout > 0 else None
+        timings: Dict[str, float] = {}
+
+        # 嵌入提供方、维度与凭据需经由会话读取配置，放在时限之外解析，时限只作用于嵌入接口调用，
+        # 避免取消时中断会话上的查询；之后该会话还要用于保存章节版本
+        embedding_target = await self._llm_service.resolve_embedding_target(user_id=user_id)
+        # 只与当前嵌入模型写入的向量比较，切换模型后旧向量在重建前不参与检索
+        model_tag = embedding_target.model_tag
+
+        try:
+            embeddings = await asyncio.wait_for(
+                self._timed(
+                    self._llm_service.embed_texts(embedding_target, [query]),
+                    timings,
+                    "embed",
+                ),
+                timeout=self._remaining(deadline),
+            )
+        except asyncio.TimeoutError:
+            timings["total"] = self._elapsed_ms(started)
+            logger.warning(
+                "检索查询向量生成超时，跳过检索: project=%s timeout=%.1fs",
+                project_id,
+                timeout,
+            )
+            return ChapterRAGContext(
+                query=query, chunks=[], summaries=[], timings=timings, timed_out=["embed"]
+            )
+        embedding = embeddings[0] if embeddings else []
         if not embedding:
             logger.warning("检索查询向量生成失败: project=%s chapter_query=%s", project_id, query)
-            return ChapterRAGContext(query=query, chunks=[], summaries=[])
-
-        chunks = await self._vector_store.query_chunks(
-            project_id=project_id,
-            embedding=embedding,
-            top_k=top_k_chunks,
-        )
-        summaries = await self._vector_store.query_summaries(
-            project_id=project_id,
-            embedding=embedding,
-            top_k=top_k_summaries,
-        )
+            return ChapterRAGContext(query=query, chunks=[], summaries=[], timings=timings)
+
+        # 片段与摘要检索互不依赖，共用同一查询向量并发执行
+        stages = {
+            "chunks": asyncio.create_task(
+                self._timed(
+                    self._vector_store.query_chunks(
+                        project_id=project_id,
+                        embedding=embedding,
+                        top_k=top_k_chunks,
+                        model=model_tag,
+                    ),
+                    timings,
+                    "chunks",
+                )
+            ),
+            "summaries": asyncio.create_task(
+                self._timed(
+                    self._vector_store.query_summaries(
+                        project_id=project_id,
+                        embedding=embedding,
+                        top_k=top_k_summaries,
+                        model=model_tag,
+                    ),
+                    timings,
+                    "summaries",
+                )
+            ),
+        }
+        await asyncio.wait(stages.values(), timeout=self._remaining(deadline))
+
+        # 超时的检索直接取消，以已完成部分的结果继续生成
+        results: Dict[str, list] = {}
+        timed_out: List[str] = []
+        for name, task in stages.items():
+            if not task.done():
+                task.cancel()
+                timed_out.append(name)
+                results[name] = []
+            elif task.exception() is not None:
+                logger.warning(
+                    "章节上下文检索失败: project=%s stage=%s error=%s",
+                    project_id,
+                    name,
+                    task.exception(),
+                )
+                results[name] = []
+            else:
+                results[name] = task.result()
+        timings["total"] = self._elapsed_ms(started)
+
+        chunks = results["chunks"]
+        summaries = results["summaries"]
+        if timed_out:
+            logger.warning(
+                "章节上下文检索超时，使用部分结果: project=%s timed_out=%s timeout=%.1fs",
+                project_id,
+                ",".join(timed_out),
+                timeout,
+            )
         logger.info(
-            "章节上下文检索完成: project=%s chunks=%d summaries=%d query_preview=%s",
+            "章节上下文检索完成: project=%s chunks=%d summaries=%d timings=%s query_preview=%s",
             project_id,
             len(chunks),
             len(summaries),
+            {key: round(value, 1) for key, value in timings.items()},
             query[:80],
         )
-        return ChapterRAGContext(query=query, chunks=chunks, summaries=summaries)
+        return ChapterRAGContext(
+            query=query,
+            chunks=chunks,
+            summaries=summaries,
+            timings=timings,
+            timed_out=timed_out,
+        )
+
+    @staticmethod
+    async def _timed(awaitable: Awaitable[T], timings: Dict[str, float], stage: str) -> T:
+        """等待单个阶段完成并记录耗时（毫秒）。"""
+        started = time.perf_counter()
+        result = await awaitable
+        timings[stage] = ChapterContextService._elapsed_ms(started)
+        return result
+
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        """距离检索时限的剩余秒数，未设置时限时返回 None。"""
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.perf_counter())
+
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        return (time.perf_counter() - started) * 1000
 
     @staticmethod
     def _normalize(text: str) -> str:
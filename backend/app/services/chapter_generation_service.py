@@ -0,0 +1,566 @@
+"""
+章节生成服务：章节正文与章节纲要的生成流程，供同步接口、流式接口与后台任务共用。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db.session import AsyncSessionLocal
+from ..models import BackgroundJob, Chapter, ChapterOutline
+from ..repositories.novel_repository import ProjectLoad
+from ..schemas.novel import ChapterGenerationStatus, GenerateChapterRequest, GenerateOutlineRequest
+from ..utils.concurrency import KeyedLimiter
+from ..utils.json_utils import remove_think_tags, unwrap_markdown_json
+from ..utils.prompt_builder import PromptSection, build_budgeted_prompt, estimate_tokens
+from .blueprint_context_service import build_blueprint_context
+from .chapter_context_service import ChapterContextService
+from .chapter_summary_service import ChapterSummaryService
+from .config_service import system_config_cache
+from .llm_service import LLMService
+from .novel_service import NovelService
+from .prompt_service import PromptService
+from .vector_store_service import get_vector_store
+
+logger = logging.getLogger(__name__)
+
+CHAPTER_GENERATION_JOB = "chapter_generation"
+CHAPTER_OUTLINE_JOB = "chapter_outline"
+
+# 筛选蓝图角色时参考的最近已完成章节摘要数量
+_BLUEPRINT_RECENT_SUMMARIES = 3
+
+# 限制同一用户同时生成的章节版本数量，跨请求与后台任务共享
+_USER_VERSION_LIMITER = KeyedLimiter(settings.writer_version_concurrency)
+
+
+def _extract_tail_excerpt(text: Optional[str], limit: int = 500) -> str:
+    """截取章节结尾文本，默认保留 500 字。"""
+    if not text:
+        return ""
+    stripped = text.strip()
+    if len(stripped) <= limit:
+        return stripped
+    return stripped[-limit:]
+
+
+@dataclass
+class ChapterGenerationPlan:
+    """章节生成所需的全部输入，在请求会话内准备好后可脱离会话执行。"""
+
+    project_id: str
+    chapter_number: int
+    chapter_id: int
+    user_id: int
+    writer_prompt: str
+    prompt_input: str
+    version_count: int
+
+    @property
+    def log_prefix(self) -> str:
+        return f"项目 {self.project_id} 第 {self.chapter_number} 章"
+
+
+async def prepare_chapter_generation(
+    session: AsyncSession,
+    project_id: str,
+    request: GenerateChapterRequest,
+    user_id: int,
+) -> ChapterGenerationPlan:
+    """校验项目与纲要、收集前情与检索上下文并拼装写作提示词，同时将章节置为生成中。"""
+    novel_service = NovelService(session)
+    prompt_service = PromptService(session)
+    llm_service = LLMService(session)
+    summary_service = ChapterSummaryService(session)
+
+    project = await novel_service.ensure_project_owner(project_id, user_id, load=ProjectLoad.SELECTED_CONTENT)
+    logger.info("用户 %s 开始为项目 %s 生成第 %s 章", user_id, project_id, request.chapter_number)
+    outline = await novel_service.get_outline(project_id, request.chapter_number)
+    if not outline:
+        logger.warning("项目 %s 未找到第 %s 章纲要，生成流程终止", project_id, request.chapter_number)
+        raise HTTPException(status_code=404, detail="蓝图中未找到对应章节纲要")
+
+    chapter = await novel_service.get_or_create_chapter(project_id, request.chapter_number)
+    chapter.real_summary = None
+    chapter.selected_version_id = None
+    chapter.status = "generating"
+    await session.commit()
+
+    outlines_map = {item.chapter_number: item for item in project.outlines}
+    # 收集所有可用的历史章节摘要，便于在 Prompt 中提供前情背景
+    completed_chapters = []
+    latest_prev_number = -1
+    previous_summary_text = ""
+    previous_tail_excerpt = ""
+    for existing in project.chapters:
+        if existing.chapter_number >= request.chapter_number:
+            continue
+        if existing.selected_version is None or not existing.selected_version.content:
+            continue
+        existing_outline = outlines_map.get(existing.chapter_number)
+        chapter_summary = existing.real_summary
+        if not chapter_summary:
+            # 摘要缺失时不阻塞生成：交给后台任务回填，本次先使用章节纲要摘要
+            await summary_service.schedule(
+                project_id=project_id,
+                chapter_number=existing.chapter_number,
+                content=existing.selected_version.content,
+                user_id=user_id,
+            )
+            chapter_summary = existing_outline.summary if existing_outline else ""
+        completed_chapters.append(
+            {
+                "chapter_number": existing.chapter_number,
+                "title": existing_outline.title if existing_outline else f"第{existing.chapter_number}章",
+                "summary": chapter_summary,
+            }
+        )
+        if existing.chapter_number > latest_prev_number:
+            latest_prev_number = existing.chapter_number
+            previous_summary_text = chapter_summary or ""
+            previous_tail_excerpt = _extract_tail_excerpt(existing.selected_version.content)
+
+    writer_prompt = await prompt_service.get_prompt("writing")
+    if not writer_prompt:
+        logger.error("未配置名为 'writing' 的写作提示词，无法生成章节内容")
+        raise HTTPException(status_code=500, detail="缺少写作提示词，请联系管理员配置 'writing' 提示词")
+
+    # 使用进程内共享的向量检索服务，若未配置则自动降级为纯提示词生成
+    vector_store = get_vector_store()
+    context_service = ChapterContextService(llm_service=llm_service, vector_store=vector_store)
+
+    outline_title = outline.title or f"第{outline.chapter_number}章"
+    outline_summary = outline.summary or "暂无摘要"
+    query_parts = [outline_title, outline_summary]
+    if request.writing_notes:
+        query_parts.append(request.writing_notes)
+    rag_query = "\n".join(part for part in query_parts if part)
+    rag_context = await context_service.retrieve_for_generation(
+        project_id=project_id,
+        query_text=rag_query or outline.title or outline.summary or "",
+        user_id=user_id,
+    )
+    chunk_count = len(rag_context.chunks) if rag_context and rag_context.chunks else 0
+    summary_count = len(rag_context.summaries) if rag_context and rag_context.summaries else 0
+    logger.info(
+        "项目 %s 第 %s 章检索到 %s 个剧情片段和 %s 条摘要，耗时(ms)=%s 超时阶段=%s",
+        project_id,
+        request.chapter_number,
+        chunk_count,
+        summary_count,
+        {key: round(value, 1) for key, value in rag_context.timings.items()},
+        rag_context.timed_out or "无",
+    )
+    # print("rag_context:",rag_context)
+    # 将蓝图、前情、RAG 检索结果拼装成结构化段落，供模型理解
+    # 只保留与本章相关的角色与关系，序列化结果按项目缓存
+    recent_summaries = [
+        item["summary"]
+        for item in sorted(completed_chapters, key=lambda item: item["chapter_number"])[-_BLUEPRINT_RECENT_SUMMARIES:]
+    ]
+    blueprint_context = build_blueprint_context(
+        project_id,
+        lambda: novel_service._build_blueprint_schema(project),
+        [outline_title, outline_summary, request.writing_notes, *recent_summaries],
+    )
+    logger.info(
+        "项目 %s 第 %s 章蓝图上下文：角色 %s/%s，关系 %s/%s",
+        project_id,
+        request.chapter_number,
+        blueprint_context.selected_characters,
+        blueprint_context.total_characters,
+        blueprint_context.selected_relationships,
+        blueprint_context.total_relationships,
+    )
+    previous_summary_text = previous_summary_text or "暂无可用摘要"
+    previous_tail_excerpt = previous_tail_excerpt or "暂无上一章结尾内容"
+    writing_notes = request.writing_notes or "无额外写作指令"
+
+    rag_chunks_section = PromptSection(
+        "[检索到的剧情上下文](Markdown)",
+        rag_context.chunk_texts(),
+        priority=5,
+        strategy="items",
+        joiner="\n\n",
+        placeholder="未检索到章节片段",
+    )
+    rag_summaries_section = PromptSection(
+        "[检索到的章节摘要]",
+        rag_context.summary_lines(),
+        priority=4,
+        strategy="items",
+        placeholder="未检索到章节摘要",
+    )
+    goal_section = PromptSection.text(
+        "[当前章节目标]",
+        f"标题：{outline_title}\n摘要：{outline_summary}\n写作要求：{writing_notes}",
+        priority=0,
+    )
+    # priority 越小越重要：超出 token 预算时先删减检索片段与摘要，再删减蓝图角色、截断上一章内容，章节目标始终保留
+    if settings.writer_prompt_layout == "prefix_cache":
+        # 系统提示词与项目内不变的蓝图放在最前且不参与裁剪，使同一项目的请求共享逐字节一致的前缀，
+        # 便于命中提供方的前缀缓存；随章节变化的内容全部放在其后，章节目标收尾
+        prompt_sections = [
+            PromptSection.text("[世界蓝图](JSON)", blueprint_context.stable_text, priority=0),
+            # 本章角色与关系同样按整条删减，保证裁剪后仍是合法 JSON
+            PromptSection(
+                "[本章相关角色](JSON)",
+                list(blueprint_context.chapter_items),
+                priority=3,
+                strategy="items",
+                render_items=blueprint_context.render_chapter,
+            ),
+            PromptSection.text("[上一章摘要]", previous_summary_text, priority=1, strategy="head", min_tokens=200),
+            rag_summaries_section,
+            rag_chunks_section,
+            PromptSection.text("[上一章结尾]", previous_tail_excerpt, priority=2, strategy="tail", min_tokens=100),
+            goal_section,
+        ]
+    else:
+        prompt_sections = [
+            # 蓝图按整条删减相关度最低的角色与关系，保证裁剪后仍是合法 JSON
+            PromptSection(
+                "[世界蓝图](JSON)",
+                list(blueprint_context.items),
+                priority=3,
+                strategy="items",
+                min_items=blueprint_context.core_items,
+                render_items=blueprint_context.render,
+            ),
+            PromptSection.text("[上一章摘要]", previous_summary_text, priority=1, strategy="head", min_tokens=200),
+            PromptSection.text("[上一章结尾]", previous_tail_excerpt, priority=2, strategy="tail", min_tokens=100),
+            rag_chunks_section,
+            rag_summaries_section,
+            goal_section,
+        ]
+    prompt = build_budgeted_prompt(
+        prompt_sections,
+        budget=settings.writer_prompt_token_budget,
+        reserved_tokens=estimate_tokens(writer_prompt),
+    )
+    prompt_input = prompt.text
+    logger.info(
+        "项目 %s 第 %s 章写作提示词估算 %s tokens（布局 %s，预算 %s，系统提示词 %s）：%s",
+        project_id,
+        request.chapter_number,
+        prompt.total_tokens,
+        settings.writer_prompt_layout,
+        prompt.budget or "不限",
+        estimate_tokens(writer_prompt),
+        prompt.describe(),
+    )
+    if prompt.over_budget:
+        logger.warning(
+            "项目 %s 第 %s 章写作提示词裁剪后仍超出预算：%s > %s",
+            project_id,
+            request.chapter_number,
+            prompt.total_tokens,
+            prompt.budget,
+        )
+    logger.debug("章节写作提示词：%s\n%s", writer_prompt, prompt_input)
+
+    version_count = await resolve_version_count(session)
+    logger.info(
+        "项目 %s 第 %s 章计划生成 %s 个版本",
+        project_id,
+        request.chapter_number,
+        version_count,
+    )
+    return ChapterGenerationPlan(
+        project_id=project_id,
+        chapter_number=request.chapter_number,
+        chapter_id=chapter.id,
+        user_id=user_id,
+        writer_prompt=writer_prompt,
+        prompt_input=prompt_input,
+        version_count=version_count,
+    )
+
+
+async def generate_chapter_version(
+    plan: ChapterGenerationPlan,
+    idx: int,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> Dict:
+    """生成单个版本并解析为字典；提供 on_delta 时逐段回调模型输出。"""
+    try:
+        started_at = time.perf_counter()
+        parts: List[str] = []
+        # 各版本并发执行，AsyncSession 不支持并发使用，因此每个版本独立开会话
+        async with _USER_VERSION_LIMITER.slot(plan.user_id):
+            async with AsyncSessionLocal() as version_session:
+                async for delta in LLMService(version_session).stream_llm_response(
+                    system_prompt=plan.writer_prompt,
+                    conversation_history=[{"role": "user", "content": plan.prompt_input}],
+                    temperature=0.9,
+                    user_id=plan.user_id,
+                    timeout=600.0,
+                ):
+                    parts.append(delta)
+                    if on_delta is not None:
+                        await on_delta(delta)
+        response = "".join(parts)
+        logger.info(
+            "项目 %s 第 %s 章第 %s 个版本生成完成，耗时 %.2fs，字数 %s",
+            plan.project_id,
+            plan.chapter_number,
+            idx + 1,
+            time.perf_counter() - started_at,
+            len(response),
+        )
+        cleaned = remove_think_tags(response)
+        normalized = unwrap_markdown_json(cleaned)
+        try:
+            return json.loads(normalized)
+        except json.JSONDecodeError as parse_err:
+            logger.warning(
+                "项目 %s 第 %s 章第 %s 个版本 JSON 解析失败，将原始内容作为纯文本处理: %s",
+                plan.project_id,
+                plan.chapter_number,
+                idx + 1,
+                parse_err,
+            )
+            return {"content": normalized}
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.exception(
+            "项目 %s 生成第 %s 章第 %s 个版本时发生异常: %s",
+            plan.project_id,
+            plan.chapter_number,
+            idx + 1,
+            exc,
+        )
+        raise HTTPException(
+            status_code=500,
+            detail=f"生成章节第 {idx + 1} 个版本时失败: {str(exc)[:200]}"
+        )
+
+
+def extract_version_content(variant) -> str:
+    if isinstance(variant, dict):
+        if "content" in variant and isinstance(variant["content"], str):
+            return variant["content"]
+        if "chapter_content" in variant:
+            return str(variant["chapter_content"])
+        return json.dumps(variant, ensure_ascii=False)
+    return str(variant)
+
+
+async def save_chapter_versions(
+    novel_service: NovelService,
+    plan: ChapterGenerationPlan,
+    raw_versions: List[Dict],
+) -> int:
+    chapter = await novel_service.session.get(Chapter, plan.chapter_id)
+    if chapter is None:
+        raise HTTPException(status_code=404, detail="章节不存在")
+    contents = [extract_version_content(variant) for variant in raw_versions]
+    metadata = [variant if isinstance(variant, dict) else {"raw": variant} for variant in raw_versions]
+    await novel_service.replace_chapter_versions(chapter, contents, metadata)
+    logger.info(
+        "项目 %s 第 %s 章生成完成，已写入 %s 个版本",
+        plan.project_id,
+        plan.chapter_number,
+        len(contents),
+    )
+    return len(contents)
+
+
+async def run_version_tasks(
+    coroutines: List[Awaitable[Dict]],
+    *,
+    policy: str,
+    log_prefix: str,
+) -> List[Dict]:
+    """并发执行各版本生成任务，并按失败策略汇总结果。
+
+    fail_all：任一版本失败立即取消其余任务并抛出该异常；
+    keep_successful：保留成功的版本，全部失败时抛出第一个异常。
+    """
+    started_at = time.perf_counter()
+    tasks = [asyncio.create_task(coro) for coro in coroutines]
+    if policy == "keep_successful":
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        versions = [item for item in results if not isinstance(item, BaseException)]
+        failures = [item for item in results if isinstance(item, BaseException)]
+        if failures:
+            logger.warning(
+                "%s 有 %s 个版本生成失败，保留 %s 个成功版本",
+                log_prefix,
+                len(failures),
+                len(versions),
+            )
+        if not versions:
+            raise failures[0]
+    else:
+        try:
+            versions = list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+    logger.info("%s 全部版本生成结束，总耗时 %.2fs", log_prefix, time.perf_counter() - started_at)
+    return versions
+
+
+async def resolve_version_count(session: AsyncSession) -> int:
+    snapshot = await system_config_cache.get_snapshot(session)
+    value = snapshot.get_int("writer.chapter_versions")
+    if value and value > 0:
+        return value
+    env_value = os.getenv("WRITER_CHAPTER_VERSION_COUNT")
+    if env_value:
+        try:
+            value = int(env_value)
+            if value > 0:
+                return value
+        except ValueError:
+            pass
+    return 3
+
+
+async def generate_chapter_outline(
+    session: AsyncSession,
+    project_id: str,
+    request: GenerateOutlineRequest,
+    user_id: int,
+) -> List[int]:
+    """根据蓝图生成指定区间的章节纲要并写入数据库，返回涉及的章节号。"""
+    novel_service = NovelService(session)
+    prompt_service = PromptService(session)
+    llm_service = LLMService(session)
+
+    project = await novel_service.ensure_project_owner(project_id, user_id, load=ProjectLoad.OUTLINE)
+    logger.info(
+        "用户 %s 请求生成项目 %s 的章节大纲，起始章节 %s，数量 %s",
+        user_id,
+        project_id,
+        request.start_chapter,
+        request.num_chapters,
+    )
+    outline_prompt = await prompt_service.get_prompt("outline")
+    if not outline_prompt:
+        logger.error("缺少大纲提示词，项目 %s 大纲生成失败", project_id)
+        raise HTTPException(status_code=500, detail="缺少大纲提示词，请联系管理员配置 'outline' 提示词")
+
+    blueprint_dict = novel_service._build_blueprint_schema(project).model_dump()
+
+    payload = {
+        "novel_blueprint": blueprint_dict,
+        "wait_to_generate": {
+            "start_chapter": request.start_chapter,
+            "num_chapters": request.num_chapters,
+        },
+    }
+
+    response = await llm_service.get_llm_response(
+        system_prompt=outline_prompt,
+        conversation_history=[{"role": "user", "content": json.dumps(payload, ensure_ascii=False)}],
+        temperature=0.7,
+        user_id=user_id,
+        timeout=360.0,
+    )
+    normalized = unwrap_markdown_json(remove_think_tags(response))
+    try:
+        data = json.loads(normalized)
+    except json.JSONDecodeError as exc:
+        logger.error(
+            "项目 %s 大纲生成 JSON 解析失败: %s, 原始内容预览: %s",
+            project_id,
+            exc,
+            normalized[:500],
+        )
+        raise HTTPException(
+            status_code=500,
+            detail=f"章节大纲生成失败，AI 返回的内容格式不正确: {str(exc)}"
+        ) from exc
+
+    new_outlines = data.get("chapters", [])
+    for item in new_outlines:
+        stmt = (
+            select(ChapterOutline)
+            .where(
+                ChapterOutline.project_id == project_id,
+                ChapterOutline.chapter_number == item.get("chapter_number"),
+            )
+        )
+        result = await session.execute(stmt)
+        record = result.scalars().first()
+        if record:
+            record.title = item.get("title", record.title)
+            record.summary = item.get("summary", record.summary)
+        else:
+            session.add(
+                ChapterOutline(
+                    project_id=project_id,
+                    chapter_number=item.get("chapter_number"),
+                    title=item.get("title", ""),
+                    summary=item.get("summary"),
+                )
+            )
+    await session.commit()
+    await novel_service._touch_project(project_id)
+    logger.info("项目 %s 章节大纲生成完成", project_id)
+    return [item.get("chapter_number") for item in new_outlines]
+
+
+async def _mark_chapter_failed(session: AsyncSession, project_id: str, chapter_number: int) -> None:
+    await session.rollback()
+    await session.execute(
+        update(Chapter)
+        .where(Chapter.project_id == project_id, Chapter.chapter_number == chapter_number)
+        .values(status=ChapterGenerationStatus.FAILED.value)
+    )
+    await session.commit()
+
+
+async def run_chapter_generation_job(session: AsyncSession, job: BackgroundJob) -> Dict[str, Any]:
+    """任务处理函数：执行完整的章节生成并写入版本，任一环节失败时将章节标记为 failed。"""
+    request = GenerateChapterRequest(**(job.payload or {}))
+    try:
+        plan = await prepare_chapter_generation(session, job.project_id, request, job.user_id)
+        raw_versions = await run_version_tasks(
+            [generate_chapter_version(plan, idx) for idx in range(plan.version_count)],
+            policy=settings.writer_version_failure_policy,
+            log_prefix=plan.log_prefix,
+        )
+        saved = await save_chapter_versions(NovelService(session), plan, raw_versions)
+    except Exception:
+        # 提交任务时章节已置为 generating，准备阶段（纲要缺失、提示词缺失、检索或摘要回填失败）同样需要回写状态
+        await _mark_chapter_failed(session, job.project_id, request.chapter_number)
+        raise
+    return {"chapter_number": plan.chapter_number, "version_count": saved}
+
+
+async def run_chapter_outline_job(session: AsyncSession, job: BackgroundJob) -> Dict[str, Any]:
+    """任务处理函数：生成章节纲要。"""
+    request = GenerateOutlineRequest(**(job.payload or {}))
+    chapter_numbers = await generate_chapter_outline(session, job.project_id, request, job.user_id)
+    return {"chapter_numbers": chapter_numbers}
+
+
+__all__ = [
+    "CHAPTER_GENERATION_JOB",
+    "CHAPTER_OUTLINE_JOB",
+    "ChapterGenerationPlan",
+    "extract_version_content",
+    "generate_chapter_outline",
+    "generate_chapter_version",
+    "prepare_chapter_generation",
+    "resolve_version_count",
+    "run_chapter_generation_job",
+    "run_chapter_outline_job",
+    "run_version_tasks",
+    "save_chapter_versions",
+]
@@ -6,12 +6,15 @@ from __future__ import annotations
 全部注释使用中文，方便团队成员阅读理解。
 """
 
+import hashlib
 import logging
-from typing import Dict, List, Optional, Sequence
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
 
 from ..core.config import settings
 from ..services.llm_service import LLMService
-from ..services.vector_store_service import VectorStoreService
+from ..services.vector_store_service import VectorStoreService, get_vector_store
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,26 @@ except ImportError:  # pragma: no cover - 未安装时会走后备方案
     RecursiveCharacterTextSplitter = None  # type: ignore[assignment]
 
 
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ChapterIngestResult:
+    """单章入库结果；``ok`` 为 False 表示有向量未能更新，向量库中仍是旧内容，需要重试。"""
+
+    written_chunks: int = 0
+    written_summaries: int = 0
+    # 生成向量失败的片段数；存在失败片段时整章放弃写入，保留原有向量
+    failed_chunks: int = 0
+    failed_summary: bool = False
+    write_failed: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not (self.failed_chunks or self.failed_summary or self.write_failed)
+
+
 class ChapterIngestionService:
     """封装章节内容与摘要的向量化与入库流程。"""
 
@@ -31,7 +54,7 @@ class ChapterIngestionService:
         vector_store: Optional[VectorStoreService] = None,
     ) -> None:
         self._llm_service = llm_service
-        self._vector_store = vector_store or VectorStoreService()
+        self._vector_store = vector_store or get_vector_store()
         self._text_splitter = self._init_text_splitter()
 
     async def ingest_chapter(
@@ -43,43 +66,107 @@ class ChapterIngestionService:
         content: str,
         summary: Optional[str],
         user_id: int,
-    ) -> None:
-        """将章节正文与摘要写入向量库，供后续 RAG 检索使用。"""
-        if not settings.vector_store_enabled:
+    ) -> ChapterIngestResult:
+        """将章节正文与摘要写入向量库，供后续 RAG 检索使用。
+
+        按片段内容哈希与已入库的片段比对，只为新增或变更的片段生成向量，
+        消失的片段被删除，编辑一段文字的成本与改动大小相当而非整章。
+        任一片段生成向量失败时本次不写入任何内容，避免删除旧片段后没有新片段补位；
+        摘要向量失败时片段照常写入、保留旧摘要。结果中记录失败情况，供调用方决定是否重试。
+        """
+        if not settings.vector_store_enabled or not self._vector_store:
             logger.warning("向量库未启用，跳过章节向量写入: project=%s chapter=%s", project_id, chapter_number)
-            return
+            return ChapterIngestResult()
         if not content.strip():
             logger.warning("章节正文为空，跳过向量写入: project=%s chapter=%s", project_id, chapter_number)
-            return
+            return ChapterIngestResult()
 
         chunks = self._split_into_chunks(content)
         if not chunks:
             logger.warning("章节正文切分后为空，跳过向量写入: project=%s chapter=%s", project_id, chapter_number)
-            return
+            return ChapterIngestResult()
+
+        model_tag = await self._llm_service.get_embedding_model_tag()
+        existing_chunks = await self._vector_store.list_chapter_chunks(project_id, chapter_number)
+        # 读取现有片段失败时无法比对差异，退回整章重建
+        rebuild = existing_chunks is None
+        existing_chunks = existing_chunks or []
+        existing_summary = None if rebuild else await self._vector_store.get_chapter_summary(project_id, chapter_number)
+
+        # 按内容哈希匹配已有片段：内容未变的片段只在位置或标题变化时更新序号，不重新生成向量；
+        # 由其他嵌入模型生成的片段沿用原 ID 重新生成向量
+        available: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for row in existing_chunks:
+            if row.get("content_hash"):
+                available[row["content_hash"]].append(row)
+        kept_ids = set()
+        reindexed_chunks: List[Dict[str, Any]] = []
+        added_chunks: List[Tuple[int, str, str, Optional[str]]] = []
+        for index, chunk_text in enumerate(chunks):
+            content_hash = _content_hash(chunk_text)
+            candidates = available.get(content_hash)
+            if candidates:
+                row = candidates.pop(0)
+                kept_ids.add(row["id"])
+                if row.get("embedding_model") != model_tag:
+                    added_chunks.append((index, chunk_text, content_hash, row["id"]))
+                elif row.get("chunk_index") != index or row.get("chapter_title") != title:
+                    reindexed_chunks.append({"id": row["id"], "chunk_index": index, "chapter_title": title})
+            else:
+                added_chunks.append((index, chunk_text, content_hash, None))
+        deleted_chunk_ids = [row["id"] for row in existing_chunks if row["id"] not in kept_ids]
+
+        cleaned_summary = summary.strip() if summary else ""
+        summary_changed = bool(cleaned_summary) and (
+            rebuild
+            or not existing_summary
+            or existing_summary.get("summary") != cleaned_summary
+            or existing_summary.get("title") != title
+            or existing_summary.get("embedding_model") != model_tag
+        )
+        delete_summary = not cleaned_summary and existing_summary is not None
+
+        if not rebuild and not (added_chunks or reindexed_chunks or deleted_chunk_ids or summary_changed or delete_summary):
+            logger.info("章节向量无变化，跳过写入: project=%s chapter=%s", project_id, chapter_number)
+            return ChapterIngestResult()
 
         logger.info(
-            "开始写入章节向量: project=%s chapter=%s chunks=%d",
+            "开始写入章节向量: project=%s chapter=%s chunks=%d 新增=%d 移动=%d 删除=%d 重建=%s",
             project_id,
             chapter_number,
             len(chunks),
+            len(added_chunks),
+            len(reindexed_chunks),
+            len(deleted_chunk_ids),
+            rebuild,
         )
-        await self._vector_store.delete_by_chapters(project_id, [chapter_number])
+        # 新增片段与变更的摘要一次性批量生成向量，摘要固定放在最后一位
+        texts = [chunk_text for _, chunk_text, _, _ in added_chunks]
+        if summary_changed:
+            texts.append(cleaned_summary)
+        embeddings = await self._llm_service.get_embeddings(texts, user_id=user_id) if texts else []
+        embeddings += [[]] * (len(texts) - len(embeddings))
+
+        failed_indexes = [
+            index for (index, _, _, _), embedding in zip(added_chunks, embeddings) if not embedding
+        ]
+        if failed_indexes:
+            logger.warning(
+                "生成章节片段向量失败，本次不更新，保留原有向量: project=%s chapter=%s chunks=%s",
+                project_id,
+                chapter_number,
+                failed_indexes,
+            )
+            return ChapterIngestResult(
+                failed_chunks=len(failed_indexes),
+                failed_summary=summary_changed and not embeddings[len(added_chunks)],
+            )
 
+        used_ids = {row["id"] for row in existing_chunks}
         chunk_records = []
-        for index, chunk_text in enumerate(chunks):
-            embedding = await self._llm_service.get_embedding(
-                chunk_text,
-                user_id=user_id,
-            )
-            if not embedding:
-                logger.warning(
-                    "生成章节片段向量失败，已跳过: project=%s chapter=%s chunk=%s",
-                    project_id,
-                    chapter_number,
-                    index,
-                )
-                continue
-            record_id = f"{project_id}:{chapter_number}:{index}"
+        for (index, chunk_text, content_hash, reused_id), embedding in zip(added_chunks, embeddings):
+            record_id = reused_id or self._chunk_id(project_id, chapter_number, content_hash, used_ids)
+            used_ids.add(record_id)
             chunk_records.append(
                 {
                     "id": record_id,
@@ -89,58 +176,92 @@ class ChapterIngestionService:
                     "chapter_title": title,
                     "content": chunk_text,
                     "embedding": embedding,
+                    "embedding_model": model_tag,
                     "metadata": {
                         "chunk_id": record_id,
                         "length": len(chunk_text),
+                        "content_hash": content_hash,
                     },
                 }
             )
 
-        if chunk_records:
-            await self._vector_store.upsert_chunks(records=chunk_records)
-            logger.info(
-                "章节正文向量写入完成: project=%s chapter=%s 成功片段=%d",
+        summary_records = []
+        if summary_changed:
+            summary_embedding = embeddings[len(added_chunks)]
+            if summary_embedding:
+                summary_records.append(
+                    {
+                        "id": f"{project_id}:{chapter_number}:summary",
+                        "project_id": project_id,
+                        "chapter_number": chapter_number,
+                        "title": title,
+                        "summary": cleaned_summary,
+                        "embedding": summary_embedding,
+                        "embedding_model": model_tag,
+                    }
+                )
+            else:
+                logger.warning(
+                    "生成章节摘要向量失败，保留原有摘要向量: project=%s chapter=%s",
+                    project_id,
+                    chapter_number,
+                )
+        failed_summary = summary_changed and not summary_records
+
+        # 删除、调整与写入在同一事务内完成，避免检索到半成品
+        if rebuild:
+            result = await self._vector_store.replace_chapter(
+                project_id=project_id,
+                chapter_number=chapter_number,
+                chunk_records=chunk_records,
+                summary_records=summary_records,
+            )
+        else:
+            result = await self._vector_store.sync_chapter(
+                project_id=project_id,
+                chapter_number=chapter_number,
+                chunk_records=chunk_records,
+                reindexed_chunks=reindexed_chunks,
+                deleted_chunk_ids=deleted_chunk_ids,
+                summary_records=summary_records,
+                delete_summary=delete_summary,
+            )
+        if not result.ok:
+            logger.error(
+                "章节向量写入失败，保留原有向量: project=%s chapter=%s error=%s",
                 project_id,
                 chapter_number,
-                len(chunk_records),
+                result.errors,
             )
+            return ChapterIngestResult(failed_summary=failed_summary, write_failed=True)
+        logger.info(
+            "%s: project=%s chapter=%s 新增片段=%d 摘要=%d",
+            "章节向量部分写入（摘要未更新）" if failed_summary else "章节向量写入完成",
+            project_id,
+            chapter_number,
+            len(chunk_records),
+            len(summary_records),
+        )
+        return ChapterIngestResult(
+            written_chunks=len(chunk_records),
+            written_summaries=len(summary_records),
+            failed_summary=failed_summary,
+        )
 
-        if summary:
-            cleaned_summary = summary.strip()
-            if cleaned_summary:
-                summary_embedding = await self._llm_service.get_embedding(
-                    cleaned_summary,
-                    user_id=user_id,
-                )
-                if summary_embedding:
-                    summary_id = f"{project_id}:{chapter_number}:summary"
-                    await self._vector_store.upsert_summaries(
-                        records=[
-                            {
-                                "id": summary_id,
-                                "project_id": project_id,
-                                "chapter_number": chapter_number,
-                                "title": title,
-                                "summary": cleaned_summary,
-                                "embedding": summary_embedding,
-                            }
-                        ]
-                    )
-                    logger.info(
-                        "章节摘要向量写入完成: project=%s chapter=%s",
-                        project_id,
-                        chapter_number,
-                    )
-                else:
-                    logger.warning(
-                        "生成章节摘要向量失败，已跳过: project=%s chapter=%s",
-                        project_id,
-                        chapter_number,
-                    )
+    @staticmethod
+    def _chunk_id(project_id: str, chapter_number: int, content_hash: str, used_ids: Set[str]) -> str:
+        """片段 ID 由内容哈希派生，同一章节内出现重复片段时追加序号区分。"""
+        base = f"{project_id}:{chapter_number}:{content_hash[:16]}"
+        candidate = base
+        suffix = 1
+        while candidate in used_ids:
+            candidate = f"{base}:{suffix}"
+            suffix += 1
+        return candidate
 
     async def delete_chapters(self, project_id: str, chapter_numbers: Sequence[int]) -> None:
         """从向量库中删除指定章节的所有片段与摘要。"""
-        if not settings.vector_store_enabled or not chapter_numbers:
+        if not settings.vector_store_enabled or not self._vector_store or not chapter_numbers:
             return
         logger.info(
             "准备删除章节向量: project=%s chapters=%s",
@@ -259,4 +380,4 @@ class ChapterIngestionService:
         return chunks
 
 
-__all__ = ["ChapterIngestionService"]
+__all__ = ["ChapterIngestResult", "ChapterIngestionService"]
@@ -0,0 +1,127 @@
+"""
+章节摘要回填服务：在章节选定或编辑后于后台生成 ``Chapter.real_summary``，并同步向量库。
+
+章节生成流程不再同步等待摘要，缺失时由本服务排队补齐。
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from ..models import BackgroundJob, Chapter, ChapterOutline, ChapterVersion
+from ..utils.json_utils import remove_think_tags
+from .background_job_service import BackgroundJobService
+from .chapter_ingest_service import ChapterIngestionService
+from .llm_service import LLMService
+from .vector_store_service import get_vector_store
+
+logger = logging.getLogger(__name__)
+
+CHAPTER_SUMMARY_JOB = "chapter_summary"
+
+
+def _content_digest(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ChapterSummaryService:
+    """负责提交章节摘要任务。"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.jobs = BackgroundJobService(session)
+
+    async def schedule(
+        self,
+        *,
+        project_id: str,
+        chapter_number: int,
+        content: str,
+        user_id: int,
+        ingest: bool = True,
+    ) -> Optional[BackgroundJob]:
+        """为章节当前正文排队生成摘要，同一章节只保留最新的一次待执行任务。"""
+        if not content or not content.strip():
+            return None
+        return await self.jobs.enqueue(
+            CHAPTER_SUMMARY_JOB,
+            user_id=user_id,
+            project_id=project_id,
+            chapter_number=chapter_number,
+            payload={"content_digest": _content_digest(content), "ingest": ingest},
+            dedupe_key=f"{CHAPTER_SUMMARY_JOB}:{project_id}:{chapter_number}",
+        )
+
+
+async def run_chapter_summary_job(session: AsyncSession, job: BackgroundJob) -> Dict[str, Any]:
+    """任务处理函数：生成摘要、写回章节，并按需同步向量库。"""
+    payload = job.payload or {}
+    result = await session.execute(
+        select(Chapter)
+        .where(
+            Chapter.project_id == job.project_id,
+            Chapter.chapter_number == job.chapter_number,
+        )
+        .options(selectinload(Chapter.selected_version).undefer(ChapterVersion.content))
+    )
+    chapter = result.scalars().first()
+    if not chapter or not chapter.selected_version or not chapter.selected_version.content:
+        return {"skipped": "章节不存在或尚未选定版本"}
+
+    content = chapter.selected_version.content
+    # 正文在排队期间被再次修改时，交由更新后的任务处理，避免旧摘要覆盖新内容
+    if payload.get("content_digest") and payload["content_digest"] != _content_digest(content):
+        return {"skipped": "章节内容已变更"}
+
+    llm_service = LLMService(session)
+    summary = await llm_service.get_summary(
+        content,
+        temperature=0.15,
+        user_id=job.user_id,
+        timeout=180.0,
+    )
+    chapter.real_summary = remove_think_tags(summary)
+    await session.commit()
+    logger.info("章节摘要已回填: project=%s chapter=%s", job.project_id, job.chapter_number)
+
+    vector_store = get_vector_store()
+    if payload.get("ingest") and vector_store:
+        outline_result = await session.execute(
+            select(ChapterOutline).where(
+                ChapterOutline.project_id == job.project_id,
+                ChapterOutline.chapter_number == job.chapter_number,
+            )
+        )
+        outline = outline_result.scalars().first()
+        chapter_title = outline.title if outline and outline.title else f"第{chapter.chapter_number}章"
+        ingestion_service = ChapterIngestionService(llm_service=llm_service, vector_store=vector_store)
+        ingest_result = await ingestion_service.ingest_chapter(
+            project_id=job.project_id,
+            chapter_number=chapter.chapter_number,
+            title=chapter_title,
+            content=content,
+            summary=chapter.real_summary,
+            user_id=job.user_id,
+        )
+        if ingest_result.ok:
+            logger.info("项目 %s 第 %s 章已同步至向量库", job.project_id, chapter.chapter_number)
+        else:
+            logger.warning(
+                "项目 %s 第 %s 章向量同步未完成，可通过向量重建任务补齐: %s",
+                job.project_id,
+                chapter.chapter_number,
+                ingest_result,
+            )
+
+    return {"summary_length": len(chapter.real_summary or "")}
+
+
+__all__ = [
+    "CHAPTER_SUMMARY_JOB",
+    "ChapterSummaryService",
+    "run_chapter_summary_job",
+]
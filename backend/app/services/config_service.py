@@ -1,12 +1,79 @@
-from typing import Iterable, Optional
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..core.config import settings
 from ..repositories.system_config_repository import SystemConfigRepository
 from ..models import SystemConfig
 from ..schemas.config import SystemConfigCreate, SystemConfigRead, SystemConfigUpdate
 
 
+@dataclass(frozen=True)
+class SystemConfigSnapshot:
+    """某一时刻的系统配置全量快照，只读。"""
+
+    values: Dict[str, str] = field(default_factory=dict)
+    version: int = 0
+    loaded_at: float = 0.0
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        return self.values.get(key, default)
+
+    def get_int(self, key: str) -> Optional[int]:
+        value = self.values.get(key)
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+
+class SystemConfigCache:
+    """进程内系统配置缓存：整表一次加载，超过 TTL 或版本号变化后重新加载。
+
+    本进程内的写入通过 invalidate 递增版本号立即生效；其他进程依赖 TTL 过期感知变更。
+    """
+
+    def __init__(self) -> None:
+        self._snapshot: Optional[SystemConfigSnapshot] = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self, snapshot: Optional[SystemConfigSnapshot]) -> bool:
+        if snapshot is None or snapshot.version != self._version:
+            return False
+        return time.monotonic() - snapshot.loaded_at < settings.system_config_cache_ttl
+
+    async def get_snapshot(self, session: AsyncSession) -> SystemConfigSnapshot:
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+        async with self._lock:
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot):
+                return snapshot
+            # 先记录版本号再读库，读取期间发生的写入会让这份快照在下次访问时失效
+            version = self._version
+            values = await SystemConfigRepository(session).load_values()
+            snapshot = SystemConfigSnapshot(values=values, version=version, loaded_at=time.monotonic())
+            self._snapshot = snapshot
+            return snapshot
+
+    async def get(self, session: AsyncSession, key: str) -> Optional[str]:
+        snapshot = await self.get_snapshot(session)
+        return snapshot.get(key)
+
+    def invalidate(self) -> None:
+        self._version += 1
+
+
+system_config_cache = SystemConfigCache()
+
+
 class ConfigService:
     """系统配置服务：提供 CRUD 接口，并负责转换 Pydantic 模型。"""
 
@@ -30,6 +97,7 @@ class ConfigService:
             instance = SystemConfig(**payload.model_dump())
             await self.repo.add(instance)
         await self.session.commit()
+        system_config_cache.invalidate()
         return SystemConfigRead.model_validate(instance)
 
     async def patch_config(self, key: str, payload: SystemConfigUpdate) -> Optional[SystemConfigRead]:
@@ -38,6 +106,7 @@ class ConfigService:
             return None
         await self.repo.update_fields(instance, **payload.model_dump(exclude_unset=True))
         await self.session.commit()
+        system_config_cache.invalidate()
         return SystemConfigRead.model_validate(instance)
 
     async def remove_config(self, key: str) -> bool:
@@ -46,4 +115,5 @@ class ConfigService:
             return False
         await self.repo.delete(instance)
         await self.session.commit()
+        system_config_cache.invalidate()
         return True
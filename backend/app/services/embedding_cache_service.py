@@ -0,0 +1,123 @@
+"""
+内容寻址的嵌入缓存：以 (提供方, 模型, 维度, 文本 sha256) 为键复用向量。
+
+进程内 LRU 在前，向量库中的 rag_embedding_cache 表在后；入库与检索共用同一份缓存，
+重复选择版本、编辑章节或重新生成章节时不再为相同文本重复调用嵌入接口。
+"""
+
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Sequence
+
+from ..core.config import settings
+from .vector_store_service import get_vector_store
+
+logger = logging.getLogger(__name__)
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """嵌入缓存，读取时先查进程内 LRU，再批量查询向量库，并把命中结果回填到 LRU。"""
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(provider: str, model: str, dimensions: int, digest: str) -> str:
+        return f"{provider}:{model}:{dimensions}:{digest}"
+
+    async def get_many(
+        self,
+        *,
+        provider: str,
+        model: str,
+        dimensions: int,
+        digests: Sequence[str],
+    ) -> Dict[str, List[float]]:
+        """返回命中的向量，键为文本摘要。"""
+        if not settings.embedding_cache_enabled or not digests:
+            return {}
+
+        found: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        for digest in digests:
+            key = self.make_key(provider, model, dimensions, digest)
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                found[digest] = embedding
+            else:
+                missing[key] = digest
+
+        vector_store = get_vector_store()
+        if missing and vector_store:
+            stored = await vector_store.get_cached_embeddings(list(missing))
+            for key, embedding in stored.items():
+                found[missing[key]] = embedding
+                self._remember(key, embedding)
+
+        if found:
+            logger.debug(
+                "嵌入缓存命中: model=%s hit=%d total=%d",
+                model,
+                len(found),
+                len(digests),
+            )
+        return found
+
+    async def put_many(
+        self,
+        *,
+        provider: str,
+        model: str,
+        dimensions: int,
+        embeddings: Dict[str, List[float]],
+    ) -> None:
+        """写入新生成的向量，键为文本摘要；空向量不缓存。"""
+        if not settings.embedding_cache_enabled:
+            return
+
+        records = []
+        for digest, embedding in embeddings.items():
+            if not embedding:
+                continue
+            key = self.make_key(provider, model, dimensions, digest)
+            self._remember(key, embedding)
+            records.append(
+                {
+                    "id": key,
+                    "provider": provider,
+                    "model": model,
+                    "dimensions": dimensions,
+                    "text_hash": digest,
+                    "embedding": embedding,
+                }
+            )
+
+        vector_store = get_vector_store()
+        if records and vector_store:
+            result = await vector_store.put_cached_embeddings(records)
+            if not result.ok:
+                logger.warning("嵌入缓存写入部分失败: failed=%d", len(result.failed_ids))
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        if self._max_entries <= 0:
+            return
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+embedding_cache = EmbeddingCache(settings.embedding_cache_memory_size)
+
+
+__all__ = ["EmbeddingCache", "embedding_cache", "text_digest"]
@@ -1,334 +1,564 @@
-import logging
-import os
-from typing import Any, Dict, List, Optional
-
-import httpx
-from fastapi import HTTPException, status
-from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError
-
-from ..core.config import settings
-from ..repositories.llm_config_repository import LLMConfigRepository
-from ..repositories.system_config_repository import SystemConfigRepository
-from ..repositories.user_repository import UserRepository
-from ..services.admin_setting_service import AdminSettingService
-from ..services.prompt_service import PromptService
-from ..services.usage_service import UsageService
-from ..utils.llm_tool import ChatMessage, LLMClient
-
-logger = logging.getLogger(__name__)
-
-try:  # pragma: no cover - 运行环境未安装时兼容
-    from ollama import AsyncClient as OllamaAsyncClient
-except ImportError:  # pragma: no cover - Ollama 为可选依赖
-    OllamaAsyncClient = None
-
-
-class LLMService:
-    """封装与大模型交互的所有逻辑，包括配额控制与配置选择。"""
-
-    def __init__(self, session):
-        self.session = session
-        self.llm_repo = LLMConfigRepository(session)
-        self.system_config_repo = SystemConfigRepository(session)
-        self.user_repo = UserRepository(session)
-        self.admin_setting_service = AdminSettingService(session)
-        self.usage_service = UsageService(session)
-        self._embedding_dimensions: Dict[str, int] = {}
-
-    async def get_llm_response(
-        self,
-        system_prompt: str,
-        conversation_history: List[Dict[str, str]],
-        *,
-        temperature: float = 0.7,
-        user_id: Optional[int] = None,
-        timeout: float = 300.0,
-        response_format: Optional[str] = "json_object",
-    ) -> str:
-        messages = [{"role": "system", "content": system_prompt}, *conversation_history]
-        return await self._stream_and_collect(
-            messages,
-            temperature=temperature,
-            user_id=user_id,
-            timeout=timeout,
-            response_format=response_format,
-        )
-
-    async def get_summary(
-        self,
-        chapter_content: str,
-        *,
-        temperature: float = 0.2,
-        user_id: Optional[int] = None,
-        timeout: float = 180.0,
-        system_prompt: Optional[str] = None,
-    ) -> str:
-        if not system_prompt:
-            prompt_service = PromptService(self.session)
-            system_prompt = await prompt_service.get_prompt("extraction")
-        if not system_prompt:
-            logger.error("未配置名为 'extraction' 的摘要提示词，无法生成章节摘要")
-            raise HTTPException(status_code=500, detail="未配置摘要提示词，请联系管理员配置 'extraction' 提示词")
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": chapter_content},
-        ]
-        return await self._stream_and_collect(messages, temperature=temperature, user_id=user_id, timeout=timeout)
-
-    async def _stream_and_collect(
-        self,
-        messages: List[Dict[str, str]],
-        *,
-        temperature: float,
-        user_id: Optional[int],
-        timeout: float,
-        response_format: Optional[str] = None,
-    ) -> str:
-        config = await self._resolve_llm_config(user_id)
-        client = LLMClient(api_key=config["api_key"], base_url=config.get("base_url"))
-
-        chat_messages = [ChatMessage(role=msg["role"], content=msg["content"]) for msg in messages]
-
-        full_response = ""
-        finish_reason = None
-
-        logger.info(
-            "Streaming LLM response: model=%s user_id=%s messages=%d",
-            config.get("model"),
-            user_id,
-            len(messages),
-        )
-
-        try:
-            async for part in client.stream_chat(
-                messages=chat_messages,
-                model=config.get("model"),
-                temperature=temperature,
-                timeout=int(timeout),
-                response_format=response_format,
-            ):
-                if part.get("content"):
-                    full_response += part["content"]
-                if part.get("finish_reason"):
-                    finish_reason = part["finish_reason"]
-        except InternalServerError as exc:
-            detail = "AI 服务内部错误，请稍后重试"
-            response = getattr(exc, "response", None)
-            if response is not None:
-                try:
-                    payload = response.json()
-                    error_data = payload.get("error", {}) if isinstance(payload, dict) else {}
-                    detail = error_data.get("message_zh") or error_data.get("message") or detail
-                except Exception:
-                    detail = str(exc) or detail
-            else:
-                detail = str(exc) or detail
-            logger.error(
-                "LLM stream internal error: model=%s user_id=%s detail=%s",
-                config.get("model"),
-                user_id,
-                detail,
-                exc_info=exc,
-            )
-            raise HTTPException(status_code=503, detail=detail)
-        except (httpx.RemoteProtocolError, httpx.ReadTimeout, APIConnectionError, APITimeoutError) as exc:
-            if isinstance(exc, httpx.RemoteProtocolError):
-                detail = "AI 服务连接被意外中断，请稍后重试"
-            elif isinstance(exc, (httpx.ReadTimeout, APITimeoutError)):
-                detail = "AI 服务响应超时，请稍后重试"
-            else:
-                detail = "无法连接到 AI 服务，请稍后重试"
-            logger.error(
-                "LLM stream failed: model=%s user_id=%s detail=%s",
-                config.get("model"),
-                user_id,
-                detail,
-                exc_info=exc,
-            )
-            raise HTTPException(status_code=503, detail=detail) from exc
-
-        logger.debug(
-            "LLM response collected: model=%s user_id=%s finish_reason=%s preview=%s",
-            config.get("model"),
-            user_id,
-            finish_reason,
-            full_response[:500],
-        )
-
-        if finish_reason == "length":
-            logger.warning(
-                "LLM response truncated: model=%s user_id=%s response_length=%d",
-                config.get("model"),
-                user_id,
-                len(full_response),
-            )
-            raise HTTPException(
-                status_code=500,
-                detail=f"AI 响应因长度限制被截断（已生成 {len(full_response)} 字符），请缩短输入内容或调整模型参数"
-            )
-
-        if not full_response:
-            logger.error(
-                "LLM returned empty response: model=%s user_id=%s finish_reason=%s",
-                config.get("model"),
-                user_id,
-                finish_reason,
-            )
-            raise HTTPException(
-                status_code=500,
-                detail=f"AI 未返回有效内容（结束原因: {finish_reason or '未知'}），请稍后重试或联系管理员"
-            )
-
-        await self.usage_service.increment("api_request_count")
-        logger.info(
-            "LLM response success: model=%s user_id=%s chars=%d",
-            config.get("model"),
-            user_id,
-            len(full_response),
-        )
-        return full_response
-
-    async def _resolve_llm_config(self, user_id: Optional[int]) -> Dict[str, Optional[str]]:
-        if user_id:
-            config = await self.llm_repo.get_by_user(user_id)
-            if config and config.llm_provider_api_key:
-                return {
-                    "api_key": config.llm_provider_api_key,
-                    "base_url": config.llm_provider_url,
-                    "model": config.llm_provider_model,
-                }
-
-        # 检查每日使用次数限制
-        if user_id:
-            await self._enforce_daily_limit(user_id)
-
-        api_key = await self._get_config_value("llm.api_key")
-        base_url = await self._get_config_value("llm.base_url")
-        model = await self._get_config_value("llm.model")
-
-        if not api_key:
-            logger.error("未配置默认 LLM API Key，且用户 %s 未设置自定义 API Key", user_id)
-            raise HTTPException(
-                status_code=500,
-                detail="未配置默认 LLM API Key，请联系管理员配置系统默认 API Key 或在个人设置中配置自定义 API Key"
-            )
-
-        return {"api_key": api_key, "base_url": base_url, "model": model}
-
-    async def get_embedding(
-        self,
-        text: str,
-        *,
-        user_id: Optional[int] = None,
-        model: Optional[str] = None,
-    ) -> List[float]:
-        """生成文本向量，用于章节 RAG 检索，支持 openai 与 ollama 双提供方。"""
-        provider = await self._get_config_value("embedding.provider") or "openai"
-        default_model = (
-            await self._get_config_value("ollama.embedding_model") or "nomic-embed-text:latest"
-            if provider == "ollama"
-            else await self._get_config_value("embedding.model") or "text-embedding-3-large"
-        )
-        target_model = model or default_model
-
-        if provider == "ollama":
-            if OllamaAsyncClient is None:
-                logger.error("未安装 ollama 依赖，无法调用本地嵌入模型。")
-                raise HTTPException(status_code=500, detail="缺少 Ollama 依赖，请先安装 ollama 包。")
-
-            base_url = (
-                await self._get_config_value("ollama.embedding_base_url")
-                or await self._get_config_value("embedding.base_url")
-            )
-            client = OllamaAsyncClient(host=base_url)
-            try:
-                response = await client.embeddings(model=target_model, prompt=text)
-            except Exception as exc:  # pragma: no cover - 本地服务调用失败
-                logger.error(
-                    "Ollama 嵌入请求失败: model=%s base_url=%s error=%s",
-                    target_model,
-                    base_url,
-                    exc,
-                    exc_info=True,
-                )
-                return []
-            embedding: Optional[List[float]]
-            if isinstance(response, dict):
-                embedding = response.get("embedding")
-            else:
-                embedding = getattr(response, "embedding", None)
-            if not embedding:
-                logger.warning("Ollama 返回空向量: model=%s", target_model)
-                return []
-            if not isinstance(embedding, list):
-                embedding = list(embedding)
-        else:
-            config = await self._resolve_llm_config(user_id)
-            api_key = await self._get_config_value("embedding.api_key") or config["api_key"]
-            base_url = await self._get_config_value("embedding.base_url") or config.get("base_url")
-            client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-            try:
-                response = await client.embeddings.create(
-                    input=text,
-                    model=target_model,
-                )
-            except Exception as exc:  # pragma: no cover - 网络或鉴权失败
-                logger.error(
-                    "OpenAI 嵌入请求失败: model=%s base_url=%s user_id=%s error=%s",
-                    target_model,
-                    base_url,
-                    user_id,
-                    exc,
-                    exc_info=True,
-                )
-                return []
-            if not response.data:
-                logger.warning("OpenAI 嵌入请求返回空数据: model=%s user_id=%s", target_model, user_id)
-                return []
-            embedding = response.data[0].embedding
-
-        if not isinstance(embedding, list):
-            embedding = list(embedding)
-
-        dimension = len(embedding)
-        if not dimension:
-            vector_size_str = await self._get_config_value("embedding.model_vector_size")
-            if vector_size_str:
-                dimension = int(vector_size_str)
-        if dimension:
-            self._embedding_dimensions[target_model] = dimension
-        return embedding
-
-    async def get_embedding_dimension(self, model: Optional[str] = None) -> Optional[int]:
-        """获取嵌入向量维度，优先返回缓存结果，其次读取配置。"""
-        provider = await self._get_config_value("embedding.provider") or "openai"
-        default_model = (
-            await self._get_config_value("ollama.embedding_model") or "nomic-embed-text:latest"
-            if provider == "ollama"
-            else await self._get_config_value("embedding.model") or "text-embedding-3-large"
-        )
-        target_model = model or default_model
-        if target_model in self._embedding_dimensions:
-            return self._embedding_dimensions[target_model]
-        vector_size_str = await self._get_config_value("embedding.model_vector_size")
-        return int(vector_size_str) if vector_size_str else None
-
-    async def _enforce_daily_limit(self, user_id: int) -> None:
-        limit_str = await self.admin_setting_service.get("daily_request_limit", "100")
-        limit = int(limit_str or 10)
-        used = await self.user_repo.get_daily_request(user_id)
-        if used >= limit:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="今日请求次数已达上限，请明日再试或设置自定义 API Key。",
-            )
-        await self.user_repo.increment_daily_request(user_id)
-        await self.session.commit()
-
-    async def _get_config_value(self, key: str) -> Optional[str]:
-        record = await self.system_config_repo.get_by_key(key)
-        if record:
-            return record.value
-        # 兼容环境变量，首次迁移时无需立即写入数据库
-        env_key = key.upper().replace(".", "_")
-        return os.getenv(env_key)
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+from openai import APIConnectionError, APITimeoutError, InternalServerError
+
+from ..core.config import settings
+from ..repositories.llm_config_repository import LLMConfigRepository
+from ..services.config_service import system_config_cache
+from ..services.embedding_cache_service import embedding_cache, text_digest
+from ..services.prompt_service import PromptService
+from ..services.quota_service import daily_quota
+from ..services.usage_service import UsageService
+from ..utils.concurrency import KeyedLimiter
+from ..utils.llm_tool import ChatMessage, LLMClient, OllamaAsyncClient, llm_clients
+
+logger = logging.getLogger(__name__)
+
+# 按模型服务地址限制并发，避免同时打满上游的速率限制
+_PROVIDER_LIMITER = KeyedLimiter(settings.llm_provider_concurrency)
+
+
+@dataclass(frozen=True)
+class EmbeddingTarget:
+    """一次嵌入调用所需的提供方、模型、维度与凭据，解析完成后调用嵌入接口不再访问数据库会话。"""
+
+    provider: str
+    model: str
+    configured_dimension: int
+    # 实际请求的维度，0 表示未指定，返回模型原始长度
+    requested_dimension: int
+    base_url: Optional[str]
+    api_key: Optional[str] = field(default=None, repr=False)
+    user_id: Optional[int] = None
+    # 是否使用系统默认 Key，需计入每日配额
+    metered: bool = False
+
+    @property
+    def model_tag(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+class LLMService:
+    """封装与大模型交互的所有逻辑，包括配额控制与配置选择。"""
+
+    def __init__(self, session):
+        self.session = session
+        self.llm_repo = LLMConfigRepository(session)
+        self.usage_service = UsageService(session)
+        self._embedding_dimensions: Dict[str, int] = {}
+
+    async def get_llm_response(
+        self,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]],
+        *,
+        temperature: float = 0.7,
+        user_id: Optional[int] = None,
+        timeout: float = 300.0,
+        response_format: Optional[str] = "json_object",
+    ) -> str:
+        messages = [{"role": "system", "content": system_prompt}, *conversation_history]
+        return await self._stream_and_collect(
+            messages,
+            temperature=temperature,
+            user_id=user_id,
+            timeout=timeout,
+            response_format=response_format,
+        )
+
+    async def get_summary(
+        self,
+        chapter_content: str,
+        *,
+        temperature: float = 0.2,
+        user_id: Optional[int] = None,
+        timeout: float = 180.0,
+        system_prompt: Optional[str] = None,
+    ) -> str:
+        if not system_prompt:
+            prompt_service = PromptService(self.session)
+            system_prompt = await prompt_service.get_prompt("extraction")
+        if not system_prompt:
+            logger.error("未配置名为 'extraction' 的摘要提示词，无法生成章节摘要")
+            raise HTTPException(status_code=500, detail="未配置摘要提示词，请联系管理员配置 'extraction' 提示词")
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": chapter_content},
+        ]
+        return await self._stream_and_collect(messages, temperature=temperature, user_id=user_id, timeout=timeout)
+
+    async def stream_llm_response(
+        self,
+        system_prompt: str,
+        conversation_history: List[Dict[str, str]],
+        *,
+        temperature: float = 0.7,
+        user_id: Optional[int] = None,
+        timeout: float = 300.0,
+        response_format: Optional[str] = "json_object",
+    ) -> AsyncIterator[str]:
+        """逐段返回模型输出，截断与空响应的校验在流结束时进行。"""
+        messages = [{"role": "system", "content": system_prompt}, *conversation_history]
+        async for delta in self._stream_chat(
+            messages,
+            temperature=temperature,
+            user_id=user_id,
+            timeout=timeout,
+            response_format=response_format,
+        ):
+            yield delta
+
+    async def _stream_and_collect(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        temperature: float,
+        user_id: Optional[int],
+        timeout: float,
+        response_format: Optional[str] = None,
+    ) -> str:
+        parts: List[str] = []
+        async for delta in self._stream_chat(
+            messages,
+            temperature=temperature,
+            user_id=user_id,
+            timeout=timeout,
+            response_format=response_format,
+        ):
+            parts.append(delta)
+        return "".join(parts)
+
+    async def _stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        temperature: float,
+        user_id: Optional[int],
+        timeout: float,
+        response_format: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        config, metered = await self._resolve_llm_config(user_id)
+        # 使用系统默认 Key 时计入每日配额，调用失败时由配额服务退还
+        async with daily_quota.consume(user_id if metered else None):
+            async for delta in self._stream_completion(
+                config,
+                messages,
+                temperature=temperature,
+                user_id=user_id,
+                timeout=timeout,
+                response_format=response_format,
+            ):
+                yield delta
+
+    async def _stream_completion(
+        self,
+        config: Dict[str, Optional[str]],
+        messages: List[Dict[str, str]],
+        *,
+        temperature: float,
+        user_id: Optional[int],
+        timeout: float,
+        response_format: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        client = LLMClient(api_key=config["api_key"], base_url=config.get("base_url"))
+
+        chat_messages = [ChatMessage(role=msg["role"], content=msg["content"]) for msg in messages]
+
+        full_response = ""
+        finish_reason = None
+        usage: Optional[Dict[str, int]] = None
+
+        logger.info(
+            "Streaming LLM response: model=%s user_id=%s messages=%d",
+            config.get("model"),
+            user_id,
+            len(messages),
+        )
+
+        try:
+            async with _PROVIDER_LIMITER.slot(config.get("base_url") or "default"):
+                async for part in client.stream_chat(
+                    messages=chat_messages,
+                    model=config.get("model"),
+                    temperature=temperature,
+                    timeout=int(timeout),
+                    response_format=response_format,
+                    include_usage=settings.llm_stream_include_usage,
+                ):
+                    if part.get("usage"):
+                        usage = part["usage"]
+                        continue
+                    if part.get("content"):
+                        full_response += part["content"]
+                        yield part["content"]
+                    if part.get("finish_reason"):
+                        finish_reason = part["finish_reason"]
+        except InternalServerError as exc:
+            detail = "AI 服务内部错误，请稍后重试"
+            response = getattr(exc, "response", None)
+            if response is not None:
+                try:
+                    payload = response.json()
+                    error_data = payload.get("error", {}) if isinstance(payload, dict) else {}
+                    detail = error_data.get("message_zh") or error_data.get("message") or detail
+                except Exception:
+                    detail = str(exc) or detail
+            else:
+                detail = str(exc) or detail
+            logger.error(
+                "LLM stream internal error: model=%s user_id=%s detail=%s",
+                config.get("model"),
+                user_id,
+                detail,
+                exc_info=exc,
+            )
+            raise HTTPException(status_code=503, detail=detail)
+        except (httpx.RemoteProtocolError, httpx.ReadTimeout, APIConnectionError, APITimeoutError) as exc:
+            if isinstance(exc, httpx.RemoteProtocolError):
+                detail = "AI 服务连接被意外中断，请稍后重试"
+            elif isinstance(exc, (httpx.ReadTimeout, APITimeoutError)):
+                detail = "AI 服务响应超时，请稍后重试"
+            else:
+                detail = "无法连接到 AI 服务，请稍后重试"
+            logger.error(
+                "LLM stream failed: model=%s user_id=%s detail=%s",
+                config.get("model"),
+                user_id,
+                detail,
+                exc_info=exc,
+            )
+            raise HTTPException(status_code=503, detail=detail) from exc
+
+        # 截断或空响应同样消耗了 token，先记录用量再校验结果
+        if usage:
+            await self._record_token_usage(config.get("model"), user_id, usage)
+
+        logger.debug(
+            "LLM response collected: model=%s user_id=%s finish_reason=%s preview=%s",
+            config.get("model"),
+            user_id,
+            finish_reason,
+            full_response[:500],
+        )
+
+        if finish_reason == "length":
+            logger.warning(
+                "LLM response truncated: model=%s user_id=%s response_length=%d",
+                config.get("model"),
+                user_id,
+                len(full_response),
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"AI 响应因长度限制被截断（已生成 {len(full_response)} 字符），请缩短输入内容或调整模型参数"
+            )
+
+        if not full_response:
+            logger.error(
+                "LLM returned empty response: model=%s user_id=%s finish_reason=%s",
+                config.get("model"),
+                user_id,
+                finish_reason,
+            )
+            raise HTTPException(
+                status_code=500,
+                detail=f"AI 未返回有效内容（结束原因: {finish_reason or '未知'}），请稍后重试或联系管理员"
+            )
+
+        await self.usage_service.increment("api_request_count")
+        logger.info(
+            "LLM response success: model=%s user_id=%s chars=%d",
+            config.get("model"),
+            user_id,
+            len(full_response),
+        )
+
+    async def _record_token_usage(self, model: Optional[str], user_id: Optional[int], usage: Dict[str, int]) -> None:
+        """按时间分桶累计 prompt/completion/缓存命中 token 数，用于观察前缀缓存命中率。"""
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        cached_tokens = usage.get("cached_tokens", 0)
+        await self.usage_service.increment("llm_prompt_tokens", prompt_tokens)
+        await self.usage_service.increment("llm_completion_tokens", usage.get("completion_tokens", 0))
+        await self.usage_service.increment("llm_cached_tokens", cached_tokens)
+        logger.info(
+            "LLM token usage: model=%s user_id=%s prompt=%d cached=%d (%.0f%%) completion=%d",
+            model,
+            user_id,
+            prompt_tokens,
+            cached_tokens,
+            cached_tokens * 100 / prompt_tokens if prompt_tokens else 0,
+            usage.get("completion_tokens", 0),
+        )
+
+    async def _resolve_llm_config(self, user_id: Optional[int]) -> Tuple[Dict[str, Optional[str]], bool]:
+        """返回模型配置，以及该调用是否使用系统默认 Key（需计入每日配额）。"""
+        if user_id:
+            config = await self.llm_repo.get_by_user(user_id)
+            if config and config.llm_provider_api_key:
+                return {
+                    "api_key": config.llm_provider_api_key,
+                    "base_url": config.llm_provider_url,
+                    "model": config.llm_provider_model,
+                }, False
+
+        api_key = await self._get_config_value("llm.api_key")
+        base_url = await self._get_config_value("llm.base_url")
+        model = await self._get_config_value("llm.model")
+
+        if not api_key:
+            logger.error("未配置默认 LLM API Key，且用户 %s 未设置自定义 API Key", user_id)
+            raise HTTPException(
+                status_code=500,
+                detail="未配置默认 LLM API Key，请联系管理员配置系统默认 API Key 或在个人设置中配置自定义 API Key"
+            )
+
+        return {"api_key": api_key, "base_url": base_url, "model": model}, bool(user_id)
+
+    async def get_embedding(
+        self,
+        text: str,
+        *,
+        user_id: Optional[int] = None,
+        model: Optional[str] = None,
+    ) -> List[float]:
+        """生成文本向量，用于章节 RAG 检索，支持 openai 与 ollama 双提供方。"""
+        embeddings = await self.get_embeddings([text], user_id=user_id, model=model)
+        return embeddings[0] if embeddings else []
+
+    async def get_embeddings(
+        self,
+        texts: List[str],
+        *,
+        user_id: Optional[int] = None,
+        model: Optional[str] = None,
+    ) -> List[List[float]]:
+        """批量生成文本向量，返回结果与输入一一对应，失败项为空列表。
+
+        OpenAI 兼容接口按 ``embedding_batch_size`` 分批，每批一次请求；
+        Ollama 不支持批量输入，改为受 ``embedding_concurrency`` 限制的并发请求。
+        """
+        if not texts:
+            return []
+        target = await self.resolve_embedding_target(user_id=user_id, model=model)
+        return await self.embed_texts(target, texts)
+
+    async def resolve_embedding_target(
+        self,
+        *,
+        user_id: Optional[int] = None,
+        model: Optional[str] = None,
+    ) -> EmbeddingTarget:
+        """读取嵌入提供方、模型、维度与凭据。
+
+        所有需要经由会话读取的配置都在此完成；需要对嵌入调用设置时限的场景应先调用本方法，
+        只对 ``embed_texts`` 计时，避免取消时中断会话上的查询。
+        """
+        provider, target_model = await self._resolve_embedding_model(model)
+        vector_size_str = await self._get_config_value("embedding.model_vector_size")
+        configured_dimension = int(vector_size_str) if vector_size_str else 0
+        if provider == "ollama":
+            base_url = (
+                await self._get_config_value("ollama.embedding_base_url")
+                or await self._get_config_value("embedding.base_url")
+            )
+            return EmbeddingTarget(
+                provider=provider,
+                model=target_model,
+                configured_dimension=configured_dimension,
+                requested_dimension=0,
+                base_url=base_url,
+            )
+
+        # text-embedding-3 等模型支持按 dimensions 直接返回截断后的向量，缩小存储与检索开销；
+        # 缓存按实际请求的维度区分（0 表示未指定，返回模型原始长度），开关切换前后的向量不会混用
+        requested_dimension = 0
+        if configured_dimension:
+            request_dimensions = (
+                await self._get_config_value("embedding.request_dimensions") or ""
+            ).strip().lower() in {"1", "true", "yes", "on"}
+            requested_dimension = configured_dimension if request_dimensions else 0
+        config, metered = await self._resolve_llm_config(user_id)
+        return EmbeddingTarget(
+            provider=provider,
+            model=target_model,
+            configured_dimension=configured_dimension,
+            requested_dimension=requested_dimension,
+            base_url=await self._get_config_value("embedding.base_url") or config.get("base_url"),
+            api_key=await self._get_config_value("embedding.api_key") or config["api_key"],
+            user_id=user_id,
+            metered=metered,
+        )
+
+    async def embed_texts(self, target: EmbeddingTarget, texts: List[str]) -> List[List[float]]:
+        """按已解析的 ``target`` 生成向量，返回结果与输入一一对应，失败项为空列表；不访问数据库会话。"""
+        if not texts:
+            return []
+        provider = target.provider
+        target_model = target.model
+        requested_dimension = target.requested_dimension
+
+        # 相同文本的向量按内容寻址复用，只为未命中的文本调用嵌入接口
+        digests = [text_digest(text) for text in texts]
+        cached = await embedding_cache.get_many(
+            provider=provider,
+            model=target_model,
+            dimensions=requested_dimension,
+            digests=digests,
+        )
+        if requested_dimension:
+            cached = {digest: vector for digest, vector in cached.items() if len(vector) == requested_dimension}
+        pending: Dict[str, str] = {}
+        for text, digest in zip(texts, digests):
+            if digest not in cached and digest not in pending:
+                pending[digest] = text
+
+        fresh: Dict[str, List[float]] = {}
+        if pending:
+            pending_texts = list(pending.values())
+            if provider == "ollama":
+                if OllamaAsyncClient is None:
+                    logger.error("未安装 ollama 依赖，无法调用本地嵌入模型。")
+                    raise HTTPException(status_code=500, detail="缺少 Ollama 依赖，请先安装 ollama 包。")
+
+                generated = await self._embed_with_ollama(pending_texts, model=target_model, base_url=target.base_url)
+            else:
+                async with daily_quota.consume(target.user_id if target.metered else None) as usage:
+                    generated = await self._embed_with_openai(
+                        pending_texts,
+                        model=target_model,
+                        api_key=target.api_key,
+                        base_url=target.base_url,
+                        user_id=target.user_id,
+                        dimensions=requested_dimension or None,
+                    )
+                    # 嵌入失败时按约定返回空向量而不抛异常，需显式告知配额本次调用未成功
+                    if not any(generated):
+                        usage.mark_failed()
+            fresh = dict(zip(pending.keys(), generated))
+            await embedding_cache.put_many(
+                provider=provider,
+                model=target_model,
+                dimensions=requested_dimension,
+                embeddings=fresh,
+            )
+
+        embeddings = [cached.get(digest) or fresh.get(digest) or [] for digest in digests]
+        dimension = next((len(item) for item in embeddings if item), 0) or target.configured_dimension
+        if dimension:
+            self._embedding_dimensions[target_model] = dimension
+        return embeddings
+
+    async def _embed_with_openai(
+        self,
+        texts: List[str],
+        *,
+        model: str,
+        api_key: Optional[str],
+        base_url: Optional[str],
+        user_id: Optional[int],
+        dimensions: Optional[int] = None,
+    ) -> List[List[float]]:
+        client = llm_clients.get_openai(api_key, base_url)
+        extra = {"dimensions": dimensions} if dimensions else {}
+        batch_size = max(1, settings.embedding_batch_size)
+        embeddings: List[List[float]] = [[] for _ in texts]
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            try:
+                response = await client.embeddings.create(
+                    input=batch,
+                    model=model,
+                    **extra,
+                )
+            except Exception as exc:  # pragma: no cover - 网络或鉴权失败
+                logger.error(
+                    "OpenAI 嵌入请求失败: model=%s base_url=%s user_id=%s batch=%d error=%s",
+                    model,
+                    base_url,
+                    user_id,
+                    len(batch),
+                    exc,
+                    exc_info=True,
+                )
+                continue
+            if not response.data:
+                logger.warning("OpenAI 嵌入请求返回空数据: model=%s user_id=%s", model, user_id)
+                continue
+            # 返回顺序以 index 字段为准，兼容不保证顺序的第三方实现
+            for position, item in enumerate(response.data):
+                index = getattr(item, "index", position)
+                if 0 <= index < len(batch):
+                    embeddings[start + index] = list(item.embedding)
+        return embeddings
+
+    async def _embed_with_ollama(
+        self,
+        texts: List[str],
+        *,
+        model: str,
+        base_url: Optional[str],
+    ) -> List[List[float]]:
+        client = llm_clients.get_ollama(base_url)
+        semaphore = asyncio.Semaphore(max(1, settings.embedding_concurrency))
+
+        async def _embed_one(text: str) -> List[float]:
+            async with semaphore:
+                try:
+                    response = await client.embeddings(model=model, prompt=text)
+                except Exception as exc:  # pragma: no cover - 本地服务调用失败
+                    logger.error(
+                        "Ollama 嵌入请求失败: model=%s base_url=%s error=%s",
+                        model,
+                        base_url,
+                        exc,
+                        exc_info=True,
+                    )
+                    return []
+            embedding: Optional[List[float]]
+            if isinstance(response, dict):
+                embedding = response.get("embedding")
+            else:
+                embedding = getattr(response, "embedding", None)
+            if not embedding:
+                logger.warning("Ollama 返回空向量: model=%s", model)
+                return []
+            return list(embedding)
+
+        return list(await asyncio.gather(*(_embed_one(text) for text in texts)))
+
+    async def _resolve_embedding_model(self, model: Optional[str] = None) -> Tuple[str, str]:
+        """返回当前生效的嵌入提供方与模型名称。"""
+        provider = await self._get_config_value("embedding.provider") or "openai"
+        default_model = (
+            await self._get_config_value("ollama.embedding_model") or "nomic-embed-text:latest"
+            if provider == "ollama"
+            else await self._get_config_value("embedding.model") or "text-embedding-3-large"
+        )
+        return provider, model or default_model
+
+    async def get_embedding_model_tag(self, model: Optional[str] = None) -> str:
+        """返回写入向量库时标记在每行上的模型标识，检索时据此只比较同一模型的向量。"""
+        provider, target_model = await self._resolve_embedding_model(model)
+        return f"{provider}:{target_model}"
+
+    async def get_embedding_dimension(self, model: Optional[str] = None) -> Optional[int]:
+        """获取嵌入向量维度，优先返回缓存结果，其次读取配置。"""
+        provider, target_model = await self._resolve_embedding_model(model)
+        if target_model in self._embedding_dimensions:
+            return self._embedding_dimensions[target_model]
+        vector_size_str = await self._get_config_value("embedding.model_vector_size")
+        return int(vector_size_str) if vector_size_str else None
+
+    async def _get_config_value(self, key: str) -> Optional[str]:
+        value = await system_config_cache.get(self.session, key)
+        if value is not None:
+            return value
+        # 兼容环境变量，首次迁移时无需立即写入数据库
+        env_key = key.upper().replace(".", "_")
+        return os.getenv(env_key)
@@ -84,18 +84,22 @@ from ..models import (
     NovelConversation,
     NovelProject,
 )
-from ..repositories.novel_repository import NovelRepository
+from ..repositories.novel_repository import NovelRepository, ProjectLoad
 from ..schemas.admin import AdminNovelSummary
 from ..schemas.novel import (
     Blueprint,
     Chapter as ChapterSchema,
     ChapterGenerationStatus,
+    ChapterMutationResponse,
     ChapterOutline as ChapterOutlineSchema,
+    ChapterVersionContent,
+    ChapterVersionMeta,
     NovelProject as NovelProjectSchema,
     NovelProjectSummary,
     NovelSectionResponse,
     NovelSectionType,
 )
+from .blueprint_context_service import blueprint_context_cache
 
 
 class NovelService:
@@ -121,8 +125,14 @@ class NovelService:
         await self.session.refresh(project)
         return project
 
-    async def ensure_project_owner(self, project_id: str, user_id: int) -> NovelProject:
-        project = await self.repo.get_by_id(project_id)
+    async def ensure_project_owner(
+        self,
+        project_id: str,
+        user_id: int,
+        load: ProjectLoad = ProjectLoad.OWNERSHIP,
+    ) -> NovelProject:
+        """校验项目归属；默认只加载项目行，需要关联数据时通过 load 指定档位。"""
+        project = await self.repo.get_by_id(project_id, load=load)
         if not project:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
         if project.user_id != user_id:
@@ -130,7 +140,7 @@ class NovelService:
         return project
 
     async def get_project_schema(self, project_id: str, user_id: int) -> NovelProjectSchema:
-        project = await self.ensure_project_owner(project_id, user_id)
+        project = await self.ensure_project_owner(project_id, user_id, load=ProjectLoad.FULL)
         return await self._serialize_project(project)
 
     async def get_section_data(
@@ -139,7 +149,7 @@ class NovelService:
         user_id: int,
         section: NovelSectionType,
     ) -> NovelSectionResponse:
-        project = await self.ensure_project_owner(project_id, user_id)
+        project = await self.ensure_project_owner(project_id, user_id, load=ProjectLoad.OUTLINE)
         return self._build_section_response(project, section)
 
     async def get_chapter_schema(
@@ -149,7 +159,7 @@ class NovelService:
         chapter_number: int,
     ) -> ChapterSchema:
         project = await self.ensure_project_owner(project_id, user_id)
-        return self._build_chapter_schema(project, chapter_number)
+        return await self._load_chapter_schema(project, chapter_number)
 
     async def list_projects_for_user(self, user_id: int) -> List[NovelProjectSummary]:
         projects = await self.repo.list_by_user(user_id)
@@ -302,6 +312,7 @@ class NovelService:
 
         await self.session.commit()
         await self._touch_project(project_id)
+        blueprint_context_cache.invalidate(project_id)
 
     async def patch_blueprint(self, project_id: str, patch: Dict) -> None:
         blueprint = await self.session.get(NovelBlueprint, project_id)
@@ -365,6 +376,7 @@ class NovelService:
                 )
         await self.session.commit()
         await self._touch_project(project_id)
+        blueprint_context_cache.invalidate(project_id)
 
     # ------------------------------------------------------------------
     # 章节与版本
@@ -380,6 +392,89 @@ class NovelService:
         result = await self.session.execute(stmt)
         return result.scalars().first()
 
+    async def get_chapter_detail(
+        self,
+        project_id: str,
+        chapter_number: int,
+        *,
+        with_version_content: bool = False,
+    ) -> Optional[Chapter]:
+        """读取单个章节及其版本、评估与选中版本。"""
+        return await self.repo.get_chapter_detail(
+            project_id,
+            chapter_number,
+            with_version_content=with_version_content,
+        )
+
+    async def get_chapter_version(
+        self,
+        project_id: str,
+        user_id: int,
+        chapter_number: int,
+        version_id: int,
+    ) -> ChapterVersionContent:
+        await self.ensure_project_owner(project_id, user_id)
+        version = await self.repo.get_chapter_version(project_id, chapter_number, version_id)
+        if not version:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="章节版本不存在")
+        return ChapterVersionContent(
+            id=version.id,
+            label=version.version_label,
+            length=version.content_length or 0,
+            created_at=version.created_at,
+            content=version.content,
+        )
+
+    async def get_chapter_mutation(
+        self,
+        project_id: str,
+        chapter_numbers: Iterable[int],
+        *,
+        deleted_chapter_numbers: Iterable[int] = (),
+    ) -> ChapterMutationResponse:
+        """构造写作接口的增量响应，只序列化本次涉及的章节，不再整项目重新加载。"""
+        numbers = sorted({number for number in chapter_numbers if number is not None})
+        outlines_map: Dict[int, ChapterOutline] = {}
+        chapters_map: Dict[int, Chapter] = {}
+        if numbers:
+            result = await self.session.execute(
+                select(ChapterOutline).where(
+                    ChapterOutline.project_id == project_id,
+                    ChapterOutline.chapter_number.in_(numbers),
+                )
+            )
+            outlines_map = {outline.chapter_number: outline for outline in result.scalars().all()}
+            chapters = await self.repo.list_chapter_details(project_id, numbers, with_version_content=True)
+            chapters_map = {chapter.chapter_number: chapter for chapter in chapters}
+
+        revision = await self.session.scalar(
+            select(NovelProject.revision).where(NovelProject.id == project_id)
+        )
+        return ChapterMutationResponse(
+            project_id=project_id,
+            revision=revision or 0,
+            chapters=[
+                self._build_chapter_schema(
+                    None,
+                    number,
+                    outlines_map=outlines_map,
+                    chapters_map=chapters_map,
+                    include_version_content=True,
+                )
+                for number in numbers
+                if number in outlines_map or number in chapters_map
+            ],
+            outlines=[
+                ChapterOutlineSchema(
+                    chapter_number=outline.chapter_number,
+                    title=outline.title,
+                    summary=outline.summary or "",
+                )
+                for number, outline in sorted(outlines_map.items())
+            ],
+            deleted_chapter_numbers=sorted(set(deleted_chapter_numbers)),
+        )
+
     async def get_or_create_chapter(self, project_id: str, chapter_number: int) -> Chapter:
         stmt = (
             select(Chapter)
@@ -425,10 +520,12 @@ class NovelService:
         selected = versions[version_index]
         chapter.selected_version_id = selected.id
         chapter.status = ChapterGenerationStatus.SUCCESSFUL.value
-        chapter.word_count = len(selected.content or "")
+        chapter.word_count = selected.content_length or 0
         await self.session.commit()
         await self.session.refresh(chapter)
         await self._touch_project(chapter.project_id)
+        # 版本列表不含正文，仅为选中的版本读取正文供摘要任务使用
+        await self.session.refresh(selected, attribute_names=["content"])
         return selected
 
     async def add_chapter_evaluation(self, chapter: Chapter, version: Optional[ChapterVersion], feedback: str, decision: Optional[str] = None) -> None:
@@ -464,7 +561,7 @@ class NovelService:
     # 序列化辅助
     # ------------------------------------------------------------------
     async def get_project_schema_for_admin(self, project_id: str) -> NovelProjectSchema:
-        project = await self.repo.get_by_id(project_id)
+        project = await self.repo.get_by_id(project_id, load=ProjectLoad.FULL)
         if not project:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
         return await self._serialize_project(project)
@@ -474,7 +571,7 @@ class NovelService:
         project_id: str,
         section: NovelSectionType,
     ) -> NovelSectionResponse:
-        project = await self.repo.get_by_id(project_id)
+        project = await self.repo.get_by_id(project_id, load=ProjectLoad.OUTLINE)
         if not project:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
         return self._build_section_response(project, section)
@@ -484,10 +581,21 @@ class NovelService:
         project_id: str,
         chapter_number: int,
     ) -> ChapterSchema:
-        project = await self.repo.get_by_id(project_id)
+        project = await self.repo.get_by_id(project_id, load=ProjectLoad.OWNERSHIP)
         if not project:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
-        return self._build_chapter_schema(project, chapter_number)
+        return await self._load_chapter_schema(project, chapter_number)
+
+    async def _load_chapter_schema(self, project: NovelProject, chapter_number: int) -> ChapterSchema:
+        outline = await self.get_outline(project.id, chapter_number)
+        chapter = await self.get_chapter_detail(project.id, chapter_number, with_version_content=True)
+        return self._build_chapter_schema(
+            project,
+            chapter_number,
+            outlines_map={chapter_number: outline} if outline else {},
+            chapters_map={chapter_number: chapter} if chapter else {},
+            include_version_content=True,
+        )
 
     async def _serialize_project(self, project: NovelProject) -> NovelProjectSchema:
         conversations = [
@@ -518,13 +626,14 @@ class NovelService:
             conversation_history=conversations,
             blueprint=blueprint_schema,
             chapters=chapters_schema,
+            revision=project.revision or 0,
         )
 
     async def _touch_project(self, project_id: str) -> None:
         await self.session.execute(
             update(NovelProject)
             .where(NovelProject.id == project_id)
-            .values(updated_at=datetime.now(timezone.utc))
+            .values(updated_at=datetime.now(timezone.utc), revision=NovelProject.revision + 1)
         )
         await self.session.commit()
 
@@ -646,15 +755,24 @@ class NovelService:
 
     def _build_chapter_schema(
         self,
-        project: NovelProject,
+        project: Optional[NovelProject],
         chapter_number: int,
         *,
         outlines_map: Optional[Dict[int, ChapterOutline]] = None,
         chapters_map: Optional[Dict[int, Chapter]] = None,
         include_content: bool = True,
+        include_version_content: bool = False,
     ) -> ChapterSchema:
-        outlines = outlines_map or {outline.chapter_number: outline for outline in project.outlines}
-        chapters = chapters_map or {chapter.chapter_number: chapter for chapter in project.chapters}
+        outlines = (
+            outlines_map
+            if outlines_map is not None
+            else {outline.chapter_number: outline for outline in project.outlines}
+        )
+        chapters = (
+            chapters_map
+            if chapters_map is not None
+            else {chapter.chapter_number: chapter for chapter in project.chapters}
+        )
         outline = outlines.get(chapter_number)
         chapter = chapters.get(chapter_number)
 
@@ -666,6 +784,7 @@ class NovelService:
         real_summary = chapter.real_summary if chapter else None
         content = None
         versions: Optional[List[str]] = None
+        version_summaries: Optional[List[ChapterVersionMeta]] = None
         evaluation_text: Optional[str] = None
         status_value = ChapterGenerationStatus.NOT_GENERATED.value
         word_count = 0
@@ -679,10 +798,19 @@ class NovelService:
                 if chapter.selected_version:
                     content = chapter.selected_version.content
                 if chapter.versions:
-                    versions = [
-                        v.content
-                        for v in sorted(chapter.versions, key=lambda item: item.created_at)
+                    ordered_versions = sorted(chapter.versions, key=lambda item: item.created_at)
+                    version_summaries = [
+                        ChapterVersionMeta(
+                            id=v.id,
+                            label=v.version_label,
+                            length=v.content_length or 0,
+                            created_at=v.created_at,
+                        )
+                        for v in ordered_versions
                     ]
+                    # 候选版本正文只在单章节详情中返回，项目级序列化不读取
+                    if include_version_content:
+                        versions = [v.content for v in ordered_versions]
                 if chapter.evaluations:
                     latest = sorted(chapter.evaluations, key=lambda item: item.created_at)[-1]
                     evaluation_text = latest.feedback or latest.decision
@@ -694,6 +822,7 @@ class NovelService:
             real_summary=real_summary,
             content=content,
             versions=versions,
+            version_summaries=version_summaries,
             evaluation=evaluation_text,
             generation_status=ChapterGenerationStatus(status_value),
             word_count=word_count,
@@ -0,0 +1,180 @@
+"""
+每日请求配额：使用系统默认 API Key 的用户按“用户操作”计数，而不是按内部每次 LLM 调用计数。
+
+一次 HTTP 请求或一次后台任务构成一个操作，操作内首次调用模型时以条件更新原子预占一次额度，
+后续子调用（多版本并发、摘要、嵌入等）复用该预占；操作结束时若没有任何调用成功则退还额度。
+请求结束后仍在运行的协程（如客户端断开后继续落库的流式生成）通过 ``hold`` / ``release``
+延续同一操作，结算推迟到协程结束。不在操作范围内的调用退化为每次调用预占一次，失败时立即退还。
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import date
+from typing import AsyncIterator, Dict, Optional, Set
+
+from fastapi import HTTPException, status
+
+from ..core.config import settings
+from ..db.session import AsyncSessionLocal
+from ..repositories.user_repository import UserRepository
+from .admin_setting_service import AdminSettingService
+
+logger = logging.getLogger(__name__)
+
+DAILY_LIMIT_KEY = "daily_request_limit"
+DEFAULT_DAILY_LIMIT = "100"
+
+
+@dataclass
+class _QuotaAction:
+    """一次用户操作内的预占记录，子任务通过复制的上下文共享同一对象。"""
+
+    reserved: Dict[int, date] = field(default_factory=dict)
+    succeeded: Set[int] = field(default_factory=set)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # 操作本身与延续它的协程各算一个持有者，最后一个持有者退出时才结算
+    holders: int = 1
+
+
+class QuotaUsage:
+    """``consume`` 产出的句柄；上游未抛异常但实际失败（如返回空结果）时调用 ``mark_failed``，不计入配额。"""
+
+    __slots__ = ("failed",)
+
+    def __init__(self) -> None:
+        self.failed = False
+
+    def mark_failed(self) -> None:
+        self.failed = True
+
+
+_current_action: ContextVar[Optional[_QuotaAction]] = ContextVar("quota_action", default=None)
+
+
+class DailyQuota:
+    """每日配额的预占、退还与上限缓存。"""
+
+    def __init__(self) -> None:
+        self._limit: Optional[int] = None
+        self._loaded_at = 0.0
+
+    async def get_limit(self) -> int:
+        """读取每日上限，进程内按 ``system_config_cache_ttl`` 缓存。"""
+        if self._limit is not None and time.monotonic() - self._loaded_at < settings.system_config_cache_ttl:
+            return self._limit
+        async with AsyncSessionLocal() as session:
+            value = await AdminSettingService(session).get(DAILY_LIMIT_KEY, DEFAULT_DAILY_LIMIT)
+        self._limit = int(value or 10)
+        self._loaded_at = time.monotonic()
+        return self._limit
+
+    def invalidate_limit(self) -> None:
+        self._limit = None
+
+    @asynccontextmanager
+    async def action(self) -> AsyncIterator[None]:
+        """界定一次用户操作，范围内的所有模型调用只计一次额度。"""
+        action = _QuotaAction()
+        token = _current_action.set(action)
+        try:
+            yield
+        finally:
+            _current_action.reset(token)
+            await self._settle(action)
+
+    def hold(self) -> Optional[_QuotaAction]:
+        """在创建会脱离当前请求继续运行的协程前同步调用，当前操作要等对应的 ``release`` 后才结算。
+
+        协程复制了调用时的上下文，其中的模型调用仍复用本操作的预占。
+        """
+        action = _current_action.get()
+        if action is not None:
+            action.holders += 1
+        return action
+
+    async def release(self, action: Optional[_QuotaAction]) -> None:
+        """与 ``hold`` 成对调用，通常放在脱离请求运行的协程的 finally 中。"""
+        if action is not None:
+            await self._settle(action)
+
+    @asynccontextmanager
+    async def consume(self, user_id: Optional[int]) -> AsyncIterator[QuotaUsage]:
+        """包裹一次上游调用；``user_id`` 为空表示该调用不计配额（如使用自有 API Key）。"""
+        usage = QuotaUsage()
+        if not user_id:
+            yield usage
+            return
+
+        action = _current_action.get()
+        if action is not None:
+            async with action.lock:
+                if user_id not in action.reserved:
+                    action.reserved[user_id] = await self._reserve(user_id)
+            yield usage
+            if not usage.failed:
+                action.succeeded.add(user_id)
+            return
+
+        request_date = await self._reserve(user_id)
+        try:
+            yield usage
+        except BaseException:
+            await self._refund(user_id, request_date)
+            raise
+        if usage.failed:
+            await self._refund(user_id, request_date)
+
+    async def _settle(self, action: _QuotaAction) -> None:
+        action.holders -= 1
+        if action.holders > 0:
+            return
+        for user_id, request_date in action.reserved.items():
+            if user_id not in action.succeeded:
+                await self._refund(user_id, request_date)
+
+    async def _reserve(self, user_id: int) -> date:
+        limit = await self.get_limit()
+        request_date = date.today()
+        async with AsyncSessionLocal() as session:
+            reserved = await UserRepository(session).reserve_daily_request(user_id, request_date, limit)
+            await session.commit()
+        if not reserved:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="今日请求次数已达上限，请明日再试或设置自定义 API Key。",
+            )
+        return request_date
+
+    async def _refund(self, user_id: int, request_date: date) -> None:
+        try:
+            async with AsyncSessionLocal() as session:
+                await UserRepository(session).refund_daily_request(user_id, request_date)
+                await session.commit()
+        except Exception as exc:  # pragma: no cover - 退还失败只影响当日计数
+            logger.warning("退还每日请求额度失败: user_id=%s error=%s", user_id, exc)
+            return
+        logger.info("模型调用未成功，已退还每日请求额度: user_id=%s", user_id)
+
+
+daily_quota = DailyQuota()
+
+
+class QuotaActionMiddleware:
+    """ASGI 中间件：每个 HTTP 请求（含流式响应的整个生命周期）作为一次用户操作。"""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        async with daily_quota.action():
+            await self.app(scope, receive, send)
+
+
+__all__ = ["DailyQuota", "QuotaActionMiddleware", "QuotaUsage", "daily_quota"]
@@ -1,6 +1,100 @@
+"""
+用量计数服务：计数先在进程内缓冲，由后台协程定期批量写回数据库。
+
+每次写回对每个指标只执行一条原子累加语句，同时累加到按时间分桶的行，
+LLM 调用结束时不再各自开启事务争抢同一行计数器。
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..repositories.usage_metric_repository import UsageMetricRepository
+from ..core.config import settings
+from ..db.session import AsyncSessionLocal
+from ..repositories.usage_metric_repository import UsageMetricBucketRepository, UsageMetricRepository
+
+logger = logging.getLogger(__name__)
+
+
+def _bucket_start(timestamp: float) -> datetime:
+    """返回时间戳所在分桶的起始时间（UTC，不带时区，与数据库列一致）。"""
+    size = settings.usage_bucket_seconds
+    start = int(timestamp // size) * size
+    return datetime.fromtimestamp(start, timezone.utc).replace(tzinfo=None)
+
+
+class UsageCounterBuffer:
+    """进程内计数缓冲，按 (指标, 时间桶) 聚合，定期或关闭时写回数据库。"""
+
+    def __init__(self) -> None:
+        self._pending: Dict[Tuple[str, datetime], int] = defaultdict(int)
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def increment(self, key: str, amount: int = 1) -> None:
+        self._pending[(key, _bucket_start(time.time()))] += amount
+
+    def pending_buckets(self, key: str) -> Dict[datetime, int]:
+        """尚未写回数据库的分桶计数，读取时需要叠加。"""
+        return {
+            bucket_start: amount
+            for (pending_key, bucket_start), amount in self._pending.items()
+            if pending_key == key
+        }
+
+    async def flush(self) -> int:
+        """把缓冲区写回数据库，返回写回的计数总和；失败时计数放回缓冲区等待下次写回。"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, defaultdict(int)
+
+            totals: Dict[str, int] = defaultdict(int)
+            for (key, _), amount in pending.items():
+                totals[key] += amount
+            try:
+                async with AsyncSessionLocal() as session:
+                    metrics = UsageMetricRepository(session)
+                    buckets = UsageMetricBucketRepository(session)
+                    for key, amount in totals.items():
+                        await metrics.increment(key, amount)
+                    for (key, bucket_start), amount in pending.items():
+                        await buckets.increment(key, bucket_start, amount)
+                    await session.commit()
+            except Exception as exc:
+                for entry, amount in pending.items():
+                    self._pending[entry] += amount
+                logger.warning("用量计数写回失败，稍后重试: %s", exc)
+                return 0
+            return sum(totals.values())
+
+    async def start(self) -> None:
+        if self._task:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info("用量计数写回协程已启动: interval=%ss", settings.usage_flush_interval_seconds)
+
+    async def stop(self) -> None:
+        """停止定期写回，并把缓冲区中剩余的计数全部落库。"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        flushed = await self.flush()
+        logger.info("用量计数写回协程已停止: flushed=%s", flushed)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.usage_flush_interval_seconds)
+            await self.flush()
+
+
+usage_counters = UsageCounterBuffer()
 
 
 class UsageService:
@@ -9,13 +103,23 @@ class UsageService:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.repo = UsageMetricRepository(session)
+        self.bucket_repo = UsageMetricBucketRepository(session)
 
-    async def increment(self, key: str) -> None:
-        counter = await self.repo.get_or_create(key)
-        counter.value += 1
-        await self.session.commit()
+    async def increment(self, key: str, amount: int = 1) -> None:
+        """只写入进程内缓冲，由 ``usage_counters`` 定期批量落库。"""
+        usage_counters.increment(key, amount)
 
     async def get_value(self, key: str) -> int:
-        counter = await self.repo.get_or_create(key)
-        await self.session.commit()
-        return counter.value
+        pending = sum(usage_counters.pending_buckets(key).values())
+        return await self.repo.get_value(key) + pending
+
+    async def get_history(self, key: str, hours: int) -> List[Tuple[datetime, int]]:
+        """返回最近若干小时内的分桶计数（含尚未写回的部分），按时间升序。"""
+        since = _bucket_start(time.time() - hours * 3600)
+        history: Dict[datetime, int] = defaultdict(int)
+        for bucket in await self.bucket_repo.list_since(key, since):
+            history[bucket.bucket_start] += bucket.value
+        for bucket_start, amount in usage_counters.pending_buckets(key).items():
+            if bucket_start >= since:
+                history[bucket_start] += amount
+        return sorted(history.items())
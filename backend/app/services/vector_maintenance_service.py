@@ -0,0 +1,187 @@
+"""
+向量库维护任务：在后台转换已入库向量的存储编码，或按关系库中的章节内容重建向量。
+
+两类任务都按行幂等，中断或重试时只处理尚未完成的部分。
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from ..core.config import settings
+from ..db.session import AsyncSessionLocal
+from ..models import BackgroundJob, Chapter, ChapterOutline, ChapterVersion, NovelProject
+from .chapter_ingest_service import ChapterIngestionService
+from .llm_service import LLMService
+from .vector_store_service import VectorStoreService, get_vector_store
+
+logger = logging.getLogger(__name__)
+
+VECTOR_REENCODE_JOB = "vector_reencode"
+VECTOR_REINDEX_JOB = "vector_reindex"
+
+# 每完成多少章写回一次进度，避免频繁提交任务行
+_PROGRESS_FLUSH_INTERVAL = 10
+
+
+async def run_vector_reencode_job(session: AsyncSession, job: BackgroundJob) -> Dict[str, Any]:
+    """任务处理函数：把向量转换为当前配置的编码。"""
+    vector_store = get_vector_store()
+    if not vector_store:
+        return {"skipped": "未启用向量库"}
+
+    encoding = settings.vector_storage_encoding
+    converted = await vector_store.reencode_embeddings()
+    logger.info("向量重新编码完成: encoding=%s converted=%s", encoding, converted)
+    return {"encoding": encoding, "converted": converted}
+
+
+async def run_vector_reindex_job(session: AsyncSession, job: BackgroundJob) -> Dict[str, Any]:
+    """任务处理函数：以选定版本正文与 real_summary 为准，用当前嵌入模型重建项目向量。
+
+    未指定 project_id 时重建全部项目。进度实时写入 ``job.result``，任务重试时跳过已完成的项目；
+    存在失败章节（含嵌入生成失败）的项目不计入完成，记录在 ``failed_projects`` 中，
+    全部项目处理完后任务以失败结束并按重试策略重新执行。
+    项目内的章节入库本身按片段哈希与模型比对，已重建的章节不会重复调用嵌入接口。
+    """
+    vector_store = get_vector_store()
+    if not vector_store:
+        return {"skipped": "未启用向量库"}
+
+    stmt = select(NovelProject.id, NovelProject.user_id).order_by(NovelProject.id)
+    if job.project_id:
+        stmt = stmt.where(NovelProject.id == job.project_id)
+    projects = (await session.execute(stmt)).all()
+
+    progress: Dict[str, Any] = dict(job.result or {})
+    completed = set(progress.get("completed_projects") or [])
+    progress["total_projects"] = len(projects)
+    failed_projects: Dict[str, int] = dict(progress.get("failed_projects") or {})
+    concurrency = max(1, settings.vector_reindex_concurrency)
+
+    for project_id, user_id in projects:
+        if project_id in completed:
+            continue
+        chapter_numbers = (
+            await session.execute(
+                select(Chapter.chapter_number)
+                .where(Chapter.project_id == project_id, Chapter.selected_version_id.is_not(None))
+                .order_by(Chapter.chapter_number)
+            )
+        ).scalars().all()
+        progress.update(current_project=project_id, current_total=len(chapter_numbers), current_done=0)
+        await _save_progress(session, job, progress)
+
+        # 向量库中残留、但关系库已没有选定内容的章节直接清理
+        indexed = await vector_store.list_chapter_numbers(project_id)
+        orphaned = sorted(set(indexed or []) - set(chapter_numbers))
+        if orphaned:
+            await vector_store.delete_by_chapters(project_id, orphaned)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def reindex(chapter_number: int) -> bool:
+            async with semaphore:
+                return await _reindex_chapter(vector_store, project_id, chapter_number, user_id)
+
+        failed = 0
+        tasks = [reindex(chapter_number) for chapter_number in chapter_numbers]
+        for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+            if not await task:
+                failed += 1
+            progress["current_done"] = done
+            if done % _PROGRESS_FLUSH_INTERVAL == 0:
+                await _save_progress(session, job, progress)
+
+        if failed:
+            failed_projects[project_id] = failed
+        else:
+            failed_projects.pop(project_id, None)
+            completed.add(project_id)
+        progress.update(
+            completed_projects=sorted(completed),
+            failed_projects=failed_projects,
+            failed_chapters=sum(failed_projects.values()),
+        )
+        await _save_progress(session, job, progress)
+        if failed:
+            logger.warning(
+                "项目向量重建未完成: project=%s chapters=%d failed=%d removed=%d",
+                project_id,
+                len(chapter_numbers),
+                failed,
+                len(orphaned),
+            )
+            continue
+        logger.info(
+            "项目向量重建完成: project=%s chapters=%d removed=%d",
+            project_id,
+            len(chapter_numbers),
+            len(orphaned),
+        )
+
+    progress.pop("current_project", None)
+    if failed_projects:
+        # 以异常结束使任务按重试策略重新排队，进度已写入 job.result，重试时只处理未完成的项目
+        await _save_progress(session, job, progress)
+        raise RuntimeError(f"{len(failed_projects)} 个项目存在未能重建的章节（共 {progress['failed_chapters']} 章）")
+    return progress
+
+
+async def _reindex_chapter(
+    vector_store: VectorStoreService,
+    project_id: str,
+    chapter_number: int,
+    user_id: Optional[int],
+) -> bool:
+    """在独立会话中重建单章向量；入库异常或有向量未能更新时记录日志并返回 False，不中断整体任务。"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Chapter)
+            .where(Chapter.project_id == project_id, Chapter.chapter_number == chapter_number)
+            .options(selectinload(Chapter.selected_version).undefer(ChapterVersion.content))
+        )
+        chapter = result.scalars().first()
+        if not chapter or not chapter.selected_version or not chapter.selected_version.content:
+            return True
+        outline_result = await session.execute(
+            select(ChapterOutline.title).where(
+                ChapterOutline.project_id == project_id,
+                ChapterOutline.chapter_number == chapter_number,
+            )
+        )
+        title = outline_result.scalars().first() or f"第{chapter_number}章"
+        ingestion_service = ChapterIngestionService(llm_service=LLMService(session), vector_store=vector_store)
+        try:
+            ingest_result = await ingestion_service.ingest_chapter(
+                project_id=project_id,
+                chapter_number=chapter_number,
+                title=title,
+                content=chapter.selected_version.content,
+                summary=chapter.real_summary,
+                user_id=user_id,
+            )
+        except Exception as exc:
+            logger.warning("重建章节向量失败: project=%s chapter=%s error=%s", project_id, chapter_number, exc)
+            return False
+    if not ingest_result.ok:
+        logger.warning("重建章节向量未完成: project=%s chapter=%s result=%s", project_id, chapter_number, ingest_result)
+    return ingest_result.ok
+
+
+async def _save_progress(session: AsyncSession, job: BackgroundJob, progress: Dict[str, Any]) -> None:
+    # JSON 列需整体赋值才能被识别为变更
+    job.result = dict(progress)
+    await session.commit()
+
+
+__all__ = [
+    "VECTOR_REENCODE_JOB",
+    "VECTOR_REINDEX_JOB",
+    "run_vector_reencode_job",
+    "run_vector_reindex_job",
+]
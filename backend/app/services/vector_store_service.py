@@ -6,13 +6,20 @@ from __future__ import annotations
 本文件中的注释均使用中文，便于团队成员快速理解 RAG 相关逻辑。
 """
 
+import asyncio
+import heapq
+import itertools
 import json
 import logging
 import math
+import struct
+import sys
+import time
 from array import array
-from dataclasses import dataclass
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Sequence
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from ..core.config import settings
 
@@ -21,6 +28,11 @@ try:  # noqa: SIM105 - 明确区分依赖缺失的情况
 except ImportError:  # pragma: no cover - 在未安装依赖时提供友好提示
     libsql_client = None  # type: ignore[assignment]
 
+try:  # noqa: SIM105 - NumPy 用于应用层相似度计算与热点矩阵缓存，缺失时退回纯 Python 计算
+    import numpy as np
+except ImportError:  # pragma: no cover - 未安装时走纯 Python 路径
+    np = None  # type: ignore[assignment]
+
 logger = logging.getLogger(__name__)
 
 
@@ -45,10 +57,424 @@ class RetrievedSummary:
     score: float
 
 
+@dataclass
+class VectorWriteResult:
+    """批量写入结果，记录成功条数与失败的记录 ID，便于调用方感知部分失败。"""
+
+    written: int = 0
+    failed_ids: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed_ids
+
+
+_CHUNK_UPSERT_SQL = """
+INSERT INTO rag_chunks (
+    id,
+    project_id,
+    chapter_number,
+    chunk_index,
+    chapter_title,
+    content,
+    embedding,
+    embedding_encoding,
+    embedding_model,
+    embedding_dim,
+    metadata
+) VALUES (
+    :id,
+    :project_id,
+    :chapter_number,
+    :chunk_index,
+    :chapter_title,
+    :content,
+    :embedding,
+    :embedding_encoding,
+    :embedding_model,
+    :embedding_dim,
+    :metadata
+)
+ON CONFLICT(id) DO UPDATE SET
+    chunk_index=excluded.chunk_index,
+    content=excluded.content,
+    embedding=excluded.embedding,
+    embedding_encoding=excluded.embedding_encoding,
+    embedding_model=excluded.embedding_model,
+    embedding_dim=excluded.embedding_dim,
+    metadata=excluded.metadata,
+    chapter_title=excluded.chapter_title
+"""
+
+_SUMMARY_UPSERT_SQL = """
+INSERT INTO rag_summaries (
+    id,
+    project_id,
+    chapter_number,
+    title,
+    summary,
+    embedding,
+    embedding_encoding,
+    embedding_model,
+    embedding_dim
+) VALUES (
+    :id,
+    :project_id,
+    :chapter_number,
+    :title,
+    :summary,
+    :embedding,
+    :embedding_encoding,
+    :embedding_model,
+    :embedding_dim
+)
+ON CONFLICT(id) DO UPDATE SET
+    summary=excluded.summary,
+    embedding=excluded.embedding,
+    embedding_encoding=excluded.embedding_encoding,
+    embedding_model=excluded.embedding_model,
+    embedding_dim=excluded.embedding_dim,
+    title=excluded.title
+"""
+
+_EMBEDDING_CACHE_INSERT_SQL = """
+INSERT INTO rag_embedding_cache (
+    id,
+    provider,
+    model,
+    dimensions,
+    text_hash,
+    embedding
+) VALUES (
+    :id,
+    :provider,
+    :model,
+    :dimensions,
+    :text_hash,
+    :embedding
+)
+ON CONFLICT(id) DO NOTHING
+"""
+
+_CHUNK_REINDEX_SQL = """
+UPDATE rag_chunks
+SET chunk_index = :chunk_index,
+    chapter_title = :chapter_title
+WHERE id = :id
+"""
+
+# 建表语句以模板形式保存，供首次建表与 F32_BLOB 迁移时重建表共用
+_CHUNK_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    chapter_number INTEGER NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    chapter_title TEXT,
+    content TEXT NOT NULL,
+    embedding {embedding_type} NOT NULL,
+    embedding_encoding TEXT NOT NULL DEFAULT 'float32',
+    embedding_model TEXT NOT NULL DEFAULT '',
+    embedding_dim INTEGER NOT NULL DEFAULT 0,
+    metadata TEXT,
+    created_at INTEGER DEFAULT (unixepoch())
+)
+"""
+
+_SUMMARY_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    chapter_number INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    embedding {embedding_type} NOT NULL,
+    embedding_encoding TEXT NOT NULL DEFAULT 'float32',
+    embedding_model TEXT NOT NULL DEFAULT '',
+    embedding_dim INTEGER NOT NULL DEFAULT 0,
+    created_at INTEGER DEFAULT (unixepoch())
+)
+"""
+
+_CHUNK_PROJECT_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_rag_chunks_project
+ON rag_chunks(project_id, chapter_number)
+"""
+
+_SUMMARY_PROJECT_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS idx_rag_summaries_project
+ON rag_summaries(project_id, chapter_number)
+"""
+
+# (表名, 建表模板, 全部列, 项目索引, 向量索引名)
+_ANN_TABLES = (
+    (
+        "rag_chunks",
+        _CHUNK_TABLE_DDL,
+        "id, project_id, chapter_number, chunk_index, chapter_title, content, embedding, embedding_encoding, "
+        "embedding_model, embedding_dim, metadata, created_at",
+        _CHUNK_PROJECT_INDEX_DDL,
+        "idx_rag_chunks_embedding",
+    ),
+    (
+        "rag_summaries",
+        _SUMMARY_TABLE_DDL,
+        "id, project_id, chapter_number, title, summary, embedding, embedding_encoding, "
+        "embedding_model, embedding_dim, created_at",
+        _SUMMARY_PROJECT_INDEX_DDL,
+        "idx_rag_summaries_embedding",
+    ),
+)
+
+# vector_top_k 在全表索引上召回候选，再按项目过滤并用精确距离重排
+_CHUNK_ANN_SQL = """
+SELECT
+    c.id,
+    c.content,
+    c.chapter_number,
+    c.chapter_title,
+    COALESCE(c.metadata, '{}') AS metadata,
+    vector_distance_cos(c.embedding, :query) AS distance
+FROM vector_top_k('idx_rag_chunks_embedding', :query, :candidates) AS v
+JOIN rag_chunks AS c ON c.rowid = v.id
+WHERE c.project_id = :project_id
+  AND c.embedding_dim = :dim
+  AND (:model IS NULL OR c.embedding_model = :model OR c.embedding_model = '')
+ORDER BY distance ASC
+LIMIT :limit
+"""
+
+_SUMMARY_ANN_SQL = """
+SELECT
+    s.id,
+    s.chapter_number,
+    s.title,
+    s.summary,
+    vector_distance_cos(s.embedding, :query) AS distance
+FROM vector_top_k('idx_rag_summaries_embedding', :query, :candidates) AS v
+JOIN rag_summaries AS s ON s.rowid = v.id
+WHERE s.project_id = :project_id
+  AND s.embedding_dim = :dim
+  AND (:model IS NULL OR s.embedding_model = :model OR s.embedding_model = '')
+ORDER BY distance ASC
+LIMIT :limit
+"""
+
+# 单条 IN 查询携带的参数上限，避免超过 SQLite 的变量数量限制
+_CACHE_LOOKUP_CHUNK = 256
+
+# 检索只比较同一模型、同一维度生成的向量；未标记模型的旧数据按维度匹配，直至被重建
+_MODEL_FILTER = "embedding_dim = :dim AND (:model IS NULL OR embedding_model = :model OR embedding_model = '')"
+
+# 应用层扫描按 id 做键集分页，供相似度回退与热点矩阵缓存加载共用
+_CHUNK_SCAN_SQL = """
+SELECT
+    id,
+    content,
+    chapter_number,
+    chapter_title,
+    COALESCE(metadata, '{}') AS metadata,
+    embedding,
+    embedding_encoding
+FROM rag_chunks
+WHERE project_id = :project_id AND id > :after AND {model_filter}
+ORDER BY id
+LIMIT :limit
+""".replace("{model_filter}", _MODEL_FILTER)
+
+_SUMMARY_SCAN_SQL = """
+SELECT
+    id,
+    chapter_number,
+    title,
+    summary,
+    embedding,
+    embedding_encoding
+FROM rag_summaries
+WHERE project_id = :project_id AND id > :after AND {model_filter}
+ORDER BY id
+LIMIT :limit
+""".replace("{model_filter}", _MODEL_FILTER)
+
+_VECTOR_TABLES = ("rag_chunks", "rag_summaries")
+
+# 加载矩阵前估算项目体积：向量按 float32 计，文本按字符数计
+_MATRIX_SIZE_SQL = {
+    table: f"""
+SELECT COUNT(*) AS total, COALESCE(SUM(length({text_column})), 0) AS text_size
+FROM {table}
+WHERE project_id = :project_id AND {_MODEL_FILTER}
+"""
+    for table, text_column in (("rag_chunks", "content"), ("rag_summaries", "summary"))
+}
+
+# 旧版本向量表缺少的列：(列名, 定义, 回填语句)；未标记模型的旧向量按编码推算维度
+_ADDED_VECTOR_COLUMNS = (
+    ("embedding_encoding", "TEXT NOT NULL DEFAULT 'float32'", None),
+    ("embedding_model", "TEXT NOT NULL DEFAULT ''", None),
+    (
+        "embedding_dim",
+        "INTEGER NOT NULL DEFAULT 0",
+        """
+        UPDATE {table}
+        SET embedding_dim = CASE embedding_encoding
+            WHEN 'float16' THEN length(embedding) / 2
+            WHEN 'int8' THEN length(embedding) - 4
+            ELSE length(embedding) / 4
+        END
+        """,
+    ),
+)
+
+@dataclass
+class _MatrixEntry:
+    """单个项目某张向量表的内存快照：行已归一化的 float32 矩阵与对应行数据。"""
+
+    matrix: Any
+    rows: List[Dict[str, Any]]
+    nbytes: int
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+class _ProjectMatrixCache:
+    """按 (表, 项目, 模型, 维度) 缓存向量矩阵，在内存预算内做 LRU 淘汰。
+
+    每个 (表, 项目) 维护一个写入代数，加载期间若发生写入则丢弃加载结果，避免把旧数据放回缓存。
+    超出预算的项目记录为不可缓存，直到该项目再次写入或有效期过去，期间检索直接交给数据库。
+    缓存只在当前进程内有效，多进程部署时依赖有效期感知其他进程的写入。
+    """
+
+    def __init__(self, budget_bytes: int, ttl: float) -> None:
+        self._budget = budget_bytes
+        self._ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str, Optional[str], int], _MatrixEntry]" = OrderedDict()
+        self._generations: Dict[Tuple[str, str], int] = {}
+        # 不可缓存的项目：键 -> (记录时的写入代数, 记录时间)
+        self._oversized: Dict[Tuple[str, str, Optional[str], int], Tuple[int, float]] = {}
+        self._total_bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return np is not None and self._budget > 0
+
+    def get(self, table: str, project_id: str, model: Optional[str], dim: int) -> Optional[_MatrixEntry]:
+        key = (table, project_id, model, dim)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._ttl > 0 and time.monotonic() - entry.loaded_at > self._ttl:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def generation(self, table: str, project_id: str) -> int:
+        return self._generations.get((table, project_id), 0)
+
+    def fits(self, nbytes: int) -> bool:
+        return nbytes <= self._budget
+
+    def is_oversized(self, table: str, project_id: str, model: Optional[str], dim: int) -> bool:
+        key = (table, project_id, model, dim)
+        marked = self._oversized.get(key)
+        if marked is None:
+            return False
+        generation, marked_at = marked
+        if generation != self.generation(table, project_id) or (
+            self._ttl > 0 and time.monotonic() - marked_at > self._ttl
+        ):
+            del self._oversized[key]
+            return False
+        return True
+
+    def mark_oversized(self, table: str, project_id: str, model: Optional[str], dim: int) -> None:
+        self._oversized[(table, project_id, model, dim)] = (self.generation(table, project_id), time.monotonic())
+
+    def put(
+        self,
+        table: str,
+        project_id: str,
+        model: Optional[str],
+        dim: int,
+        entry: _MatrixEntry,
+        generation: int,
+    ) -> bool:
+        """放入缓存，返回是否成功；超出预算时记录为不可缓存。"""
+        key = (table, project_id, model, dim)
+        if generation != self.generation(table, project_id):
+            return False
+        if not self.fits(entry.nbytes):
+            self.mark_oversized(table, project_id, model, dim)
+            return False
+        self._drop(key)
+        self._entries[key] = entry
+        self._total_bytes += entry.nbytes
+        while self._total_bytes > self._budget:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted.nbytes
+        return True
+
+    def invalidate(self, project_id: str, tables: Sequence[str] = _VECTOR_TABLES) -> None:
+        for table in tables:
+            key = (table, project_id)
+            self._generations[key] = self._generations.get(key, 0) + 1
+        for key in [key for key in self._entries if key[0] in tables and key[1] == project_id]:
+            self._drop(key)
+        for key in [key for key in self._oversized if key[0] in tables and key[1] == project_id]:
+            del self._oversized[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._oversized.clear()
+        self._total_bytes = 0
+
+    def _drop(self, key: Tuple[str, str, Optional[str], int]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry.nbytes
+
+
+class _LibsqlClientPool:
+    """进程级 libsql 客户端池，按轮询方式分发请求，复用底层连接。"""
+
+    def __init__(self, clients: Sequence[Any]) -> None:
+        self._clients = list(clients)
+        self._cursor = itertools.cycle(range(len(self._clients)))
+
+    def acquire(self) -> Any:
+        """取出下一个客户端；单个客户端本身支持并发请求，无需归还。"""
+        return self._clients[next(self._cursor)]
+
+    async def execute(self, *args: Any, **kwargs: Any) -> Any:
+        return await self.acquire().execute(*args, **kwargs)
+
+    async def batch(self, *args: Any, **kwargs: Any) -> Any:
+        return await self.acquire().batch(*args, **kwargs)
+
+    async def close(self) -> None:
+        for client in self._clients:
+            try:
+                await client.close()
+            except Exception as exc:  # pragma: no cover - 关闭失败不影响退出
+                logger.warning("关闭 libsql 客户端失败: %s", exc)
+        self._clients = []
+
+
 class VectorStoreService:
-    """libsql 向量库操作工具，确保不同小说项目的数据隔离。"""
+    """libsql 向量库操作工具，确保不同小说项目的数据隔离。
+
+    该服务在进程内只保留一个实例（见 ``get_vector_store``），由 ``main.lifespan``
+    负责启动时建表与退出时关闭连接，请勿在请求中直接实例化。
+    """
 
     def __init__(self) -> None:
+        self._schema_lock = asyncio.Lock()
+        self._ann_ready = False
+        self._matrix_cache = _ProjectMatrixCache(
+            settings.vector_matrix_cache_mb * 1024 * 1024,
+            settings.vector_matrix_cache_ttl,
+        )
         if not settings.vector_store_enabled:
             logger.warning("未开启向量库配置，RAG 检索将被跳过。")
             self._client = None
@@ -59,18 +485,26 @@ class VectorStoreService:
             raise RuntimeError("缺少 libsql-client 依赖，请先在环境中安装。")
 
         url = settings.vector_db_url
+        pool_size = settings.vector_db_pool_size
         if url and url.startswith("file:"):
             path_part = url.split("file:", 1)[1]
             resolved = Path(path_part).expanduser().resolve()
             resolved.parent.mkdir(parents=True, exist_ok=True)
             url = f"file:{resolved}"
+            # 本地文件库多连接只会加剧写锁竞争，固定使用单连接
+            pool_size = 1
             logger.info("向量库使用本地文件: %s", resolved)
 
         try:
-            logger.info("初始化 libsql 客户端: url=%s", url)
-            self._client = libsql_client.create_client(
-                url=url,
-                auth_token=settings.vector_db_auth_token,
+            logger.info("初始化 libsql 客户端池: url=%s size=%d", url, pool_size)
+            self._client = _LibsqlClientPool(
+                [
+                    libsql_client.create_client(
+                        url=url,
+                        auth_token=settings.vector_db_auth_token,
+                    )
+                    for _ in range(pool_size)
+                ]
             )
         except Exception as exc:  # pragma: no cover - 连接异常仅打印日志
             logger.error("初始化 libsql 客户端失败: %s", exc)
@@ -80,54 +514,190 @@ class VectorStoreService:
             self._schema_ready = False
             logger.info("libsql 客户端初始化成功，等待建表。")
 
+    async def close(self) -> None:
+        """关闭连接池，供应用退出时调用。"""
+        self._matrix_cache.clear()
+        if self._client:
+            await self._client.close()
+            self._client = None
+            logger.info("libsql 客户端池已关闭。")
+
     async def ensure_schema(self) -> None:
         """初始化向量表结构，保证系统首次运行即可使用。"""
         if not self._client or self._schema_ready:
             return
 
+        async with self._schema_lock:
+            if self._schema_ready:
+                return
+            await self._create_schema()
+
+    async def _create_schema(self) -> None:
+        # 已知维度时新库直接使用带类型的向量列，否则先用 BLOB，待有数据后再迁移
+        dimension = settings.embedding_model_vector_size if self._ann_applicable() else None
+        embedding_type = f"F32_BLOB({dimension})" if dimension else "BLOB"
         statements = [
+            _CHUNK_TABLE_DDL.format(table="rag_chunks", embedding_type=embedding_type),
+            _CHUNK_PROJECT_INDEX_DDL,
+            _SUMMARY_TABLE_DDL.format(table="rag_summaries", embedding_type=embedding_type),
+            _SUMMARY_PROJECT_INDEX_DDL,
             """
-            CREATE TABLE IF NOT EXISTS rag_chunks (
+            CREATE TABLE IF NOT EXISTS rag_embedding_cache (
                 id TEXT PRIMARY KEY,
-                project_id TEXT NOT NULL,
-                chapter_number INTEGER NOT NULL,
-                chunk_index INTEGER NOT NULL,
-                chapter_title TEXT,
-                content TEXT NOT NULL,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
                 embedding BLOB NOT NULL,
-                metadata TEXT,
                 created_at INTEGER DEFAULT (unixepoch())
             )
             """,
-            """
-            CREATE INDEX IF NOT EXISTS idx_rag_chunks_project
-            ON rag_chunks(project_id, chapter_number)
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS rag_summaries (
-                id TEXT PRIMARY KEY,
-                project_id TEXT NOT NULL,
-                chapter_number INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                summary TEXT NOT NULL,
-                embedding BLOB NOT NULL,
-                created_at INTEGER DEFAULT (unixepoch())
-            )
-            """,
-            """
-            CREATE INDEX IF NOT EXISTS idx_rag_summaries_project
-            ON rag_summaries(project_id, chapter_number)
-            """,
         ]
 
         try:
             for sql in statements:
                 await self._client.execute(sql)  # type: ignore[union-attr]
+            await self._ensure_added_columns()
             logger.info("已确保向量库表结构存在。")
         except Exception as exc:  # pragma: no cover - 初始化失败时记录日志
             logger.error("创建向量库表结构失败: %s", exc)
-        else:
-            self._schema_ready = True
+            return
+
+        self._schema_ready = True
+        if settings.vector_ann_enabled:
+            await self._prepare_ann_index()
+
+    async def _ensure_added_columns(self) -> None:
+        """为旧版本创建的向量表补齐后续新增的列，并按需回填既有数据。"""
+        for table in _VECTOR_TABLES:
+            result = await self._client.execute(f"PRAGMA table_info({table})")  # type: ignore[union-attr]
+            existing = {row.get("name") for row in self._iter_rows(result)}
+            for column, definition, backfill in _ADDED_VECTOR_COLUMNS:
+                if column in existing:
+                    continue
+                await self._client.execute(  # type: ignore[union-attr]
+                    f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+                )
+                if backfill:
+                    await self._client.execute(backfill.format(table=table))  # type: ignore[union-attr]
+                logger.info("已为 %s 补充 %s 列", table, column)
+
+    @staticmethod
+    def _ann_applicable() -> bool:
+        """原生向量索引只能读取 float32 向量，压缩编码时由应用层扫描。"""
+        return settings.vector_ann_enabled and settings.vector_storage_encoding == "float32"
+
+    async def _prepare_ann_index(self) -> None:
+        """把向量列迁移为 F32_BLOB(维度) 并创建 libsql_vector_idx 索引；不支持时保持精确扫描。"""
+        try:
+            await self._client.execute("SELECT vector32('[0]')")  # type: ignore[union-attr]
+        except Exception:
+            logger.info("向量库不支持原生向量索引，检索使用精确扫描。")
+            return
+
+        if not self._ann_applicable():
+            # 已有索引会拒绝非 float32 的向量写入，切换编码后需要移除
+            for _, _, _, _, vector_index in _ANN_TABLES:
+                await self._client.execute(f"DROP INDEX IF EXISTS {vector_index}")  # type: ignore[union-attr]
+            logger.info("向量以 %s 编码存储，不使用原生向量索引。", settings.vector_storage_encoding)
+            return
+
+        dimension = settings.embedding_model_vector_size or await self._detect_dimension()
+        if not dimension:
+            logger.info("未配置嵌入维度且无法从已入库向量推断维度，暂不创建向量索引。")
+            return
+
+        try:
+            # 迁移不删除数据：存在维度或编码不符的旧向量时保持原表结构，检索走精确扫描
+            mismatched = {
+                table: await self._count_mismatched_embeddings(table, dimension)
+                for table, _, _, _, _ in _ANN_TABLES
+            }
+            if any(mismatched.values()):
+                logger.warning(
+                    "存在与目标维度 %d 或 float32 编码不符的向量 %s，暂不创建向量索引，检索使用精确扫描；"
+                    "请确认 EMBEDDING_MODEL_VECTOR_SIZE 配置，并通过向量重建或重新编码任务处理旧数据后重启。",
+                    dimension,
+                    mismatched,
+                )
+                return
+            for table, ddl, columns, project_index, vector_index in _ANN_TABLES:
+                await self._migrate_embedding_column(table, ddl, columns, project_index, dimension)
+                await self._client.execute(  # type: ignore[union-attr]
+                    f"CREATE INDEX IF NOT EXISTS {vector_index} "
+                    f"ON {table}(libsql_vector_idx(embedding, 'metric=cosine'))"
+                )
+        except Exception as exc:  # pragma: no cover - 迁移或建索引失败时退回精确扫描
+            logger.error("创建向量索引失败，检索使用精确扫描: %s", exc)
+            return
+
+        self._ann_ready = True
+        logger.info("向量索引已就绪: dimension=%d", dimension)
+
+    async def _detect_dimension(self) -> Optional[int]:
+        """从已入库的片段推断向量维度，存在多种维度时返回 None。"""
+        result = await self._client.execute(  # type: ignore[union-attr]
+            "SELECT DISTINCT length(embedding) AS size FROM rag_chunks LIMIT 2"
+        )
+        sizes = [row.get("size") for row in self._iter_rows(result)]
+        if len(sizes) != 1 or not sizes[0]:
+            return None
+        return sizes[0] // 4
+
+    async def _migrate_embedding_column(
+        self,
+        table: str,
+        ddl: str,
+        columns: str,
+        project_index: str,
+        dimension: int,
+    ) -> None:
+        """SQLite 无法修改列类型，通过建新表、复制、替换的方式在一个事务内完成迁移。
+
+        调用前需确认所有向量均与目标维度一致且为 float32 编码，迁移过程按原样复制全部行。
+        """
+        result = await self._client.execute(f"PRAGMA table_info({table})")  # type: ignore[union-attr]
+        declared = next(
+            (str(row.get("type") or "") for row in self._iter_rows(result) if row.get("name") == "embedding"),
+            "",
+        )
+        target = f"F32_BLOB({dimension})"
+        if declared.replace(" ", "").upper() == target:
+            return
+
+        staging = f"{table}_migrating"
+        await self._client.batch(  # type: ignore[union-attr]
+            [
+                (f"DROP TABLE IF EXISTS {staging}", {}),
+                (ddl.format(table=staging, embedding_type=target), {}),
+                (f"INSERT INTO {staging} ({columns}) SELECT {columns} FROM {table}", {}),
+                (f"DROP TABLE {table}", {}),
+                (f"ALTER TABLE {staging} RENAME TO {table}", {}),
+                (project_index, {}),
+            ]
+        )
+        logger.info("已迁移 %s 向量列为 %s", table, target)
+
+    async def _is_float32_only(self, table: str, project_id: str) -> bool:
+        """项目向量是否全部为 float32，只有此时才能交给 vector_distance_cosine 计算。"""
+        if settings.vector_storage_encoding != "float32":
+            return False
+        result = await self._client.execute(  # type: ignore[union-attr]
+            f"SELECT 1 AS found FROM {table} "
+            "WHERE project_id = :project_id AND embedding_encoding != 'float32' LIMIT 1",
+            {"project_id": project_id},
+        )
+        return not self._iter_rows(result)
+
+    async def _count_mismatched_embeddings(self, table: str, dimension: int) -> int:
+        """统计无法写入 ``F32_BLOB(dimension)`` 列的向量数量。"""
+        result = await self._client.execute(  # type: ignore[union-attr]
+            f"SELECT COUNT(*) AS total FROM {table} "
+            "WHERE length(embedding) != :size OR embedding_encoding != 'float32'",
+            {"size": dimension * 4},
+        )
+        rows = self._iter_rows(result)
+        return int(rows[0].get("total") or 0) if rows else 0
 
     async def query_chunks(
         self,
@@ -135,8 +705,12 @@ class VectorStoreService:
         project_id: str,
         embedding: Sequence[float],
         top_k: Optional[int] = None,
+        model: Optional[str] = None,
     ) -> List[RetrievedChunk]:
-        """根据查询向量检索剧情片段，结果已按相似度排序。"""
+        """根据查询向量检索剧情片段，结果已按相似度排序。
+
+        ``model`` 为生成查询向量的模型标识，传入时只比较该模型写入的向量。
+        """
         if not self._client or not embedding:
             return []
 
@@ -145,16 +719,40 @@ class VectorStoreService:
         if top_k <= 0:
             return []
 
+        filters = {"model": model, "dim": len(embedding)}
+        cached = await self._query_matrix_cache(
+            "rag_chunks",
+            project_id=project_id,
+            embedding=embedding,
+            top_k=top_k,
+            filters=filters,
+        )
+        if cached is not None:
+            return [self._chunk_from_row(row, distance) for distance, row in cached]
+
         blob = self._to_f32_blob(embedding)
-        sql = """
+        ann_rows = await self._query_ann(_CHUNK_ANN_SQL, project_id=project_id, blob=blob, top_k=top_k, filters=filters)
+        if ann_rows is not None:
+            return [self._chunk_from_row(row, row.get("distance", 0.0)) for row in ann_rows]
+
+        if not await self._is_float32_only("rag_chunks", project_id):
+            # 压缩编码（含切换编码后尚未转换的旧行）无法交给数据库函数计算，直接在应用层扫描
+            return await self._query_chunks_with_python_similarity(
+                project_id=project_id,
+                embedding=embedding,
+                top_k=top_k,
+                filters=filters,
+            )
+
+        sql = f"""
         SELECT
             content,
             chapter_number,
             chapter_title,
-            COALESCE(metadata, '{}') AS metadata,
+            COALESCE(metadata, '{{}}') AS metadata,
             vector_distance_cosine(embedding, :query) AS distance
         FROM rag_chunks
-        WHERE project_id = :project_id
+        WHERE project_id = :project_id AND {_MODEL_FILTER}
         ORDER BY distance ASC
         LIMIT :limit
         """
@@ -165,6 +763,7 @@ class VectorStoreService:
                     "project_id": project_id,
                     "query": blob,
                     "limit": top_k,
+                    **filters,
                 },
             )
         except Exception as exc:  # pragma: no cover - 查询异常时仅记录
@@ -174,22 +773,12 @@ class VectorStoreService:
                     project_id=project_id,
                     embedding=embedding,
                     top_k=top_k,
+                    filters=filters,
                 )
             logger.warning("向量检索剧情片段失败: %s", exc)
             return []
 
-        items: List[RetrievedChunk] = []
-        for row in self._iter_rows(result):
-            items.append(
-                RetrievedChunk(
-                    content=row.get("content", ""),
-                    chapter_number=row.get("chapter_number", 0),
-                    chapter_title=row.get("chapter_title"),
-                    score=row.get("distance", 0.0),
-                    metadata=self._parse_metadata(row.get("metadata")),
-                )
-            )
-        return items
+        return [self._chunk_from_row(row, row.get("distance", 0.0)) for row in self._iter_rows(result)]
 
     async def query_summaries(
         self,
@@ -197,8 +786,9 @@ class VectorStoreService:
         project_id: str,
         embedding: Sequence[float],
         top_k: Optional[int] = None,
+        model: Optional[str] = None,
     ) -> List[RetrievedSummary]:
-        """根据查询向量检索章节摘要列表。"""
+        """根据查询向量检索章节摘要列表，``model`` 含义同 query_chunks。"""
         if not self._client or not embedding:
             return []
 
@@ -207,15 +797,39 @@ class VectorStoreService:
         if top_k <= 0:
             return []
 
+        filters = {"model": model, "dim": len(embedding)}
+        cached = await self._query_matrix_cache(
+            "rag_summaries",
+            project_id=project_id,
+            embedding=embedding,
+            top_k=top_k,
+            filters=filters,
+        )
+        if cached is not None:
+            return [self._summary_from_row(row, distance) for distance, row in cached]
+
         blob = self._to_f32_blob(embedding)
-        sql = """
+        ann_rows = await self._query_ann(_SUMMARY_ANN_SQL, project_id=project_id, blob=blob, top_k=top_k, filters=filters)
+        if ann_rows is not None:
+            return [self._summary_from_row(row, row.get("distance", 0.0)) for row in ann_rows]
+
+        if not await self._is_float32_only("rag_summaries", project_id):
+            # 压缩编码（含切换编码后尚未转换的旧行）无法交给数据库函数计算，直接在应用层扫描
+            return await self._query_summaries_with_python_similarity(
+                project_id=project_id,
+                embedding=embedding,
+                top_k=top_k,
+                filters=filters,
+            )
+
+        sql = f"""
         SELECT
             chapter_number,
             title,
             summary,
             vector_distance_cosine(embedding, :query) AS distance
         FROM rag_summaries
-        WHERE project_id = :project_id
+        WHERE project_id = :project_id AND {_MODEL_FILTER}
         ORDER BY distance ASC
         LIMIT :limit
         """
@@ -226,6 +840,7 @@ class VectorStoreService:
                     "project_id": project_id,
                     "query": blob,
                     "limit": top_k,
+                    **filters,
                 },
             )
         except Exception as exc:  # pragma: no cover - 查询异常时仅记录
@@ -235,148 +850,424 @@ class VectorStoreService:
                     project_id=project_id,
                     embedding=embedding,
                     top_k=top_k,
+                    filters=filters,
                 )
             logger.warning("向量检索章节摘要失败: %s", exc)
             return []
 
-        items: List[RetrievedSummary] = []
-        for row in self._iter_rows(result):
-            items.append(
-                RetrievedSummary(
-                    chapter_number=row.get("chapter_number", 0),
-                    title=row.get("title", ""),
-                    summary=row.get("summary", ""),
-                    score=row.get("distance", 0.0),
-                )
-            )
-        return items
+        return [self._summary_from_row(row, row.get("distance", 0.0)) for row in self._iter_rows(result)]
 
     async def upsert_chunks(
         self,
         *,
         records: Iterable[Dict[str, Any]],
-    ) -> None:
-        """批量写入章节片段，供后续检索使用。"""
+    ) -> VectorWriteResult:
+        """批量写入章节片段，按批次提交，单批失败不影响其他批次。"""
+        statements = self._chunk_statements(records)
+        if not self._client or not statements:
+            return VectorWriteResult()
+
+        await self.ensure_schema()
+        try:
+            return await self._execute_in_batches(statements, table="rag_chunks")
+        finally:
+            self._invalidate_statements(statements, ("rag_chunks",))
+
+    async def upsert_summaries(
+        self,
+        *,
+        records: Iterable[Dict[str, Any]],
+    ) -> VectorWriteResult:
+        """同步章节摘要向量，供摘要层检索使用。"""
+        statements = self._summary_statements(records)
+        if not self._client or not statements:
+            return VectorWriteResult()
+
+        await self.ensure_schema()
+        try:
+            return await self._execute_in_batches(statements, table="rag_summaries")
+        finally:
+            self._invalidate_statements(statements, ("rag_summaries",))
+
+    async def replace_chapter(
+        self,
+        *,
+        project_id: str,
+        chapter_number: int,
+        chunk_records: Iterable[Dict[str, Any]],
+        summary_records: Iterable[Dict[str, Any]] = (),
+    ) -> VectorWriteResult:
+        """在同一个事务中删除旧向量并写入新向量，保证章节重建的原子性。
+
+        单章片段数量有限，因此整体作为一个 batch 提交，不受批大小限制。
+        """
         if not self._client:
-            return
+            return VectorWriteResult()
 
         await self.ensure_schema()
-        sql = """
-        INSERT INTO rag_chunks (
-            id,
+        chunk_statements = self._chunk_statements(chunk_records)
+        summary_statements = self._summary_statements(summary_records)
+        statements = [
+            *self._delete_statements(project_id, [chapter_number]),
+            *chunk_statements,
+            *summary_statements,
+        ]
+        record_ids = [params["id"] for _, params in (*chunk_statements, *summary_statements)]
+        try:
+            await self._client.batch(statements)  # type: ignore[union-attr]
+        except Exception as exc:  # pragma: no cover - 事务失败时整体回滚
+            self._matrix_cache.invalidate(project_id)
+            logger.error(
+                "重建章节向量失败，已整体回滚: project=%s chapter=%s error=%s",
+                project_id,
+                chapter_number,
+                exc,
+            )
+            return VectorWriteResult(failed_ids=record_ids, errors=[str(exc)])
+
+        self._matrix_cache.invalidate(project_id)
+        logger.info(
+            "已重建章节向量: project=%s chapter=%s chunks=%d summaries=%d",
             project_id,
             chapter_number,
-            chunk_index,
-            chapter_title,
-            content,
-            embedding,
-            metadata
-        ) VALUES (
-            :id,
-            :project_id,
-            :chapter_number,
-            :chunk_index,
-            :chapter_title,
-            :content,
-            :embedding,
-            :metadata
+            len(chunk_statements),
+            len(summary_statements),
         )
-        ON CONFLICT(id) DO UPDATE SET
-            content=excluded.content,
-            embedding=excluded.embedding,
-            metadata=excluded.metadata,
-            chapter_title=excluded.chapter_title
+        return VectorWriteResult(written=len(record_ids))
+
+    async def list_chapter_chunks(self, project_id: str, chapter_number: int) -> Optional[List[Dict[str, Any]]]:
+        """读取章节现有片段的 ID、序号、标题、模型与内容哈希，供增量入库比对；读取失败时返回 None。"""
+        if not self._client:
+            return None
+
+        await self.ensure_schema()
+        sql = """
+        SELECT id, chunk_index, chapter_title, embedding_model, COALESCE(metadata, '{}') AS metadata
+        FROM rag_chunks
+        WHERE project_id = :project_id AND chapter_number = :chapter_number
         """
-        payload = []
-        for item in records:
-            embedding = item.get("embedding", [])
-            payload.append(
-                {
-                    **item,
-                    "embedding": self._to_f32_blob(embedding),
-                    "metadata": json.dumps(item.get("metadata") or {}, ensure_ascii=False),
-                }
+        try:
+            result = await self._client.execute(  # type: ignore[union-attr]
+                sql,
+                {"project_id": project_id, "chapter_number": chapter_number},
             )
+        except Exception as exc:  # pragma: no cover - 读取失败时由调用方整章重建
+            logger.warning("读取章节片段失败: project=%s chapter=%s error=%s", project_id, chapter_number, exc)
+            return None
+        return [
+            {
+                "id": row.get("id"),
+                "chunk_index": row.get("chunk_index"),
+                "chapter_title": row.get("chapter_title"),
+                "embedding_model": row.get("embedding_model") or "",
+                "content_hash": self._parse_metadata(row.get("metadata")).get("content_hash"),
+            }
+            for row in self._iter_rows(result)
+        ]
 
-        if not payload:
-            return
+    async def get_chapter_summary(self, project_id: str, chapter_number: int) -> Optional[Dict[str, Any]]:
+        """读取章节当前入库的摘要文本、标题与模型，不存在或读取失败时返回 None。"""
+        if not self._client:
+            return None
 
-        for item in payload:
-            try:
-                await self._client.execute(sql, item)  # type: ignore[union-attr]
-            except Exception as exc:  # pragma: no cover - 单条写入失败时记录日志
-                logger.error("写入 rag_chunks 失败: %s", exc)
-            else:
-                logger.debug(
-                    "已写入章节片段: project=%s chapter=%s chunk=%s",
-                    item.get("project_id"),
-                    item.get("chapter_number"),
-                    item.get("chunk_index"),
-                )
+        await self.ensure_schema()
+        sql = """
+        SELECT id, title, summary, embedding_model
+        FROM rag_summaries
+        WHERE project_id = :project_id AND chapter_number = :chapter_number
+        LIMIT 1
+        """
+        try:
+            result = await self._client.execute(  # type: ignore[union-attr]
+                sql,
+                {"project_id": project_id, "chapter_number": chapter_number},
+            )
+        except Exception as exc:  # pragma: no cover - 读取失败时按不存在处理
+            logger.warning("读取章节摘要向量失败: project=%s chapter=%s error=%s", project_id, chapter_number, exc)
+            return None
+        rows = self._iter_rows(result)
+        return rows[0] if rows else None
 
-    async def upsert_summaries(
+    async def sync_chapter(
         self,
         *,
-        records: Iterable[Dict[str, Any]],
-    ) -> None:
-        """同步章节摘要向量，供摘要层检索使用。"""
+        project_id: str,
+        chapter_number: int,
+        chunk_records: Iterable[Dict[str, Any]] = (),
+        reindexed_chunks: Iterable[Dict[str, Any]] = (),
+        deleted_chunk_ids: Sequence[str] = (),
+        summary_records: Iterable[Dict[str, Any]] = (),
+        delete_summary: bool = False,
+    ) -> VectorWriteResult:
+        """按差异更新章节向量：写入新增片段、调整移动片段的序号、删除消失的片段。
+
+        全部语句在同一个 batch 事务内提交，与 replace_chapter 一样保证原子性。
+        """
         if not self._client:
-            return
+            return VectorWriteResult()
 
         await self.ensure_schema()
-        sql = """
-        INSERT INTO rag_summaries (
-            id,
+        chunk_statements = self._chunk_statements(chunk_records)
+        summary_statements = self._summary_statements(summary_records)
+        reindexed = list(reindexed_chunks)
+        statements: List[Tuple[str, Dict[str, Any]]] = [
+            (
+                "DELETE FROM rag_chunks WHERE id = :id",
+                {"id": chunk_id},
+            )
+            for chunk_id in deleted_chunk_ids
+        ]
+        if delete_summary:
+            statements.append(
+                (
+                    "DELETE FROM rag_summaries WHERE project_id = :project_id AND chapter_number = :chapter_number",
+                    {"project_id": project_id, "chapter_number": chapter_number},
+                )
+            )
+        statements.extend(
+            (
+                _CHUNK_REINDEX_SQL,
+                {
+                    "id": item["id"],
+                    "chunk_index": item["chunk_index"],
+                    "chapter_title": item.get("chapter_title"),
+                },
+            )
+            for item in reindexed
+        )
+        statements.extend(chunk_statements)
+        statements.extend(summary_statements)
+        if not statements:
+            return VectorWriteResult()
+
+        record_ids = [params["id"] for _, params in (*chunk_statements, *summary_statements)]
+        try:
+            await self._client.batch(statements)  # type: ignore[union-attr]
+        except Exception as exc:  # pragma: no cover - 事务失败时整体回滚
+            self._matrix_cache.invalidate(project_id)
+            logger.error(
+                "增量更新章节向量失败，已整体回滚: project=%s chapter=%s error=%s",
+                project_id,
+                chapter_number,
+                exc,
+            )
+            return VectorWriteResult(failed_ids=record_ids, errors=[str(exc)])
+
+        self._matrix_cache.invalidate(project_id)
+        logger.info(
+            "已增量更新章节向量: project=%s chapter=%s 新增=%d 移动=%d 删除=%d 摘要=%d",
             project_id,
             chapter_number,
-            title,
-            summary,
-            embedding
-        ) VALUES (
-            :id,
-            :project_id,
-            :chapter_number,
-            :title,
-            :summary,
-            :embedding
+            len(chunk_statements),
+            len(reindexed),
+            len(deleted_chunk_ids),
+            len(summary_statements),
         )
-        ON CONFLICT(id) DO UPDATE SET
-            summary=excluded.summary,
-            embedding=excluded.embedding,
-            title=excluded.title
+        return VectorWriteResult(written=len(record_ids))
+
+    async def list_chapter_numbers(self, project_id: str) -> Optional[List[int]]:
+        """列出项目在向量库中存有片段或摘要的章节号，读取失败时返回 None。"""
+        if not self._client:
+            return None
+
+        await self.ensure_schema()
+        sql = """
+        SELECT chapter_number FROM rag_chunks WHERE project_id = :project_id
+        UNION
+        SELECT chapter_number FROM rag_summaries WHERE project_id = :project_id
         """
+        try:
+            result = await self._client.execute(sql, {"project_id": project_id})  # type: ignore[union-attr]
+        except Exception as exc:  # pragma: no cover - 读取失败时由调用方跳过清理
+            logger.warning("读取项目向量章节失败: project=%s error=%s", project_id, exc)
+            return None
+        return sorted(row.get("chapter_number") for row in self._iter_rows(result))
 
-        payload = []
-        for item in records:
-            embedding = item.get("embedding", [])
-            payload.append(
-                {
-                    **item,
-                    "embedding": self._to_f32_blob(embedding),
-                }
+    async def delete_by_chapters(self, project_id: str, chapter_numbers: Sequence[int]) -> None:
+        """根据章节编号批量删除对应的上下文数据。"""
+        if not self._client or not chapter_numbers:
+            return
+
+        await self.ensure_schema()
+        try:
+            await self._client.batch(  # type: ignore[union-attr]
+                self._delete_statements(project_id, chapter_numbers)
+            )
+            logger.info(
+                "已删除章节向量: project=%s chapters=%s",
+                project_id,
+                list(chapter_numbers),
             )
+        except Exception as exc:  # pragma: no cover - 删除失败时记录日志
+            logger.error("删除章节向量失败: project=%s chapters=%s error=%s", project_id, chapter_numbers, exc)
+        finally:
+            self._matrix_cache.invalidate(project_id)
 
-        if not payload:
-            return
+    async def get_cached_embeddings(self, cache_ids: Sequence[str]) -> Dict[str, List[float]]:
+        """按缓存键批量读取嵌入缓存，未命中的键不出现在结果中。"""
+        if not self._client or not cache_ids:
+            return {}
 
-        for item in payload:
+        await self.ensure_schema()
+        found: Dict[str, List[float]] = {}
+        ids = list(cache_ids)
+        for start in range(0, len(ids), _CACHE_LOOKUP_CHUNK):
+            part = ids[start:start + _CACHE_LOOKUP_CHUNK]
+            placeholders = ",".join(f":id_{idx}" for idx in range(len(part)))
+            sql = f"SELECT id, embedding FROM rag_embedding_cache WHERE id IN ({placeholders})"
             try:
-                await self._client.execute(sql, item)  # type: ignore[union-attr]
-            except Exception as exc:  # pragma: no cover - 单条写入失败时记录日志
-                logger.error("写入 rag_summaries 失败: %s", exc)
-            else:
-                logger.debug(
-                    "已写入章节摘要: project=%s chapter=%s",
-                    item.get("project_id"),
-                    item.get("chapter_number"),
+                result = await self._client.execute(  # type: ignore[union-attr]
+                    sql,
+                    {f"id_{idx}": cache_id for idx, cache_id in enumerate(part)},
                 )
+            except Exception as exc:  # pragma: no cover - 缓存读取失败时按未命中处理
+                logger.warning("读取嵌入缓存失败: %s", exc)
+                return found
+            for row in self._iter_rows(result):
+                embedding = self._from_f32_blob(row.get("embedding"))
+                if embedding:
+                    found[row["id"]] = embedding
+        return found
 
-    async def delete_by_chapters(self, project_id: str, chapter_numbers: Sequence[int]) -> None:
-        """根据章节编号批量删除对应的上下文数据。"""
-        if not self._client or not chapter_numbers:
-            return
+    async def put_cached_embeddings(self, records: Iterable[Dict[str, Any]]) -> VectorWriteResult:
+        """写入嵌入缓存；内容寻址的条目不可变，已存在时直接跳过。"""
+        statements = [
+            (
+                _EMBEDDING_CACHE_INSERT_SQL,
+                {**item, "embedding": self._to_f32_blob(item.get("embedding", []))},
+            )
+            for item in records
+        ]
+        if not self._client or not statements:
+            return VectorWriteResult()
 
         await self.ensure_schema()
+        return await self._execute_in_batches(statements, table="rag_embedding_cache")
+
+    async def reencode_embeddings(self) -> Dict[str, int]:
+        """把已入库向量转换为当前配置的编码，返回各表转换条数。
+
+        只处理编码与目标不同的行，并以 id 递增分页，中断后重新执行即可从剩余行继续。
+        """
+        target = settings.vector_storage_encoding
+        if not self._client:
+            return {}
+
+        await self.ensure_schema()
+        page_size = max(1, settings.vector_write_batch_size)
+        converted: Dict[str, int] = {}
+        for table in _VECTOR_TABLES:
+            converted[table] = 0
+            after = ""
+            while True:
+                result = await self._client.execute(  # type: ignore[union-attr]
+                    f"""
+                    SELECT id, embedding, embedding_encoding
+                    FROM {table}
+                    WHERE embedding_encoding != :target AND id > :after
+                    ORDER BY id
+                    LIMIT :limit
+                    """,
+                    {"target": target, "after": after, "limit": page_size},
+                )
+                rows = self._iter_rows(result)
+                if not rows:
+                    break
+                after = rows[-1]["id"]
+                # 仅当行仍是读取时的编码才覆盖，避免与并发写入的新向量冲突
+                await self._client.batch(  # type: ignore[union-attr]
+                    [
+                        (
+                            f"""
+                            UPDATE {table}
+                            SET embedding = :embedding, embedding_encoding = :target
+                            WHERE id = :id AND embedding_encoding = :source
+                            """,
+                            {
+                                "id": row["id"],
+                                "embedding": self._encode_embedding(
+                                    self._decode_embedding(row.get("embedding"), row.get("embedding_encoding")),
+                                    target,
+                                ),
+                                "target": target,
+                                "source": row.get("embedding_encoding"),
+                            },
+                        )
+                        for row in rows
+                    ]
+                )
+                converted[table] += len(rows)
+                logger.info("向量重新编码进度: table=%s target=%s converted=%d", table, target, converted[table])
+        self._matrix_cache.clear()
+        return converted
+
+    async def _execute_in_batches(
+        self,
+        statements: List[Tuple[str, Dict[str, Any]]],
+        *,
+        table: str,
+    ) -> VectorWriteResult:
+        """按配置的批大小分批提交，每个批次在 libsql 中为一个事务。"""
+        batch_size = max(1, settings.vector_write_batch_size)
+        result = VectorWriteResult()
+        for start in range(0, len(statements), batch_size):
+            batch = statements[start:start + batch_size]
+            try:
+                await self._client.batch(batch)  # type: ignore[union-attr]
+            except Exception as exc:  # pragma: no cover - 单批写入失败时记录日志
+                failed = [params["id"] for _, params in batch]
+                logger.error("写入 %s 失败: ids=%s error=%s", table, failed, exc)
+                result.failed_ids.extend(failed)
+                result.errors.append(str(exc))
+            else:
+                result.written += len(batch)
+
+        logger.debug(
+            "批量写入 %s 完成: 成功=%d 失败=%d",
+            table,
+            result.written,
+            len(result.failed_ids),
+        )
+        return result
+
+    def _chunk_statements(self, records: Iterable[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+        encoding = settings.vector_storage_encoding
+        return [
+            (
+                _CHUNK_UPSERT_SQL,
+                {
+                    **item,
+                    "embedding": self._encode_embedding(item.get("embedding", []), encoding),
+                    "embedding_encoding": encoding,
+                    "embedding_model": item.get("embedding_model") or "",
+                    "embedding_dim": len(item.get("embedding") or []),
+                    "metadata": json.dumps(item.get("metadata") or {}, ensure_ascii=False),
+                },
+            )
+            for item in records
+        ]
+
+    def _summary_statements(self, records: Iterable[Dict[str, Any]]) -> List[Tuple[str, Dict[str, Any]]]:
+        encoding = settings.vector_storage_encoding
+        return [
+            (
+                _SUMMARY_UPSERT_SQL,
+                {
+                    **item,
+                    "embedding": self._encode_embedding(item.get("embedding", []), encoding),
+                    "embedding_encoding": encoding,
+                    "embedding_model": item.get("embedding_model") or "",
+                    "embedding_dim": len(item.get("embedding") or []),
+                },
+            )
+            for item in records
+        ]
+
+    @staticmethod
+    def _delete_statements(
+        project_id: str,
+        chapter_numbers: Sequence[int],
+    ) -> List[Tuple[str, Dict[str, Any]]]:
         placeholders = ",".join(":chapter_" + str(idx) for idx in range(len(chapter_numbers)))
         params = {
             "project_id": project_id,
@@ -392,16 +1283,7 @@ class VectorStoreService:
         WHERE project_id = :project_id
           AND chapter_number IN ({placeholders})
         """
-        try:
-            await self._client.execute(chunk_sql, params)  # type: ignore[union-attr]
-            await self._client.execute(summary_sql, params)  # type: ignore[union-attr]
-            logger.info(
-                "已删除章节向量: project=%s chapters=%s",
-                project_id,
-                list(chapter_numbers),
-            )
-        except Exception as exc:  # pragma: no cover - 删除失败时记录日志
-            logger.error("删除章节向量失败: project=%s chapters=%s error=%s", project_id, chapter_numbers, exc)
+        return [(chunk_sql, params), (summary_sql, params)]
 
     @staticmethod
     def _to_f32_blob(embedding: Sequence[float]) -> bytes:
@@ -419,6 +1301,45 @@ class VectorStoreService:
         data.frombytes(bytes(blob))
         return list(data)
 
+    @staticmethod
+    def _encode_embedding(embedding: Sequence[float], encoding: str) -> bytes:
+        """按存储编码把向量序列化为 BLOB，编码逐行记录在 embedding_encoding 列。
+
+        float32 原样存储；float16 体积减半；int8 为 4 字节 float32 缩放系数加每维 1 字节。
+        """
+        if encoding == "float16":
+            return struct.pack(f"={len(embedding)}e", *embedding)
+        if encoding == "int8":
+            peak = max((abs(value) for value in embedding), default=0.0)
+            scale = peak / 127 if peak else 1.0
+            quantized = array("b", (max(-127, min(127, round(value / scale))) for value in embedding))
+            return struct.pack("=f", scale) + quantized.tobytes()
+        return array("f", embedding).tobytes()
+
+    @classmethod
+    def _decode_embedding(cls, blob: Any, encoding: Optional[str]) -> List[float]:
+        """按行记录的编码把 BLOB 还原为浮点列表。"""
+        if not blob:
+            return []
+        if isinstance(blob, memoryview):
+            blob = blob.tobytes()
+        if encoding == "float16":
+            return list(struct.unpack(f"={len(blob) // 2}e", blob))
+        if encoding == "int8":
+            (scale,) = struct.unpack_from("=f", blob)
+            return [value * scale for value in array("b", blob[4:])]
+        return cls._from_f32_blob(blob)
+
+    @staticmethod
+    def _decode_embedding_array(blob: Any, encoding: Optional[str]) -> "np.ndarray":
+        """NumPy 版本的解码；float32 直接引用 BLOB 内存，其余编码转换为 float32 副本。"""
+        if encoding == "float16":
+            return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+        if encoding == "int8":
+            scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+            return np.frombuffer(blob, dtype=np.int8, offset=4).astype(np.float32) * scale
+        return np.frombuffer(blob, dtype=np.float32)
+
     @staticmethod
     def _cosine_distance(vec_a: Sequence[float], vec_b: Sequence[float]) -> float:
         """计算余弦距离（1 - similarity），避免除零。"""
@@ -438,33 +1359,16 @@ class VectorStoreService:
         project_id: str,
         embedding: Sequence[float],
         top_k: int,
+        filters: Dict[str, Any],
     ) -> List[RetrievedChunk]:
-        sql = """
-        SELECT
-            content,
-            chapter_number,
-            chapter_title,
-            COALESCE(metadata, '{}') AS metadata,
-            embedding
-        FROM rag_chunks
-        WHERE project_id = :project_id
-        """
-        result = await self._client.execute(sql, {"project_id": project_id})  # type: ignore[union-attr]
-        scored: List[RetrievedChunk] = []
-        for row in self._iter_rows(result):
-            stored_embedding = self._from_f32_blob(row.get("embedding"))
-            distance = self._cosine_distance(embedding, stored_embedding)
-            scored.append(
-                RetrievedChunk(
-                    content=row.get("content", ""),
-                    chapter_number=row.get("chapter_number", 0),
-                    chapter_title=row.get("chapter_title"),
-                    score=distance,
-                    metadata=self._parse_metadata(row.get("metadata")),
-                )
-            )
-        scored.sort(key=lambda item: item.score)
-        return scored[:top_k]
+        ranked = await self._scan_top_k(
+            _CHUNK_SCAN_SQL,
+            project_id=project_id,
+            embedding=embedding,
+            top_k=top_k,
+            filters=filters,
+        )
+        return [self._chunk_from_row(row, distance) for distance, row in ranked]
 
     async def _query_summaries_with_python_similarity(
         self,
@@ -472,31 +1376,365 @@ class VectorStoreService:
         project_id: str,
         embedding: Sequence[float],
         top_k: int,
+        filters: Dict[str, Any],
     ) -> List[RetrievedSummary]:
-        sql = """
-        SELECT
-            chapter_number,
-            title,
-            summary,
-            embedding
-        FROM rag_summaries
-        WHERE project_id = :project_id
+        ranked = await self._scan_top_k(
+            _SUMMARY_SCAN_SQL,
+            project_id=project_id,
+            embedding=embedding,
+            top_k=top_k,
+            filters=filters,
+        )
+        return [self._summary_from_row(row, distance) for distance, row in ranked]
+
+    async def _iter_scan_pages(
+        self,
+        sql: str,
+        project_id: str,
+        filters: Dict[str, Any],
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """按 id 键集分页读取项目中符合模型与维度条件的向量行。"""
+        page_size = max(1, settings.vector_scan_page_size)
+        after = ""
+        while True:
+            result = await self._client.execute(  # type: ignore[union-attr]
+                sql,
+                {"project_id": project_id, "after": after, "limit": page_size, **filters},
+            )
+            rows = self._iter_rows(result)
+            if not rows:
+                return
+            yield rows
+            if len(rows) < page_size:
+                return
+            after = rows[-1]["id"]
+
+    async def _scan_top_k(
+        self,
+        sql: str,
+        *,
+        project_id: str,
+        embedding: Sequence[float],
+        top_k: int,
+        filters: Dict[str, Any],
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """按 id 分页扫描项目向量，逐页计算余弦距离并只保留当前 top_k。
+
+        内存占用取决于 ``vector_scan_page_size`` 而非项目规模；
+        安装 NumPy 时整页一次矩阵乘法，否则逐行计算。返回按距离升序排列的 (距离, 行)。
         """
-        result = await self._client.execute(sql, {"project_id": project_id})  # type: ignore[union-attr]
-        scored: List[RetrievedSummary] = []
-        for row in self._iter_rows(result):
-            stored_embedding = self._from_f32_blob(row.get("embedding"))
-            distance = self._cosine_distance(embedding, stored_embedding)
-            scored.append(
-                RetrievedSummary(
-                    chapter_number=row.get("chapter_number", 0),
-                    title=row.get("title", ""),
-                    summary=row.get("summary", ""),
-                    score=distance,
-                )
+        use_numpy = np is not None
+        query = np.asarray(embedding, dtype=np.float32) if use_numpy else list(embedding)
+        best_scores = np.empty(0, dtype=np.float32) if use_numpy else None
+        best: List[Tuple[float, Dict[str, Any]]] = []
+        async for rows in self._iter_scan_pages(sql, project_id, filters):
+            if use_numpy:
+                best_scores, best = self._merge_page_numpy(query, rows, best_scores, best, top_k)
+            else:
+                scored = [
+                    (
+                        self._cosine_distance(
+                            query,
+                            self._decode_embedding(row.pop("embedding", None), row.pop("embedding_encoding", None)),
+                        ),
+                        row,
+                    )
+                    for row in rows
+                ]
+                best = heapq.nsmallest(top_k, [*best, *scored], key=lambda item: item[0])
+
+        if use_numpy:
+            return [(float(score), row) for score, row in sorted(zip(best_scores.tolist(), best), key=lambda item: item[0])]
+        return best
+
+    @classmethod
+    def _merge_page_numpy(
+        cls,
+        query: "np.ndarray",
+        rows: List[Dict[str, Any]],
+        best_scores: "np.ndarray",
+        best: List[Dict[str, Any]],
+        top_k: int,
+    ) -> Tuple["np.ndarray", List[Dict[str, Any]]]:
+        """把一页向量堆成矩阵，一次点积得到整页距离，再与已有候选合并后用 argpartition 截取 top_k。"""
+        vectors = []
+        kept_rows = []
+        for row in rows:
+            blob = row.pop("embedding", None)
+            encoding = row.pop("embedding_encoding", None)
+            if not blob:
+                continue
+            # frombuffer 直接引用 BLOB 内存，不逐元素转换为 Python float
+            vector = cls._decode_embedding_array(blob, encoding)
+            if vector.shape[0] != query.shape[0]:
+                continue
+            vectors.append(vector)
+            kept_rows.append(row)
+        if not vectors:
+            return best_scores, best
+
+        matrix = np.stack(vectors)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        dots = matrix @ query
+        distances = np.ones(len(kept_rows), dtype=np.float32)
+        valid = norms > 0
+        distances[valid] = 1.0 - dots[valid] / norms[valid]
+
+        scores = np.concatenate([best_scores, distances])
+        candidates = [*best, *kept_rows]
+        if scores.shape[0] > top_k:
+            keep = np.argpartition(scores, top_k - 1)[:top_k]
+            return scores[keep], [candidates[idx] for idx in keep]
+        return scores, candidates
+
+    async def _query_ann(
+        self,
+        sql: str,
+        *,
+        project_id: str,
+        blob: bytes,
+        top_k: int,
+        filters: Dict[str, Any],
+    ) -> Optional[List[Dict[str, Any]]]:
+        """通过向量索引近似检索；索引不可用、出错或过滤后不足 top_k 时返回 None 交由精确扫描。"""
+        if not self._ann_ready:
+            return None
+        try:
+            result = await self._client.execute(  # type: ignore[union-attr]
+                sql,
+                {
+                    "project_id": project_id,
+                    "query": blob,
+                    "candidates": max(top_k, settings.vector_ann_candidates),
+                    "limit": top_k,
+                    **filters,
+                },
             )
-        scored.sort(key=lambda item: item.score)
-        return scored[:top_k]
+        except Exception as exc:  # pragma: no cover - 索引查询失败时回退精确扫描
+            logger.warning("向量索引检索失败，回退精确扫描: %s", exc)
+            return None
+        rows = self._iter_rows(result)
+        # 索引覆盖所有项目，小项目的候选可能被其他项目挤占，此时以精确扫描为准
+        if len(rows) < top_k:
+            return None
+        return rows
+
+    async def benchmark_ann(
+        self,
+        *,
+        project_id: str,
+        samples: int = 20,
+        top_k: Optional[int] = None,
+        model: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """以项目内已入库片段为查询，对比向量索引与精确扫描的召回率和耗时。"""
+        top_k = top_k or settings.vector_top_k_chunks
+        report: Dict[str, Any] = {
+            "project_id": project_id,
+            "ann_available": self._ann_ready,
+            "samples": 0,
+            "top_k": top_k,
+            "recall": None,
+            "ann_fallbacks": 0,
+            "ann_latency_ms": {},
+            "exact_latency_ms": {},
+        }
+        if not self._client or not self._ann_ready or top_k <= 0:
+            return report
+
+        result = await self._client.execute(  # type: ignore[union-attr]
+            "SELECT embedding FROM rag_chunks "
+            "WHERE project_id = :project_id AND (:model IS NULL OR embedding_model = :model) "
+            "ORDER BY random() LIMIT :limit",
+            {"project_id": project_id, "model": model, "limit": samples},
+        )
+        queries = [self._from_f32_blob(row.get("embedding")) for row in self._iter_rows(result)]
+        ann_timings: List[float] = []
+        exact_timings: List[float] = []
+        recalls: List[float] = []
+        for query in queries:
+            filters = {"model": model, "dim": len(query)}
+            started = time.perf_counter()
+            ann_rows = await self._query_ann(
+                _CHUNK_ANN_SQL,
+                project_id=project_id,
+                blob=self._to_f32_blob(query),
+                top_k=top_k,
+                filters=filters,
+            )
+            ann_timings.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            exact = await self._scan_top_k(
+                _CHUNK_SCAN_SQL,
+                project_id=project_id,
+                embedding=query,
+                top_k=top_k,
+                filters=filters,
+            )
+            exact_timings.append((time.perf_counter() - started) * 1000)
+
+            if ann_rows is None:
+                report["ann_fallbacks"] += 1
+                continue
+            expected = {row["id"] for _, row in exact}
+            if expected:
+                recalls.append(len(expected & {row["id"] for row in ann_rows}) / len(expected))
+
+        report["samples"] = len(queries)
+        report["recall"] = sum(recalls) / len(recalls) if recalls else None
+        report["ann_latency_ms"] = self._latency_summary(ann_timings)
+        report["exact_latency_ms"] = self._latency_summary(exact_timings)
+        return report
+
+    @staticmethod
+    def _latency_summary(timings: Sequence[float]) -> Dict[str, float]:
+        if not timings:
+            return {}
+        ordered = sorted(timings)
+        return {
+            "mean": sum(ordered) / len(ordered),
+            "p50": ordered[len(ordered) // 2],
+            "p95": ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.95) - 1)],
+        }
+
+    async def _query_matrix_cache(
+        self,
+        table: str,
+        *,
+        project_id: str,
+        embedding: Sequence[float],
+        top_k: int,
+        filters: Dict[str, Any],
+    ) -> Optional[List[Tuple[float, Dict[str, Any]]]]:
+        """从热点项目的内存矩阵中检索 top_k；缓存关闭、无法缓存或维度不一致时返回 None 交由数据库查询。
+
+        只有估算体积在预算内的项目才会整体加载，超出预算的项目记录后直接走向量索引或数据库扫描。
+        """
+        cache = self._matrix_cache
+        if not cache.enabled:
+            return None
+
+        model, dim = filters["model"], filters["dim"]
+        entry = cache.get(table, project_id, model, dim)
+        if entry is None:
+            if cache.is_oversized(table, project_id, model, dim):
+                return None
+            generation = cache.generation(table, project_id)
+            sql = _CHUNK_SCAN_SQL if table == "rag_chunks" else _SUMMARY_SCAN_SQL
+            try:
+                estimated = await self._estimate_matrix_bytes(table, project_id, filters)
+                if not cache.fits(estimated):
+                    cache.mark_oversized(table, project_id, model, dim)
+                    logger.info(
+                        "项目向量超出矩阵缓存预算，检索交由数据库: table=%s project=%s estimated=%d",
+                        table,
+                        project_id,
+                        estimated,
+                    )
+                    return None
+                entry = await self._load_matrix_entry(sql, project_id, filters)
+            except Exception as exc:  # pragma: no cover - 加载失败时直接走数据库查询
+                logger.warning("加载项目向量矩阵失败: table=%s project=%s error=%s", table, project_id, exc)
+                return None
+            if entry is None:
+                return None
+            if not cache.put(table, project_id, model, dim, entry, generation):
+                # 未能放入缓存时不在本次请求中使用整表矩阵，交由数据库查询，避免每次都整体加载
+                return None
+            logger.debug(
+                "已缓存项目向量矩阵: table=%s project=%s rows=%d bytes=%d",
+                table,
+                project_id,
+                len(entry.rows),
+                entry.nbytes,
+            )
+
+        if not entry.rows:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        if entry.matrix.shape[1] != query.shape[0]:
+            return None
+
+        query_norm = float(np.linalg.norm(query))
+        if query_norm == 0:
+            distances = np.ones(len(entry.rows), dtype=np.float32)
+        else:
+            distances = 1.0 - entry.matrix @ (query / query_norm)
+        if distances.shape[0] > top_k:
+            candidates = np.argpartition(distances, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(distances.shape[0])
+        ordered = candidates[np.argsort(distances[candidates])]
+        return [(float(distances[idx]), entry.rows[idx]) for idx in ordered]
+
+    async def _estimate_matrix_bytes(self, table: str, project_id: str, filters: Dict[str, Any]) -> int:
+        result = await self._client.execute(  # type: ignore[union-attr]
+            _MATRIX_SIZE_SQL[table],
+            {"project_id": project_id, **filters},
+        )
+        rows = self._iter_rows(result)
+        if not rows:
+            return 0
+        total = int(rows[0].get("total") or 0)
+        text_size = int(rows[0].get("text_size") or 0)
+        return total * filters["dim"] * 4 + text_size
+
+    async def _load_matrix_entry(
+        self,
+        sql: str,
+        project_id: str,
+        filters: Dict[str, Any],
+    ) -> Optional[_MatrixEntry]:
+        """分页读取项目向量并按行归一化；存在维度不一致的向量时不缓存。"""
+        vectors = []
+        rows: List[Dict[str, Any]] = []
+        dimension: Optional[int] = None
+        async for page in self._iter_scan_pages(sql, project_id, filters):
+            for row in page:
+                blob = row.pop("embedding", None)
+                encoding = row.pop("embedding_encoding", None)
+                if not blob:
+                    continue
+                vector = self._decode_embedding_array(blob, encoding)
+                if dimension is None:
+                    dimension = vector.shape[0]
+                elif vector.shape[0] != dimension:
+                    return None
+                vectors.append(vector)
+                rows.append(row)
+
+        if not vectors:
+            return _MatrixEntry(matrix=np.empty((0, 0), dtype=np.float32), rows=[], nbytes=0)
+        matrix = np.stack(vectors)
+        norms = np.linalg.norm(matrix, axis=1)
+        nonzero = norms > 0
+        matrix[nonzero] /= norms[nonzero, None]
+        row_bytes = sum(sys.getsizeof(value) for row in rows for value in row.values())
+        return _MatrixEntry(matrix=matrix, rows=rows, nbytes=matrix.nbytes + row_bytes)
+
+    def _invalidate_statements(self, statements: Sequence[Tuple[str, Dict[str, Any]]], tables: Sequence[str]) -> None:
+        for project_id in {params.get("project_id") for _, params in statements}:
+            if project_id:
+                self._matrix_cache.invalidate(project_id, tables)
+
+    def _chunk_from_row(self, row: Dict[str, Any], score: float) -> RetrievedChunk:
+        return RetrievedChunk(
+            content=row.get("content", ""),
+            chapter_number=row.get("chapter_number", 0),
+            chapter_title=row.get("chapter_title"),
+            score=score,
+            metadata=self._parse_metadata(row.get("metadata")),
+        )
+
+    @staticmethod
+    def _summary_from_row(row: Dict[str, Any], score: float) -> RetrievedSummary:
+        return RetrievedSummary(
+            chapter_number=row.get("chapter_number", 0),
+            title=row.get("title", ""),
+            summary=row.get("summary", ""),
+            score=score,
+        )
 
     @staticmethod
     def _parse_metadata(raw: Any) -> Dict[str, Any]:
@@ -537,8 +1775,47 @@ class VectorStoreService:
         return normalized
 
 
+_SHARED_STORE: Optional[VectorStoreService] = None
+_SHARED_STORE_FAILED = False
+
+
+def get_vector_store() -> Optional[VectorStoreService]:
+    """返回进程内共享的向量库服务；未启用或初始化失败时返回 None。"""
+    global _SHARED_STORE, _SHARED_STORE_FAILED
+    if not settings.vector_store_enabled or _SHARED_STORE_FAILED:
+        return None
+    if _SHARED_STORE is None:
+        try:
+            _SHARED_STORE = VectorStoreService()
+        except RuntimeError as exc:
+            logger.warning("向量库初始化失败，RAG 功能被禁用: %s", exc)
+            _SHARED_STORE_FAILED = True
+            return None
+    return _SHARED_STORE
+
+
+async def init_vector_store() -> Optional[VectorStoreService]:
+    """应用启动时创建共享客户端并完成一次性建表。"""
+    store = get_vector_store()
+    if store:
+        await store.ensure_schema()
+    return store
+
+
+async def close_vector_store() -> None:
+    """应用退出时释放共享客户端。"""
+    global _SHARED_STORE
+    if _SHARED_STORE is not None:
+        await _SHARED_STORE.close()
+        _SHARED_STORE = None
+
+
 __all__ = [
     "VectorStoreService",
+    "get_vector_store",
+    "init_vector_store",
+    "close_vector_store",
     "RetrievedChunk",
     "RetrievedSummary",
+    "VectorWriteResult",
 ]
@@ -0,0 +1,34 @@
+"""按键分组的并发限制工具，用于对同一用户或同一模型服务的请求数量设上限。"""
+
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable
+
+
+class KeyedLimiter:
+    """为每个 key 维护独立的信号量，limit <= 0 时表示不限制。
+
+    信号量通过弱引用缓存，没有协程持有时自动回收，避免 key 无限增长。
+    """
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._semaphores: "weakref.WeakValueDictionary[Hashable, asyncio.Semaphore]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable) -> AsyncIterator[None]:
+        if self._limit <= 0:
+            yield
+            return
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._limit)
+            self._semaphores[key] = semaphore
+        async with semaphore:
+            yield
+
+
+__all__ = ["KeyedLimiter"]
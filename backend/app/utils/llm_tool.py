@@ -1,11 +1,24 @@
 # -*- coding: utf-8 -*-
 """OpenAI 兼容型 LLM 工具封装，保持与旧项目一致的接口体验。"""
 
+import hashlib
+import importlib.util
+import logging
 import os
 from dataclasses import asdict, dataclass
-from typing import AsyncGenerator, Dict, List, Optional
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
 
-from openai import AsyncOpenAI
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from ..core.config import settings
+
+try:  # pragma: no cover - 运行环境未安装时兼容
+    from ollama import AsyncClient as OllamaAsyncClient
+except ImportError:  # pragma: no cover - Ollama 为可选依赖
+    OllamaAsyncClient = None
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -17,6 +30,78 @@ class ChatMessage:
         return asdict(self)
 
 
+class LLMClientRegistry:
+    """进程内共享的模型服务客户端，按 (提供方, base_url, api_key 摘要) 复用连接池。
+
+    系统默认配置与用户自定义的 LLMConfig 都从这里取客户端，避免每次调用重新握手；
+    由 ``main.lifespan`` 在退出时统一关闭。
+    """
+
+    def __init__(self) -> None:
+        self._openai: Dict[Tuple[str, str, str], AsyncOpenAI] = {}
+        self._ollama: Dict[Tuple[str, str, str], "OllamaAsyncClient"] = {}
+        self._http2: Optional[bool] = None
+
+    @staticmethod
+    def _key(provider: str, base_url: Optional[str], api_key: Optional[str]) -> Tuple[str, str, str]:
+        digest = hashlib.sha256(api_key.encode("utf-8")).hexdigest() if api_key else ""
+        return provider, (base_url or "").rstrip("/"), digest
+
+    def _http_options(self) -> Dict:
+        if self._http2 is None:
+            self._http2 = settings.llm_http2 and importlib.util.find_spec("h2") is not None
+            if settings.llm_http2 and not self._http2:
+                logger.warning("未安装 h2 依赖，模型服务客户端回退到 HTTP/1.1")
+        return {
+            "limits": httpx.Limits(
+                max_connections=settings.llm_http_max_connections,
+                max_keepalive_connections=settings.llm_http_max_keepalive_connections,
+                keepalive_expiry=settings.llm_http_keepalive_expiry,
+            ),
+            "http2": self._http2,
+        }
+
+    def get_openai(self, api_key: Optional[str], base_url: Optional[str] = None) -> AsyncOpenAI:
+        key = self._key("openai", base_url, api_key)
+        client = self._openai.get(key)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=DefaultAsyncHttpxClient(**self._http_options()),
+            )
+            self._openai[key] = client
+            logger.info("创建模型服务客户端: provider=openai base_url=%s", base_url or "default")
+        return client
+
+    def get_ollama(self, base_url: Optional[str] = None) -> "OllamaAsyncClient":
+        if OllamaAsyncClient is None:
+            raise RuntimeError("未安装 ollama 依赖")
+        key = self._key("ollama", base_url, None)
+        client = self._ollama.get(key)
+        if client is None:
+            client = OllamaAsyncClient(host=base_url, **self._http_options())
+            self._ollama[key] = client
+            logger.info("创建模型服务客户端: provider=ollama base_url=%s", base_url or "default")
+        return client
+
+    async def close(self) -> None:
+        for client in self._openai.values():
+            await client.close()
+        for client in self._ollama.values():
+            await client._client.aclose()
+        self._openai.clear()
+        self._ollama.clear()
+
+
+llm_clients = LLMClientRegistry()
+
+
+async def close_llm_clients() -> None:
+    """应用退出时关闭所有共享的模型服务连接。"""
+    await llm_clients.close()
+
+
 class LLMClient:
     """异步流式调用封装，兼容 OpenAI SDK。"""
 
@@ -25,7 +110,7 @@ class LLMClient:
         if not key:
             raise ValueError("缺少 OPENAI_API_KEY 配置，请在数据库或环境变量中补全。")
 
-        self._client = AsyncOpenAI(api_key=key, base_url=base_url or os.environ.get("OPENAI_API_BASE"))
+        self._client = llm_clients.get_openai(key, base_url or os.environ.get("OPENAI_API_BASE"))
 
     async def stream_chat(
         self,
@@ -36,8 +121,10 @@ class LLMClient:
         top_p: Optional[float] = None,
         max_tokens: Optional[int] = None,
         timeout: int = 120,
+        include_usage: bool = False,
         **kwargs,
-    ) -> AsyncGenerator[Dict[str, str], None]:
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """逐段返回 ``content`` 与 ``finish_reason``；``include_usage`` 时最后额外返回一段 ``usage``。"""
         payload = {
             "model": model or os.environ.get("MODEL", "gpt-3.5-turbo"),
             "messages": [msg.to_dict() for msg in messages],
@@ -45,6 +132,8 @@ class LLMClient:
             "timeout": timeout,
             **kwargs,
         }
+        if include_usage:
+            payload["stream_options"] = {"include_usage": True}
         if response_format:
             payload["response_format"] = {"type": response_format}
         if temperature is not None:
@@ -56,6 +145,9 @@ class LLMClient:
 
         stream = await self._client.chat.completions.create(**payload)
         async for chunk in stream:
+            # include_usage 时用量在 choices 为空的最后一个分片中返回，部分兼容服务随最后一个 choice 返回
+            if getattr(chunk, "usage", None):
+                yield {"usage": _usage_to_dict(chunk.usage)}
             if not chunk.choices:
                 continue
             choice = chunk.choices[0]
@@ -63,3 +155,17 @@ class LLMClient:
                 "content": choice.delta.content,
                 "finish_reason": choice.finish_reason,
             }
+
+
+def _usage_to_dict(usage: Any) -> Dict[str, int]:
+    """统一各提供方的用量字段：OpenAI 为 prompt_tokens_details.cached_tokens，DeepSeek 为 prompt_cache_hit_tokens。"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached is None:
+        extra = getattr(usage, "model_extra", None) or {}
+        cached = extra.get("prompt_cache_hit_tokens")
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", None) or 0,
+        "cached_tokens": cached or 0,
+    }
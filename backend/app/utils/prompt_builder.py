@@ -0,0 +1,155 @@
+"""按 token 预算拼装提示词：逐段估算 token，超出预算时按优先级与裁剪策略压缩各段。"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# 中日韩字符及全角标点按每字 1 token 估算，其余字符按每 4 个 1 token 估算
+_WIDE_CHAR_PATTERN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+_TRUNCATED_MARK = "……（已截断）"
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数，偏保守，用于预算控制而非计费。"""
+    if not text:
+        return 0
+    wide = len(_WIDE_CHAR_PATTERN.findall(text))
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+@dataclass
+class PromptSection:
+    """提示词中的一段。
+
+    ``items`` 为段落内可独立删减的条目（如检索片段），按重要性从高到低排列；
+    ``priority`` 越小越重要，超出预算时从优先级最低的段开始裁剪；
+    ``strategy`` 取值：
+      - ``keep``：不裁剪；
+      - ``items``：从末尾逐条删除，至少保留 ``min_items`` 条；
+      - ``head``：保留开头，截断结尾；
+      - ``tail``：保留结尾，截断开头；
+      - ``drop``：整段删除。
+    ``render_items`` 用于 JSON 等结构化内容：条目可以是任意对象，由该函数整体渲染为正文，
+    配合 ``items`` 策略按整条删减，避免按字符截断破坏结构；``head`` / ``tail`` 只适用于纯文本。
+    """
+
+    title: str
+    items: List[Any]
+    priority: int
+    strategy: str = "keep"
+    joiner: str = "\n"
+    min_items: int = 0
+    min_tokens: int = 0
+    placeholder: str = ""
+    render_items: Optional[Callable[[List[Any]], str]] = None
+    original_tokens: int = field(default=0, init=False)
+
+    @classmethod
+    def text(cls, title: str, content: str, priority: int, **kwargs) -> "PromptSection":
+        return cls(title=title, items=[content] if content else [], priority=priority, **kwargs)
+
+    def render(self) -> str:
+        if self.render_items is not None:
+            body = self.render_items(self.items) or self.placeholder
+        else:
+            body = self.joiner.join(item for item in self.items if item) or self.placeholder
+        return f"{self.title}\n{body}" if body else ""
+
+    def tokens(self) -> int:
+        return estimate_tokens(self.render())
+
+
+@dataclass
+class BudgetedPrompt:
+    """拼装结果：正文与每段的 token 明细（裁剪前、裁剪后）。"""
+
+    text: str
+    total_tokens: int
+    budget: int
+    breakdown: Dict[str, Dict[str, int]]
+    over_budget: bool = False
+
+    def describe(self) -> str:
+        parts = []
+        for title, item in self.breakdown.items():
+            if item["original"] != item["final"]:
+                parts.append(f"{title}={item['final']}(原{item['original']})")
+            else:
+                parts.append(f"{title}={item['final']}")
+        return ", ".join(parts)
+
+
+def build_budgeted_prompt(
+    sections: Sequence[PromptSection],
+    *,
+    budget: int,
+    reserved_tokens: int = 0,
+    separator: str = "\n\n",
+) -> BudgetedPrompt:
+    """按原顺序拼装各段；``budget`` 为包含 ``reserved_tokens``（如系统提示词）在内的总预算，0 表示不限制。"""
+    for section in sections:
+        section.original_tokens = section.tokens()
+
+    available = budget - reserved_tokens if budget > 0 else 0
+    if budget > 0:
+        overflow = sum(section.original_tokens for section in sections) - available
+        for section in sorted(sections, key=lambda item: item.priority, reverse=True):
+            if overflow <= 0:
+                break
+            overflow -= _trim(section, overflow)
+
+    rendered = [section.render() for section in sections]
+    text = separator.join(part for part in rendered if part)
+    total = estimate_tokens(text) + reserved_tokens
+    breakdown = {
+        section.title: {"original": section.original_tokens, "final": section.tokens()} for section in sections
+    }
+    return BudgetedPrompt(
+        text=text,
+        total_tokens=total,
+        budget=budget,
+        breakdown=breakdown,
+        over_budget=budget > 0 and total > budget,
+    )
+
+
+def _trim(section: PromptSection, overflow: int) -> int:
+    """按段落策略裁剪，返回减少的 token 数。"""
+    before = section.tokens()
+    if section.strategy == "drop":
+        section.items = []
+    elif section.strategy == "items":
+        while len(section.items) > section.min_items and section.tokens() > before - overflow:
+            section.items.pop()
+    elif section.strategy in {"head", "tail"} and section.items and section.render_items is None:
+        target = max(section.min_tokens, before - overflow - estimate_tokens(section.title) - 1)
+        content = section.joiner.join(section.items)
+        section.items = [_truncate(content, target, keep_tail=section.strategy == "tail")]
+    return before - section.tokens()
+
+
+def _truncate(text: str, max_tokens: int, *, keep_tail: bool) -> str:
+    """截断到不超过 ``max_tokens``，以二分查找确定保留的字符数。"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max(0, max_tokens - estimate_tokens(_TRUNCATED_MARK))
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        piece = text[-mid:] if keep_tail else text[:mid]
+        if estimate_tokens(piece) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    if low == 0:
+        return ""
+    return _TRUNCATED_MARK + text[-low:] if keep_tail else text[:low] + _TRUNCATED_MARK
+
+
+__all__ = [
+    "BudgetedPrompt",
+    "PromptSection",
+    "build_budgeted_prompt",
+    "estimate_tokens",
+]
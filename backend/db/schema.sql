@@ -19,6 +19,7 @@ CREATE TABLE IF NOT EXISTS novel_projects (
     title VARCHAR(255) NOT NULL,
     initial_prompt TEXT,
     status VARCHAR(32) DEFAULT 'draft',
+    revision INT NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     CONSTRAINT fk_novel_projects_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
@@ -167,7 +168,14 @@ CREATE TABLE IF NOT EXISTS user_daily_requests (
 
 CREATE TABLE IF NOT EXISTS usage_metrics (
     `key` VARCHAR(64) PRIMARY KEY,
-    value INT NOT NULL DEFAULT 0
+    value BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS usage_metric_buckets (
+    `key` VARCHAR(64) NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (`key`, bucket_start)
 );
 
 CREATE TABLE IF NOT EXISTS update_logs (
@@ -177,3 +185,29 @@ CREATE TABLE IF NOT EXISTS update_logs (
     created_by VARCHAR(64) NULL,
     is_pinned TINYINT(1) DEFAULT 0
 );
+
+CREATE TABLE IF NOT EXISTS background_jobs (
+    id CHAR(36) PRIMARY KEY,
+    job_type VARCHAR(64) NOT NULL,
+    status VARCHAR(32) NOT NULL DEFAULT 'pending',
+    user_id INT NULL,
+    project_id CHAR(36) NULL,
+    chapter_number INT NULL,
+    dedupe_key VARCHAR(255) NULL,
+    active_dedupe_key VARCHAR(255) NULL,
+    payload JSON NULL,
+    result JSON NULL,
+    error TEXT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    locked_until TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_background_jobs_status (status, run_after),
+    INDEX idx_background_jobs_dedupe (dedupe_key),
+    UNIQUE INDEX ix_background_jobs_active_dedupe_key (active_dedupe_key),
+    INDEX idx_background_jobs_project (project_id),
+    CONSTRAINT fk_background_jobs_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
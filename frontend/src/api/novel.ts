@@ -43,6 +43,7 @@ export interface NovelProject {
   blueprint?: Blueprint
   chapters: Chapter[]
   conversation_history: ConversationMessage[]
+  revision?: number  // 项目版本号，每次内容变更递增
 }
 
 export interface NovelProjectSummary {
@@ -89,17 +90,38 @@ export interface ChapterVersion {
   style?: string
 }
 
+export interface ChapterVersionMeta {
+  id: number
+  label: string | null
+  length: number
+  created_at: string | null
+}
+
+export interface ChapterVersionContent extends ChapterVersionMeta {
+  content: string
+}
+
 export interface Chapter {
   chapter_number: number
   title: string
   summary: string
   content: string | null
-  versions: string[] | null  // versions是字符串数组，不是对象数组
+  versions: string[] | null  // versions是字符串数组，仅单章节详情接口返回
+  version_summaries?: ChapterVersionMeta[] | null  // 版本元数据，项目接口只返回这一项
   evaluation: string | null
   generation_status: 'not_generated' | 'generating' | 'evaluating' | 'selecting' | 'failed' | 'evaluation_failed' | 'waiting_for_confirm' | 'successful'
   word_count?: number  // 字数统计
 }
 
+// 写作类接口的增量响应，仅包含本次变更涉及的章节
+export interface ChapterMutationResponse {
+  project_id: string
+  revision: number
+  chapters: Chapter[]
+  outlines: ChapterOutline[]
+  deleted_chapter_numbers: number[]
+}
+
 export interface ConversationMessage {
   role: 'user' | 'assistant'
   content: string
@@ -164,6 +186,14 @@ export class NovelAPI {
     return request(`${NOVELS_BASE}/${projectId}/chapters/${chapterNumber}`)
   }
 
+  static async getChapterVersion(
+    projectId: string,
+    chapterNumber: number,
+    versionId: number
+  ): Promise<ChapterVersionContent> {
+    return request(`${NOVELS_BASE}/${projectId}/chapters/${chapterNumber}/versions/${versionId}`)
+  }
+
   static async getSection(projectId: string, section: NovelSectionType): Promise<NovelSectionResponse> {
     return request(`${NOVELS_BASE}/${projectId}/sections/${section}`)
   }
@@ -196,14 +226,14 @@ export class NovelAPI {
     })
   }
 
-  static async generateChapter(projectId: string, chapterNumber: number): Promise<NovelProject> {
+  static async generateChapter(projectId: string, chapterNumber: number): Promise<ChapterMutationResponse> {
     return request(`${WRITER_BASE}/${projectId}/chapters/generate`, {
       method: 'POST',
       body: JSON.stringify({ chapter_number: chapterNumber })
     })
   }
 
-  static async evaluateChapter(projectId: string, chapterNumber: number): Promise<NovelProject> {
+  static async evaluateChapter(projectId: string, chapterNumber: number): Promise<ChapterMutationResponse> {
     return request(`${WRITER_BASE}/${projectId}/chapters/evaluate`, {
       method: 'POST',
       body: JSON.stringify({ chapter_number: chapterNumber })
@@ -214,7 +244,7 @@ export class NovelAPI {
     projectId: string,
     chapterNumber: number,
     versionIndex: number
-  ): Promise<NovelProject> {
+  ): Promise<ChapterMutationResponse> {
     return request(`${WRITER_BASE}/${projectId}/chapters/select`, {
       method: 'POST',
       body: JSON.stringify({
@@ -238,7 +268,7 @@ export class NovelAPI {
   static async updateChapterOutline(
     projectId: string,
     chapterOutline: ChapterOutline
-  ): Promise<NovelProject> {
+  ): Promise<ChapterMutationResponse> {
     return request(`${WRITER_BASE}/${projectId}/chapters/update-outline`, {
       method: 'POST',
       body: JSON.stringify(chapterOutline)
@@ -248,7 +278,7 @@ export class NovelAPI {
   static async deleteChapter(
     projectId: string,
     chapterNumbers: number[]
-  ): Promise<NovelProject> {
+  ): Promise<ChapterMutationResponse> {
     return request(`${WRITER_BASE}/${projectId}/chapters/delete`, {
       method: 'POST',
       body: JSON.stringify({ chapter_numbers: chapterNumbers })
@@ -259,7 +289,7 @@ export class NovelAPI {
     projectId: string,
     startChapter: number,
     numChapters: number
-  ): Promise<NovelProject> {
+  ): Promise<ChapterMutationResponse> {
     return request(`${WRITER_BASE}/${projectId}/chapters/outline`, {
       method: 'POST',
       body: JSON.stringify({
@@ -280,7 +310,7 @@ export class NovelAPI {
     projectId: string,
     chapterNumber: number,
     content: string
-  ): Promise<NovelProject> {
+  ): Promise<ChapterMutationResponse> {
     return request(`${WRITER_BASE}/${projectId}/chapters/edit`, {
       method: 'POST',
       body: JSON.stringify({
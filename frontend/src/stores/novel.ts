@@ -1,6 +1,6 @@
 import { defineStore } from 'pinia'
 import { ref, computed } from 'vue'
-import type { NovelProject, NovelProjectSummary, ConverseResponse, BlueprintGenerationResponse, Blueprint, DeleteNovelsResponse, ChapterOutline } from '@/api/novel'
+import type { NovelProject, NovelProjectSummary, ConverseResponse, BlueprintGenerationResponse, Blueprint, DeleteNovelsResponse, ChapterOutline, ChapterMutationResponse } from '@/api/novel'
 import { NovelAPI } from '@/api/novel'
 
 export const useNovelStore = defineStore('novel', () => {
@@ -85,6 +85,46 @@ export const useNovelStore = defineStore('novel', () => {
     }
   }
 
+  // 将写作接口返回的增量合并进当前项目；版本号不连续说明错过了其他变更，此时静默重新拉取完整项目
+  async function applyChapterMutation(mutation: ChapterMutationResponse) {
+    const project = currentProject.value
+    if (!project || project.id !== mutation.project_id) {
+      return
+    }
+    const deleted = new Set(mutation.deleted_chapter_numbers)
+    const byNumber = (a: { chapter_number: number }, b: { chapter_number: number }) => a.chapter_number - b.chapter_number
+
+    const chapters = (project.chapters || []).filter(ch => !deleted.has(ch.chapter_number))
+    for (const chapter of mutation.chapters) {
+      const index = chapters.findIndex(ch => ch.chapter_number === chapter.chapter_number)
+      if (index >= 0) {
+        chapters.splice(index, 1, chapter)
+      } else {
+        chapters.push(chapter)
+      }
+    }
+    project.chapters = chapters.sort(byNumber)
+
+    if (project.blueprint) {
+      const outlines = (project.blueprint.chapter_outline || []).filter(item => !deleted.has(item.chapter_number))
+      for (const outline of mutation.outlines) {
+        const index = outlines.findIndex(item => item.chapter_number === outline.chapter_number)
+        if (index >= 0) {
+          outlines.splice(index, 1, outline)
+        } else {
+          outlines.push(outline)
+        }
+      }
+      project.blueprint.chapter_outline = outlines.sort(byNumber)
+    }
+
+    const previousRevision = project.revision
+    project.revision = mutation.revision
+    if (previousRevision !== undefined && mutation.revision - previousRevision > 1) {
+      await loadProject(project.id, true)
+    }
+  }
+
   async function sendConversation(userInput: any): Promise<ConverseResponse> {
     isLoading.value = true
     error.value = null
@@ -143,31 +183,29 @@ export const useNovelStore = defineStore('novel', () => {
     }
   }
 
-  async function generateChapter(chapterNumber: number): Promise<NovelProject> {
+  async function generateChapter(chapterNumber: number): Promise<NovelProject | null> {
     // 注意：这里不设置全局 isLoading，因为 WritingDesk.vue 有自己的局部加载状态
     error.value = null
     try {
       if (!currentProject.value) {
         throw new Error('没有当前项目')
       }
-      const updatedProject = await NovelAPI.generateChapter(currentProject.value.id, chapterNumber)
-      currentProject.value = updatedProject // 更新 store 中的当前项目
-      return updatedProject
+      await applyChapterMutation(await NovelAPI.generateChapter(currentProject.value.id, chapterNumber))
+      return currentProject.value
     } catch (err) {
       error.value = err instanceof Error ? err.message : '生成章节失败'
       throw err
     }
   }
 
-  async function evaluateChapter(chapterNumber: number): Promise<NovelProject> {
+  async function evaluateChapter(chapterNumber: number): Promise<NovelProject | null> {
     error.value = null
     try {
       if (!currentProject.value) {
         throw new Error('没有当前项目')
       }
-      const updatedProject = await NovelAPI.evaluateChapter(currentProject.value.id, chapterNumber)
-      currentProject.value = updatedProject
-      return updatedProject
+      await applyChapterMutation(await NovelAPI.evaluateChapter(currentProject.value.id, chapterNumber))
+      return currentProject.value
     } catch (err) {
       error.value = err instanceof Error ? err.message : '评估章节失败'
       throw err
@@ -181,12 +219,11 @@ export const useNovelStore = defineStore('novel', () => {
       if (!currentProject.value) {
         throw new Error('没有当前项目')
       }
-      const updatedProject = await NovelAPI.selectChapterVersion(
+      await applyChapterMutation(await NovelAPI.selectChapterVersion(
         currentProject.value.id,
         chapterNumber,
         versionIndex
-      )
-      currentProject.value = updatedProject // 更新 store
+      ))
     } catch (err) {
       error.value = err instanceof Error ? err.message : '选择章节版本失败'
       throw err
@@ -224,11 +261,10 @@ export const useNovelStore = defineStore('novel', () => {
       if (!currentProject.value) {
         throw new Error('没有当前项目')
       }
-      const updatedProject = await NovelAPI.updateChapterOutline(
+      await applyChapterMutation(await NovelAPI.updateChapterOutline(
         currentProject.value.id,
         chapterOutline
-      )
-      currentProject.value = updatedProject // 更新 store
+      ))
     } catch (err) {
       error.value = err instanceof Error ? err.message : '更新章节大纲失败'
       throw err
@@ -242,11 +278,10 @@ export const useNovelStore = defineStore('novel', () => {
         throw new Error('没有当前项目')
       }
       const numbersToDelete = Array.isArray(chapterNumbers) ? chapterNumbers : [chapterNumbers]
-      const updatedProject = await NovelAPI.deleteChapter(
+      await applyChapterMutation(await NovelAPI.deleteChapter(
         currentProject.value.id,
         numbersToDelete
-      )
-      currentProject.value = updatedProject // 更新 store
+      ))
     } catch (err) {
       error.value = err instanceof Error ? err.message : '删除章节失败'
       throw err
@@ -259,12 +294,11 @@ export const useNovelStore = defineStore('novel', () => {
       if (!currentProject.value) {
         throw new Error('没有当前项目')
       }
-      const updatedProject = await NovelAPI.generateChapterOutline(
+      await applyChapterMutation(await NovelAPI.generateChapterOutline(
         currentProject.value.id,
         startChapter,
         numChapters
-      )
-      currentProject.value = updatedProject // 更新 store
+      ))
     } catch (err) {
       error.value = err instanceof Error ? err.message : '生成大纲失败'
       throw err
@@ -274,8 +308,7 @@ export const useNovelStore = defineStore('novel', () => {
   async function editChapterContent(projectId: string, chapterNumber: number, content: string) {
     error.value = null
     try {
-      const updatedProject = await NovelAPI.editChapterContent(projectId, chapterNumber, content)
-      currentProject.value = updatedProject // 更新 store
+      await applyChapterMutation(await NovelAPI.editChapterContent(projectId, chapterNumber, content))
     } catch (err) {
       error.value = err instanceof Error ? err.message : '编辑章节内容失败'
       throw err